@@ -0,0 +1,129 @@
+"""Cold storage for old logs in a second SQLite file attached as ``archive``.
+
+The dashboard, the bot and the change feed only look at recent days, so rows
+older than ``hot_days`` can move out of ``logs`` into ``archive.logs``, a copy
+of the table with the same columns and indexes in ``baby_log_archive.db``
+next to the database. Once enabled, every connection opened by database.py
+attaches the file::
+
+    database:
+      archive:
+        enabled: true
+        hot_days: 180
+
+``python -m backend.manage archive`` moves the rows; run it from cron. The
+``archived_before`` counter in app_state holds the cutoff as a Unix time and
+every archived row is older than it, so reads that stay at or after the
+cutoff never open the archive and those reaching further back read both
+tiers (see ``tiers`` and ``source``). Ongoing sessions always stay hot.
+``logs`` is declared AUTOINCREMENT, so SQLite never hands out an archived id
+again, and migration 9 keeps its sequence above the largest archived id.
+Archived rows are not changed in place: crud moves a row back with
+``restore`` before updating or deleting it.
+
+Do not disable the archive again once rows have moved. Migrations that change
+``logs`` must change ``archive.logs`` too; ``ensure_schema`` only creates it.
+"""
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+from sqlalchemy import MetaData, insert, select, union_all
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, aliased
+
+from .common import SESSION_ONGOING
+from .models import AppState, Log
+
+SCHEMA = "archive"
+CUTOFF_KEY = "archived_before"
+BATCH_SIZE = 5000
+
+metadata = MetaData()
+logs = Log.__table__.to_metadata(metadata, schema=SCHEMA)
+# Loads archived rows as Log objects; read-only, since they map to the hot table
+ArchivedLog = aliased(Log, logs, adapt_on_names=True)
+
+def path_for(database_path: str) -> str:
+    root, ext = os.path.splitext(database_path)
+    return f"{root}_archive{ext or '.db'}"
+
+def attach(dbapi_connection, path: str):
+    cursor = dbapi_connection.cursor()
+    try:
+        cursor.execute(f"ATTACH DATABASE ? AS {SCHEMA}", (path,))
+    finally:
+        cursor.close()
+
+def ensure_schema(db: Session):
+    metadata.create_all(db.connection())
+
+def get_cutoff(db: Session) -> Optional[datetime]:
+    """Every archived row is older than this; None while nothing has been archived."""
+    value = db.query(AppState.value).filter(AppState.key == CUTOFF_KEY).scalar()
+    return datetime.fromtimestamp(value, timezone.utc) if value else None
+
+def tiers(db: Session, since: Optional[datetime] = None) -> list:
+    """Entities that may hold logs at or after ``since`` (None: any time), hot table first."""
+    cutoff = get_cutoff(db)
+    if cutoff is None or (since is not None and since >= cutoff):
+        return [Log]
+    return [Log, ArchivedLog]
+
+def source(db: Session, where, since: Optional[datetime] = None):
+    """A Log entity over the rows matching ``where(entity)`` in ``tiers(db, since)``.
+
+    With the archive in reach this is a UNION ALL of both tables, each filtered
+    by ``where`` so their own indexes are used; filter the result with
+    ``where`` as well, as for the plain table.
+    """
+    entities = tiers(db, since)
+    if len(entities) == 1:
+        return Log
+    union = union_all(*(select(*_columns(e)).where(where(e)) for e in entities)).subquery()
+    return aliased(Log, union, adapt_on_names=True)
+
+def _columns(entity):
+    return [getattr(entity, c.name) for c in Log.__table__.columns]
+
+def _move(db: Session, ids, source_table, target_table):
+    names = [c.name for c in Log.__table__.columns]
+    db.execute(insert(target_table).from_select(
+        names, select(*[source_table.c[n] for n in names]).where(source_table.c.id.in_(ids))))
+    db.execute(source_table.delete().where(source_table.c.id.in_(ids)))
+
+def restore(db: Session, log_id: int) -> bool:
+    """Move an archived row back to ``logs`` so it can be changed; the caller commits."""
+    if db.query(logs.c.id).filter(logs.c.id == log_id).first() is None:
+        return False
+    _move(db, [log_id], logs, Log.__table__)
+    return True
+
+def archive_logs(db: Session, cutoff: datetime, batch_size: int = BATCH_SIZE) -> int:
+    """Move logs older than ``cutoff`` to the archive, committing every ``batch_size`` rows.
+
+    Returns the number of rows moved. The cutoff only ever moves forward.
+    """
+    ensure_schema(db)
+    # Whole seconds, as stored, so no archived row is newer than the recorded cutoff
+    cutoff = datetime.fromtimestamp(int(cutoff.timestamp()), timezone.utc)
+    previous = get_cutoff(db)
+    if previous is not None and previous > cutoff:
+        cutoff = previous
+    value = int(cutoff.timestamp())
+    db.execute(
+        sqlite_insert(AppState).values(key=CUTOFF_KEY, value=value)
+        .on_conflict_do_update(index_elements=["key"], set_={"value": value})
+    )
+    db.commit()
+
+    moved = 0
+    while True:
+        ids = [row.id for row in db.query(Log.id).filter(
+            Log.timestamp < cutoff, Log.status.is_distinct_from(SESSION_ONGOING)
+        ).order_by(Log.id).limit(batch_size)]
+        if not ids:
+            return moved
+        _move(db, ids, Log.__table__, logs)
+        db.commit()
+        moved += len(ids)
@@ -0,0 +1,49 @@
+"""Async entry points to crud for the event-loop callers (async endpoints, the bot).
+
+Each function runs its sync counterpart through ``AsyncSession.run_sync``, so
+the query logic lives in one place while every DB round trip is awaited on
+aiosqlite instead of blocking the loop or a threadpool worker. Calls are timed
+as ``babylog_crud_call_*`` metrics.
+"""
+import functools
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from . import crud, metrics
+
+def _run_sync(fn):
+    @metrics.timed(fn.__name__)
+    @functools.wraps(fn)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(fn, *args, **kwargs)
+    return wrapper
+
+log_event = _run_sync(crud.log_event)
+log_events = _run_sync(crud.log_events)
+update_log = _run_sync(crud.update_log)
+stop_ongoing_session = _run_sync(crud.stop_ongoing_session)
+start_session = _run_sync(crud.start_session)
+stop_session = _run_sync(crud.stop_session)
+switch_session = _run_sync(crud.switch_session)
+get_sessions = _run_sync(crud.get_sessions)
+delete_log = _run_sync(crud.delete_log)
+get_logs = _run_sync(crud.get_logs)
+get_log_rows = _run_sync(crud.get_log_rows)
+get_changes = _run_sync(crud.get_changes)
+get_log_revision = _run_sync(crud.get_log_revision)
+get_ongoing = _run_sync(crud.get_ongoing)
+get_ongoing_sessions = _run_sync(crud.get_ongoing_sessions)
+get_latest = _run_sync(crud.get_latest)
+get_time_since = _run_sync(crud.get_time_since)
+get_stats = _run_sync(crud.get_stats)
+get_analytics = _run_sync(crud.get_analytics)
+get_data_version = _run_sync(crud.get_data_version)
+get_latest_feed_id = _run_sync(crud.get_latest_feed_id)
+
+@metrics.timed("submit_log_event")
+async def submit_log_event(db: AsyncSession, log):
+    """log_event through this process's write queue when it is enabled (see write_queue.py)."""
+    from . import write_queue
+    if write_queue.queue is None:
+        return await log_event(db, log)
+    return await write_queue.queue.submit(log)
@@ -0,0 +1,110 @@
+"""Write latency while the dashboard is being polled from other processes.
+
+Reproduces the production shape: reader processes stand in for API workers
+recomputing ``crud.get_stats`` in a loop, and the main process writes like the
+bot does. Each run builds a fresh database in a temporary directory and
+reports write latency percentiles for the tuned engines (WAL, busy timeout,
+separate read/write pools) and for a bare ``create_engine`` as before::
+
+    python -m backend.benchmarks.contention --rows 50000 --readers 4 --writes 200
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy.exc import OperationalError
+from sqlmodel import Session, create_engine
+
+from .. import crud, database, ingest, migrations, schemas
+
+EVENTS = ["Feeding", "Sleep", "Pee", "Poop", "Mixed"]
+
+def make_engines(url: str, mode: str):
+    if mode == "legacy":
+        engine = create_engine(url, connect_args={"check_same_thread": False})
+        return engine, engine
+    settings = database.load_settings()
+    return database.make_engine(url, "write", settings), database.make_engine(url, "read", settings)
+
+def seed(url: str, rows: int):
+    engine = create_engine(url)
+    migrations.upgrade(engine)
+    start = datetime.now() - timedelta(minutes=20 * rows)
+    records = []
+    for i in range(rows):
+        event = random.choice(EVENTS)
+        record = {"event": event, "timestamp": (start + timedelta(minutes=20 * i)).isoformat()}
+        if event in ("Feeding", "Sleep"):
+            record["duration_seconds"] = random.randint(300, 3600)
+        records.append(record)
+    with Session(engine) as db:
+        ingest.ingest(db, records)
+    engine.dispose()
+
+def poll_dashboard(url: str, mode: str, stop, counter):
+    _, reader = make_engines(url, mode)
+    while not stop.is_set():
+        with Session(reader) as db:
+            crud.get_stats(db)
+        with counter.get_lock():
+            counter.value += 1
+
+def run(url: str, mode: str, readers: int, writes: int, interval: float):
+    stop = multiprocessing.Event()
+    counter = multiprocessing.Value("i", 0)
+    pollers = [multiprocessing.Process(target=poll_dashboard, args=(url, mode, stop, counter)) for _ in range(readers)]
+    for p in pollers:
+        p.start()
+    time.sleep(1)
+
+    writer, _ = make_engines(url, mode)
+    latencies, errors = [], 0
+    started = time.perf_counter()
+    for _ in range(writes):
+        t0 = time.perf_counter()
+        try:
+            with Session(writer) as db:
+                crud.log_event(db, schemas.LogCreate(event=random.choice(["Pee", "Poop"]), orientation="Dad"))
+            latencies.append((time.perf_counter() - t0) * 1000)
+        except OperationalError:
+            errors += 1
+        time.sleep(interval)
+    elapsed = time.perf_counter() - started
+
+    stop.set()
+    for p in pollers:
+        p.join()
+    writer.dispose()
+    return latencies, errors, counter.value / elapsed
+
+def report(mode: str, latencies, errors: int, reads_per_second: float):
+    if latencies:
+        q = statistics.quantiles(latencies, n=100)
+        print(f"{mode:>7}: writes p50 {q[49]:7.1f} ms  p95 {q[94]:7.1f} ms  p99 {q[98]:7.1f} ms  "
+              f"max {max(latencies):7.1f} ms  errors {errors}  dashboard reads {reads_per_second:.1f}/s")
+    else:
+        print(f"{mode:>7}: every write failed ({errors} errors)")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.benchmarks.contention", description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=50000, help="Synthetic history size")
+    parser.add_argument("--readers", type=int, default=4, help="Processes polling the dashboard")
+    parser.add_argument("--writes", type=int, default=200)
+    parser.add_argument("--interval", type=float, default=0.02, help="Seconds between writes")
+    parser.add_argument("--mode", choices=["tuned", "legacy", "both"], default="both")
+    args = parser.parse_args(argv)
+
+    modes = ["legacy", "tuned"] if args.mode == "both" else [args.mode]
+    with tempfile.TemporaryDirectory() as tmp:
+        for mode in modes:
+            url = f"sqlite:///{os.path.join(tmp, f'{mode}.db')}"
+            seed(url, args.rows)
+            report(mode, *run(url, mode, args.readers, args.writes, args.interval))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""Sustained write throughput and latency with and without the write queue.
+
+``--clients`` concurrent writers (taps from the bot and the web UI) each
+submit ``--writes`` logs back to back, once committing every log on its own
+(``async_crud.log_event``) and once through a ``WriteQueue``. Each
+mode starts from a copy of the same synthetic history, with ``synchronous``
+set as configured (``--synchronous full`` shows the fsync cost on disk)::
+
+    python -m backend.benchmarks.group_commit --rows 50000 --clients 16 --writes 50
+"""
+import argparse
+import asyncio
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import Session, create_engine
+
+from .. import async_crud, database, ingest, migrations, schemas, write_queue
+from .synthetic import generate
+
+def seed(path: str, rows: int):
+    engine = create_engine(f"sqlite:///{path}")
+    migrations.upgrade(engine)
+    with Session(engine) as db:
+        ingest.ingest(db, generate(rows=rows))
+    engine.dispose()
+
+async def run(path: str, queued: bool, clients: int, writes: int, settings: dict):
+    engine = database.make_async_engine(f"sqlite+aiosqlite:///{path}", "write", settings)
+    sessions = async_sessionmaker(engine, expire_on_commit=False)
+    queue = write_queue.WriteQueue(sessions, window=settings["write_queue"]["window_ms"] / 1000,
+                                   max_batch=settings["write_queue"]["max_batch"]) if queued else None
+    latencies = []
+
+    async def write(i):
+        log = schemas.LogCreate(event="Pee", orientation="Dad", comments=str(i))
+        started = time.perf_counter()
+        if queue:
+            await queue.submit(log)
+        else:
+            async with sessions() as db:
+                await async_crud.log_event(db, log)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+    async def client(n):
+        for i in range(writes):
+            await write(n * writes + i)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    elapsed = time.perf_counter() - started
+    await engine.dispose()
+    return latencies, clients * writes / elapsed
+
+def report(mode: str, latencies, throughput: float):
+    q = statistics.quantiles(latencies, n=100)
+    print(f"{mode:>8}: {throughput:8.1f} writes/s  p50 {q[49]:7.2f} ms  p95 {q[94]:7.2f} ms  "
+          f"p99 {q[98]:7.2f} ms  max {max(latencies):7.2f} ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.benchmarks.group_commit", description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=50000, help="Synthetic history size")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent writers")
+    parser.add_argument("--writes", type=int, default=50, help="Writes per client")
+    parser.add_argument("--window-ms", type=float, default=None, help="Defaults to the configured window")
+    parser.add_argument("--synchronous", default=None, help="Override PRAGMA synchronous, e.g. full")
+    args = parser.parse_args(argv)
+
+    settings = database.load_settings()
+    if args.window_ms is not None:
+        settings["write_queue"] = {**settings["write_queue"], "window_ms": args.window_ms}
+    if args.synchronous:
+        settings["pragmas"] = {**settings["pragmas"], "synchronous": args.synchronous}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, "seed.db")
+        seed(source, args.rows)
+        for mode, queued in (("direct", False), ("queued", True)):
+            path = os.path.join(tmp, f"{mode}.db")
+            shutil.copyfile(source, path)
+            report(mode, *asyncio.run(run(path, queued, args.clients, args.writes, settings)))
+
+if __name__ == "__main__":
+    main()
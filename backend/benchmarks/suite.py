@@ -0,0 +1,252 @@
+"""Latency benchmarks for the backend hot paths at several history sizes.
+
+For each size a synthetic history (see ``synthetic.py``) is imported into a
+scratch database and every case runs ``--iterations`` times. Cases:
+
+- ``get_stats`` with cold prediction cache
+- ``get_logs`` at several offsets, plus the keyset cursor at the same depth
+- ``log_event`` and ``stop_ongoing_session``
+- ``GET /dashboard`` (cold and cached) and ``GET /logs`` end to end through
+  the ASGI app
+
+Latency percentiles are printed per case. ``--save`` writes them as JSON.
+``--baseline`` compares the run against a saved file and exits with status 1
+if any case's p95 is more than ``--threshold`` slower than the baseline::
+
+    python -m backend.benchmarks.suite --sizes 1000,100000,1000000 --save baseline.json
+    python -m backend.benchmarks.suite --baseline baseline.json --threshold 0.25
+
+Generated databases are kept in ``--data-dir`` when given, so later runs skip
+the import; each run works on a copy.
+"""
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlmodel import Session, create_engine
+
+from .. import crud, database, ingest, migrations, predictions, schemas
+from .synthetic import generate
+
+DEFAULT_SIZES = (1_000, 100_000, 1_000_000)
+DEFAULT_ITERATIONS = 30
+DEFAULT_THRESHOLD = 0.25
+LOG_DEPTHS = (0, 1_000, 10_000)
+PAGE_SIZE = 100
+
+def build_database(path: str, rows: int, seed: int):
+    if os.path.exists(path):
+        return
+    partial = path + ".partial"
+    if os.path.exists(partial):
+        os.remove(partial)
+    engine = create_engine(f"sqlite:///{partial}")
+    migrations.upgrade(engine)
+    with Session(engine) as db:
+        ingest.ingest(db, generate(rows=rows, seed=seed))
+    engine.dispose()
+    os.replace(partial, path)
+
+def measure(fn, iterations: int, setup=None) -> list:
+    samples = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+async def measure_async(fn, iterations: int, setup=None) -> list:
+    samples = []
+    for _ in range(iterations):
+        if setup:
+            setup()
+        started = time.perf_counter()
+        await fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return samples
+
+def summarise(samples: list) -> dict:
+    ordered = sorted(samples)
+    def pct(p):
+        return ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))]
+    return {"n": len(ordered), "mean": statistics.fmean(ordered), "p50": pct(50), "p95": pct(95),
+            "p99": pct(99), "max": ordered[-1]}
+
+def crud_cases(url: str, rows: int, iterations: int) -> dict:
+    writer = database.make_engine(url, "write")
+    reader = database.make_engine(url, "read")
+    results = {}
+
+    def get_stats():
+        with Session(reader) as db:
+            crud.get_stats(db)
+    results["get_stats"] = measure(get_stats, iterations, setup=predictions.clear_cache)
+
+    for depth in LOG_DEPTHS:
+        if depth >= rows:
+            continue
+        with Session(reader) as db:
+            anchor = crud.get_logs(db, skip=depth - 1, limit=1)[0] if depth else None
+        cursor = crud.encode_cursor(anchor.timestamp, anchor.id) if anchor else None
+
+        def by_offset(depth=depth):
+            with Session(reader) as db:
+                crud.get_logs(db, skip=depth, limit=PAGE_SIZE)
+
+        def by_cursor(cursor=cursor):
+            with Session(reader) as db:
+                crud.get_logs(db, cursor=cursor, limit=PAGE_SIZE)
+        results[f"get_logs offset={depth}"] = measure(by_offset, iterations)
+        if cursor:
+            results[f"get_logs cursor@{depth}"] = measure(by_cursor, iterations)
+
+    def log_event():
+        with Session(writer) as db:
+            crud.log_event(db, schemas.LogCreate(event="Pee", orientation="Dad"))
+    results["log_event"] = measure(log_event, iterations)
+
+    def start_feed():
+        with Session(writer) as db:
+            crud.log_event(db, schemas.LogCreate(event="Feeding", details="ongoing", orientation="Left"))
+
+    def stop_feed():
+        with Session(writer) as db:
+            crud.stop_ongoing_session(db, "Feeding")
+    results["stop_ongoing_session"] = measure(stop_feed, iterations, setup=start_feed)
+
+    writer.dispose()
+    reader.dispose()
+    return results
+
+async def http_cases(url: str, iterations: int) -> dict:
+    from ..main import app, dashboard_cache
+
+    async_url = url.replace("sqlite://", "sqlite+aiosqlite://", 1)
+    sync_writer, sync_reader = database.make_engine(url, "write"), database.make_engine(url, "read")
+    async_writer = database.make_async_engine(async_url, "write")
+    async_reader = database.make_async_engine(async_url, "read")
+    write_sessions = async_sessionmaker(async_writer, expire_on_commit=False)
+    read_sessions = async_sessionmaker(async_reader, expire_on_commit=False)
+
+    def sync_dependency(engine):
+        def dependency():
+            with Session(engine) as session:
+                yield session
+        return dependency
+
+    def async_dependency(sessions):
+        async def dependency():
+            async with sessions() as session:
+                yield session
+        return dependency
+
+    saved = dict(app.dependency_overrides)
+    app.dependency_overrides.update({
+        database.get_session: sync_dependency(sync_writer),
+        database.get_read_session: sync_dependency(sync_reader),
+        database.get_async_session: async_dependency(write_sessions),
+        database.get_async_read_session: async_dependency(read_sessions),
+    })
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            async def get(path):
+                response = await client.get(path)
+                response.raise_for_status()
+
+            def cold():
+                dashboard_cache.clear()
+                predictions.clear_cache()
+
+            results["GET /dashboard"] = await measure_async(lambda: get("/dashboard"), iterations, setup=cold)
+            results["GET /dashboard (cached)"] = await measure_async(lambda: get("/dashboard"), iterations)
+            results[f"GET /logs?limit={PAGE_SIZE}"] = await measure_async(lambda: get(f"/logs?limit={PAGE_SIZE}"), iterations)
+    finally:
+        app.dependency_overrides.clear()
+        app.dependency_overrides.update(saved)
+        await async_writer.dispose()
+        await async_reader.dispose()
+        sync_writer.dispose()
+        sync_reader.dispose()
+    return results
+
+def run(sizes, iterations: int = DEFAULT_ITERATIONS, seed: int = 0, data_dir: str = None) -> dict:
+    """Return ``{size: {case: summary}}``."""
+    results = {}
+    with tempfile.TemporaryDirectory() as scratch:
+        cache_dir = data_dir or scratch
+        os.makedirs(cache_dir, exist_ok=True)
+        for rows in sizes:
+            source = os.path.join(cache_dir, f"synthetic-{rows}-{seed}.db")
+            build_database(source, rows, seed)
+            working = os.path.join(scratch, f"bench-{rows}.db")
+            shutil.copyfile(source, working)
+            url = f"sqlite:///{working}"
+            # Datasets cached by an older checkout need the current schema
+            upgrade_engine = create_engine(url)
+            migrations.upgrade(upgrade_engine)
+            upgrade_engine.dispose()
+
+            samples = crud_cases(url, rows, iterations)
+            samples.update(asyncio.run(http_cases(url, iterations)))
+            results[str(rows)] = {case: summarise(s) for case, s in samples.items()}
+    return results
+
+def compare(results: dict, baseline: dict, threshold: float, metric: str = "p95") -> list:
+    """Cases whose ``metric`` grew by more than ``threshold`` (a fraction) over the baseline."""
+    regressions = []
+    for size, cases in results.items():
+        for case, summary in cases.items():
+            before = baseline.get(size, {}).get(case)
+            if before and summary[metric] > before[metric] * (1 + threshold):
+                regressions.append((size, case, before[metric], summary[metric]))
+    return regressions
+
+def report(results: dict):
+    for size, cases in results.items():
+        print(f"\n{int(size):,} rows")
+        print(f"  {'case':<30} {'p50':>9} {'p95':>9} {'p99':>9} {'max':>9}")
+        for case, s in cases.items():
+            print(f"  {case:<30} {s['p50']:>7.2f}ms {s['p95']:>7.2f}ms {s['p99']:>7.2f}ms {s['max']:>7.2f}ms")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.benchmarks.suite", description=__doc__.split("\n")[0])
+    parser.add_argument("--sizes", default=",".join(map(str, DEFAULT_SIZES)),
+                        type=lambda v: [int(x) for x in v.split(",") if x.strip()])
+    parser.add_argument("--iterations", type=int, default=DEFAULT_ITERATIONS)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-dir", default=None, help="Keep generated databases here between runs")
+    parser.add_argument("--save", default=None, help="Write the results as JSON")
+    parser.add_argument("--baseline", default=None, help="JSON from an earlier --save to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed p95 slowdown over the baseline, as a fraction")
+    args = parser.parse_args(argv)
+
+    results = run(args.sizes, iterations=args.iterations, seed=args.seed, data_dir=args.data_dir)
+    report(results)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for size, case, before, after in regressions:
+            print(f"REGRESSION {int(size):,} rows, {case}: p95 {before:.2f}ms -> {after:.2f}ms")
+        if regressions:
+            sys.exit(1)
+        print(f"\nNo p95 regressions above {args.threshold:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""Deterministic synthetic baby-log history for benchmarks and local testing.
+
+``generate`` walks forward day by day up to yesterday and emits LogCreate-shaped
+dicts: feeds every 2.5-3.5 hours with increasing feed ids, 6-10 diapers,
+naps and a night sleep that follow the developmental stage for the baby's
+age, and a weekly growth reading. The same ``seed`` always produces the same
+rows. Write an import file with::
+
+    python -m backend.benchmarks.synthetic --rows 100000 -o history.ndjson
+    python -m backend.manage import history.ndjson
+"""
+import argparse
+import json
+import random
+import sys
+from datetime import datetime, timedelta
+from typing import Iterator, Optional
+
+# (start hour, length in minutes) per stage, by age in days
+SLEEP_PLANS = [
+    (90, [(9, 120), (13, 120), (17, 90), (20, 660)]),
+    (180, [(9.5, 90), (13.5, 120), (19.5, 690)]),
+    (None, [(9.5, 90), (14, 120), (19, 720)]),
+]
+
+def _sleep_plan(age_days: int):
+    return next(plan for limit, plan in SLEEP_PLANS if limit is None or age_days < limit)
+
+def _fmt(ts: datetime) -> str:
+    return ts.isoformat(timespec="seconds")
+
+def _duration(seconds: int) -> str:
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+def generate_day(rng: random.Random, day: datetime, age_days: int, state: dict) -> list:
+    rows = []
+    t = day + timedelta(minutes=rng.randint(0, 90))
+    while t.date() == day.date():
+        seconds = rng.randint(8 * 60, 30 * 60)
+        state["feed_id"] += 1
+        rows.append({
+            "event": "Feeding", "timestamp": _fmt(t), "end_timestamp": _fmt(t + timedelta(seconds=seconds)),
+            "details": _duration(seconds), "orientation": rng.choice(["Left", "Right", "Left", "Right", "Expressed"]),
+            "feed_id": state["feed_id"],
+        })
+        t += timedelta(minutes=rng.randint(150, 210))
+
+    for _ in range(rng.randint(6, 10)):
+        rows.append({
+            "event": rng.choices(["Pee", "Poop", "Mixed"], weights=[6, 2, 2])[0],
+            "timestamp": _fmt(day + timedelta(minutes=rng.randint(0, 1439))),
+            "orientation": rng.choice(["Mum", "Dad"]),
+        })
+
+    for hour, minutes in _sleep_plan(age_days):
+        start = day + timedelta(minutes=int(hour * 60) + rng.randint(-30, 30))
+        seconds = max(10 * 60, int(minutes * 60 * rng.uniform(0.75, 1.15)))
+        rows.append({
+            "event": "Sleep", "timestamp": _fmt(start), "end_timestamp": _fmt(start + timedelta(seconds=seconds)),
+            "details": _duration(seconds),
+        })
+
+    if age_days % 7 == 0:
+        state["weight"] += rng.uniform(0.1, 0.25)
+        state["height"] += rng.uniform(0.3, 0.9)
+        rows.append({
+            "event": "Growth", "timestamp": _fmt(day + timedelta(hours=10)),
+            "weight": round(state["weight"], 2), "height": round(state["height"], 1),
+        })
+    return sorted(rows, key=lambda r: r["timestamp"])
+
+def _history(days: int, seed: int, end: datetime) -> Iterator[dict]:
+    rng = random.Random(seed)
+    start = end - timedelta(days=days - 1)
+    state = {"feed_id": 0, "weight": 3.4, "height": 50.0}
+    for age_days in range(days):
+        yield from generate_day(rng, start + timedelta(days=age_days), age_days, state)
+
+def generate(rows: Optional[int] = None, days: Optional[int] = None, seed: int = 0,
+             end: Optional[datetime] = None) -> Iterator[dict]:
+    """Yield synthetic logs in time order, with the last day on ``end`` (default: yesterday).
+
+    Give ``days`` to generate whole days, or ``rows`` for exactly that many
+    rows; the oldest surplus rows of the first day are then dropped so the
+    history still runs up to ``end``.
+    """
+    if rows is None and days is None:
+        raise ValueError("Pass rows or days")
+    end = (end or datetime.now() - timedelta(days=1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    if rows is None:
+        yield from _history(days, seed, end)
+        return
+    # Every day has at least 16 rows (7 feeds, 6 diapers, 3 sleeps), so this covers ``rows``
+    days = rows // 16 + 1
+    surplus = sum(1 for _ in _history(days, seed, end)) - rows
+    for i, row in enumerate(_history(days, seed, end)):
+        if i >= surplus:
+            yield row
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.benchmarks.synthetic", description=__doc__.split("\n")[0])
+    parser.add_argument("--rows", type=int, default=None)
+    parser.add_argument("--days", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("-o", "--output", default=None, help="NDJSON file; defaults to stdout")
+    args = parser.parse_args(argv)
+    if args.rows is None and args.days is None:
+        parser.error("pass --rows or --days")
+
+    out = open(args.output, "w") if args.output else sys.stdout
+    try:
+        for row in generate(rows=args.rows, days=args.days, seed=args.seed):
+            out.write(json.dumps(row) + "\n")
+    finally:
+        if args.output:
+            out.close()
+
+if __name__ == "__main__":
+    main()
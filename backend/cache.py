@@ -0,0 +1,108 @@
+"""Response caching helpers: a small TTL cache and strong-ETag conditional responses.
+
+Cached values are keyed on the database data version (see ``crud.get_data_version``),
+which every write bumps in the same transaction. Because the version lives in the
+database, entries stay correct when the bot or another worker process writes.
+"""
+import hashlib
+import threading
+import time
+from typing import Any, Hashable, Optional
+
+from fastapi import Request, Response
+
+from .encoding import available_encodings, choose_encoding, compress
+
+class TTLCache:
+    """Thread-safe mapping whose entries expire ``ttl`` seconds after they are set."""
+
+    def __init__(self, ttl: float, max_entries: int = 64):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            return value
+
+    def set(self, key: Hashable, value: Any) -> Any:
+        now = time.monotonic()
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                self._entries = {k: e for k, e in self._entries.items() if e[0] > now}
+                if len(self._entries) >= self.max_entries:
+                    self._entries.pop(next(iter(self._entries)))
+            self._entries[key] = (now + self.ttl, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+class CachedBody:
+    """Serialized body plus its strong ETag; compressed variants are made once, on first use.
+
+    ``encoded`` seeds variants compressed ahead of time, keyed by content coding.
+    """
+
+    __slots__ = ("body", "etag", "_encoded")
+
+    def __init__(self, body: bytes, encoded: dict = None):
+        self.body = body
+        self.etag = etag_for(body)
+        self._encoded = dict(encoded or {})
+
+    def encoded(self, encoding: str) -> bytes:
+        if encoding not in self._encoded:
+            self._encoded[encoding] = compress(self.body, encoding)
+        return self._encoded[encoding]
+
+def etag_for(*parts) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(part if isinstance(part, bytes) else str(part).encode())
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()}"'
+
+def _variant_etag(etag: str, encoding: Optional[str]) -> str:
+    # Each content coding is a different representation, so it gets its own strong ETag
+    return f'{etag[:-1]}-{encoding}"' if encoding else etag
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    candidates = {c.strip() for c in header.split(",")}
+    variants = {etag} | {_variant_etag(etag, e) for e in available_encodings()}
+    return "*" in candidates or bool(candidates & variants)
+
+def not_modified_response(etag: str, headers: dict = None, cache_control: str = "no-cache") -> Response:
+    return Response(status_code=304, headers={**(headers or {}), "ETag": etag, "Cache-Control": cache_control})
+
+def conditional_response(request: Request, body, etag: str = None, media_type: str = "application/json",
+                         headers: dict = None, cache_control: str = "no-cache") -> Response:
+    """Return 304 when the client already holds ``etag``, otherwise the body, compressed if accepted.
+
+    ``body`` is bytes or a CachedBody, whose ETag and compressed variants are reused.
+    """
+    cached = body if isinstance(body, CachedBody) else None
+    raw = cached.body if cached else body
+    etag = etag or cached.etag
+    encoding = choose_encoding(request.headers.get("accept-encoding"), len(raw))
+    variant = _variant_etag(etag, encoding)
+    headers = {**(headers or {}), "Vary": "Accept-Encoding"}
+    if is_not_modified(request, etag):
+        return not_modified_response(variant, headers, cache_control)
+    headers.update({"ETag": variant, "Cache-Control": cache_control})
+    if encoding:
+        headers["Content-Encoding"] = encoding
+        raw = cached.encoded(encoding) if cached else compress(raw, encoding)
+    return Response(content=raw, media_type=media_type, headers=headers)
@@ -0,0 +1,51 @@
+"""Helpers shared by crud and the modules it builds on, such as predictions.
+
+Kept apart from crud so those modules can import them at the top without an
+import cycle; crud re-exports them for everything else.
+"""
+from datetime import datetime, timedelta
+from functools import lru_cache
+
+from sqlalchemy.orm import Session
+
+from .config import get_config
+from .models import AppState
+
+SESSION_ONGOING = "ongoing"
+SESSION_COMPLETED = "completed"
+HISTORY_DAYS = 7
+
+# Data version: bumped by every write so caches in any process can tell when to recompute
+DATA_VERSION_KEY = "data_version"
+# Narrower versions for derived data that depends on a single event type only
+EVENT_VERSION_KEYS = {"Sleep": "sleep_version"}
+
+def get_timezone():
+    return get_config().tz
+
+def get_current_time():
+    return datetime.now(get_timezone())
+
+@lru_cache(maxsize=4096)
+def _day_tzinfo(tz, year, month, day):
+    """The local day's tzinfo when its UTC offset is constant, None on DST transition days."""
+    start = tz.localize(datetime(year, month, day))
+    end = tz.localize(datetime(year, month, day) + timedelta(days=1))
+    return start.tzinfo if start.utcoffset() == end.utcoffset() else None
+
+def _as_aware(ts):
+    # Naive values (filter bounds, imported rows) are read as local wall-clock time
+    if ts is not None and ts.tzinfo is None:
+        tz = get_timezone()
+        day_tz = _day_tzinfo(tz, ts.year, ts.month, ts.day)
+        ts = ts.replace(tzinfo=day_tz) if day_tz is not None else tz.localize(ts)
+    return ts
+
+def _local_naive(ts):
+    # Local wall-clock time of an aware value (timestamps are read back as aware UTC)
+    if ts is not None and ts.tzinfo is not None:
+        ts = ts.astimezone(get_timezone()).replace(tzinfo=None)
+    return ts
+
+def get_version(db: Session, key: str = DATA_VERSION_KEY) -> int:
+    return db.query(AppState.value).filter(AppState.key == key).scalar() or 0
@@ -0,0 +1,157 @@
+"""Cached, hot-reloading view of config.yaml.
+
+``get_config()`` returns the current ``Config``: the parsed file plus the values
+derived from it (timezone object, date of birth, developmental stage). The file
+is stat-ed at most once every ``CHECK_INTERVAL`` seconds and re-parsed only
+when its mtime or size changes, so timezone and DOB edits apply without a
+restart. A timezone change also runs the callbacks registered with
+``on_timezone_change``, which the API and the bot use to re-bucket logs and the
+daily rollup by the new local day. ``Config.version`` is a digest of the file contents, stable across
+processes, which ``GET /config`` uses as its ETag.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from datetime import date, datetime
+from functools import lru_cache
+
+import pytz
+import yaml
+
+logger = logging.getLogger(__name__)
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CONFIG_PATH = os.path.join(BASE_DIR, "config.yaml")
+CHECK_INTERVAL = 1.0
+DEFAULT_TIMEZONE = "Europe/London"
+
+# Developmental sleep norms by age, first match wins
+STAGES = [
+    {
+        "max_months": 3, "stage": "Newborn", "norm_total": 14.0, "norm_naps": 4,
+        "windows": [
+            {"start": "09:00", "end": "11:00"},
+            {"start": "13:00", "end": "15:00"},
+            {"start": "17:00", "end": "18:30"},
+            {"start": "20:00", "end": "07:00"},
+        ],
+    },
+    {
+        "max_months": 6, "stage": "3-6 Months", "norm_total": 13.0, "norm_naps": 3,
+        "windows": [
+            {"start": "09:30", "end": "11:00"},
+            {"start": "13:30", "end": "15:30"},
+            {"start": "19:30", "end": "07:00"},
+        ],
+    },
+    {
+        "max_months": None, "stage": "6-12 Months", "norm_total": 12.0, "norm_naps": 2,
+        "windows": [
+            {"start": "09:30", "end": "11:00"},
+            {"start": "14:00", "end": "16:00"},
+            {"start": "19:00", "end": "07:00"},
+        ],
+    },
+]
+
+def _parse_date(value) -> date:
+    if isinstance(value, str):
+        return datetime.strptime(value, "%Y-%m-%d").date()
+    if isinstance(value, datetime):
+        return value.date()
+    return value
+
+class Config:
+    """One parsed revision of the config file; treat as immutable."""
+
+    def __init__(self, raw: bytes):
+        self.raw = raw
+        self.version = hashlib.sha1(raw).hexdigest()
+        self.data = yaml.safe_load(raw) or {}
+        self.user = self.data.get("user") or {}
+        self.timezone_name = self.data.get("timezone", DEFAULT_TIMEZONE)
+        self.tz = pytz.timezone(self.timezone_name)
+        self.date_of_birth = _parse_date(self.user.get("date_of_birth"))
+        # Per instance, so a reload never serves stages derived from the old DOB
+        self.age_months = lru_cache(maxsize=8)(self._age_months)
+        self.stage = lru_cache(maxsize=8)(self._stage)
+
+    def _age_months(self, today: date) -> int:
+        dob = self.date_of_birth
+        months = (today.year - dob.year) * 12 + today.month - dob.month
+        if today.day < dob.day:
+            months -= 1
+        return months
+
+    def _stage(self, today: date) -> dict:
+        """The developmental sleep norms that apply on ``today``."""
+        months = self.age_months(today)
+        return next(s for s in STAGES if s["max_months"] is None or months < s["max_months"])
+
+class ConfigService:
+    def __init__(self, path: str = CONFIG_PATH, check_interval: float = CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._config = None
+        self._signature = None
+        self._checked_at = float("-inf")
+        self._timezone_callbacks = []
+
+    def on_timezone_change(self, callback):
+        """Call ``callback(previous, config)`` after a reload that changes the timezone."""
+        self._timezone_callbacks.append(callback)
+
+    def get(self) -> Config:
+        now = time.monotonic()
+        if self._config is not None and now - self._checked_at < self.check_interval:
+            return self._config
+        with self._lock:
+            previous, config = self._config, self._check(now)
+        # Outside the lock: the callbacks read the new config through get()
+        if previous is not None and previous.timezone_name != config.timezone_name:
+            self._timezone_changed(previous, config)
+        return config
+
+    def _check(self, now: float) -> Config:
+        self._checked_at = now
+        stat = os.stat(self.path)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        if signature != self._signature:
+            try:
+                with open(self.path, "rb") as f:
+                    config = Config(f.read())
+            except (yaml.YAMLError, ValueError, pytz.UnknownTimeZoneError) as e:
+                # Keep serving the last good revision while the file is being edited
+                if self._config is None:
+                    raise
+                self._signature = signature
+                logger.error("Ignoring invalid %s: %s", self.path, e)
+                return self._config
+            previous, self._config, self._signature = self._config, config, signature
+            if previous is not None and previous.version != config.version:
+                logger.info("Reloaded %s", self.path)
+        return self._config
+
+    def _timezone_changed(self, previous: Config, config: Config):
+        if not self._timezone_callbacks:
+            logger.warning(
+                "Timezone changed from %s to %s; run `python -m backend.manage rebuild-rollup` "
+                "to re-bucket logs and the daily rollup by the new local day", previous.timezone_name, config.timezone_name,
+            )
+            return
+        logger.info("Timezone changed from %s to %s; re-bucketing logs by the new local day",
+                    previous.timezone_name, config.timezone_name)
+        for callback in self._timezone_callbacks:
+            try:
+                callback(previous, config)
+            except Exception:
+                logger.exception("Re-bucketing failed; run `python -m backend.manage rebuild-rollup` "
+                                 "to rebuild the local days and the daily rollup")
+
+service = ConfigService()
+
+def get_config() -> Config:
+    return service.get()
@@ -1,81 +1,724 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func, and_, or_
-from .models import Log
+from sqlalchemy import bindparam, func, and_, case, insert, select, tuple_, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from . import archive, config
+from .common import (DATA_VERSION_KEY, EVENT_VERSION_KEYS, HISTORY_DAYS, SESSION_COMPLETED, SESSION_ONGOING,
+                     _as_aware, _local_naive, get_current_time, get_timezone, get_version)
+from .predictions import get_sleep_predictions
+from .models import Log, DailySummary, AppState, LogTombstone
 from .schemas import LogCreate
-from datetime import datetime, timedelta
-import pytz
-import yaml
+from datetime import datetime, date, timedelta, timezone
+import base64
+import binascii
+import json
 
-with open("config.yaml", "r") as f:
-    config = yaml.safe_load(f)
+def log_event(db: Session, log: LogCreate):
+    return log_events(db, [log])[0]
 
-TIMEZONE = config.get('timezone', 'Europe/London')
-tz = pytz.timezone(TIMEZONE)
+def log_events(db: Session, logs):
+    """Insert ``logs`` in order in a single transaction and return them with their ids.
 
-def get_current_time():
-    return datetime.now(tz)
+    The batch shares one rollup refresh and one commit; each log still gets its
+    own change notification.
+    """
+    db_logs = _insert_logs(db, logs)
+    db.commit()
+    for db_log in db_logs:
+        db.refresh(db_log)
+    return db_logs
 
-def log_event(db: Session, log: LogCreate):
-    db_log = Log(**log.dict())
-    if not db_log.timestamp:
-        db_log.timestamp = get_current_time()
-    db.add(db_log)
+def _insert_logs(db: Session, logs):
+    db_logs = []
+    first_rev = next_revision(db, len(logs)) - len(logs) + 1
+    for rev, log in enumerate(logs, first_rev):
+        db_log = Log(**log.dict(), rev=rev)
+        if not db_log.timestamp:
+            db_log.timestamp = get_current_time()
+        _normalise_times(db_log)
+        sync_session_fields(db_log, log.model_fields_set)
+        db.add(db_log)
+        # Flushed one at a time so ids follow the order of ``logs``
+        db.flush()
+        db_logs.append(db_log)
+    clear_tombstones(db, first_rev, first_rev + len(logs) - 1)
+    advance_feed_id(db, [l.feed_id for l in db_logs if l.event == "Feeding"])
+    refresh_daily_summary(db, set().union(*(_summary_keys(l) for l in db_logs)))
+    for db_log in db_logs:
+        note_change(db, {db_log.event}, action="created", id=db_log.id, event=db_log.event)
+    return db_logs
+
+def _writable_log(db: Session, log_id: int):
+    """The row ``log_id`` in ``logs``, moved back from the archive first if it was archived."""
+    db_log = db.query(Log).filter(Log.id == log_id).first()
+    if db_log is None and archive.get_cutoff(db) is not None and archive.restore(db, log_id):
+        db_log = db.query(Log).filter(Log.id == log_id).first()
+    return db_log
+
+def update_log(db: Session, log_id: int, log_data: LogCreate):
+    db_log = _writable_log(db, log_id)
+    if not db_log:
+        return None
+
+    keys = _summary_keys(db_log)
+    changes = log_data.dict(exclude_unset=True)
+    for key, value in changes.items():
+        setattr(db_log, key, value)
+    _normalise_times(db_log)
+    sync_session_fields(db_log, changes.keys())
+    if db_log.event == "Feeding" and "feed_id" in changes:
+        advance_feed_id(db, [db_log.feed_id])
+    _record_write(db, keys | _summary_keys(db_log), "updated", db_log)
     db.commit()
     db.refresh(db_log)
     return db_log
 
-def get_logs(db: Session, skip: int = 0, limit: int = 100, event: str = None):
-    query = db.query(Log)
+LOG_FIELDS = ("id", "event", "details", "status", "duration_seconds", "timestamp", "comments",
+              "end_timestamp", "orientation", "feed_id", "weight", "height", "rev", "duration_minutes")
+
+def encode_cursor(timestamp, log_id: int) -> str:
+    raw = json.dumps([timestamp.isoformat(), log_id]).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+def decode_cursor(cursor: str):
+    """Inverse of encode_cursor; raises ValueError for anything it did not produce."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, log_id = json.loads(raw)
+        timestamp = datetime.fromisoformat(timestamp)
+        if timestamp.utcoffset() is None:
+            raise ValueError("Cursor timestamp has no offset")
+        return timestamp, int(log_id)
+    except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+        raise ValueError("Invalid cursor")
+
+def parse_fields(fields: str = None):
+    """Split a ``fields=`` projection, keeping LOG_FIELDS order; None means every field."""
+    if not fields:
+        return None
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(LOG_FIELDS)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return [f for f in LOG_FIELDS if f in requested]
+
+def local_keys(ts):
+    """``(local_date, local_minute)`` of an instant in the configured timezone."""
+    local = _as_aware(ts).astimezone(get_timezone())
+    return local.date().isoformat(), local.hour * 60 + local.minute
+
+def _normalise_times(log: Log):
+    log.timestamp = _as_aware(log.timestamp)
+    log.end_timestamp = _as_aware(log.end_timestamp)
+    log.local_date, log.local_minute = local_keys(log.timestamp)
+
+def rebuild_local_keys(db: Session, batch_size: int = 5000) -> int:
+    """Recompute local_date / local_minute of every row, e.g. after a timezone change; the caller commits."""
+    updated = 0
+    for entity in archive.tiers(db):
+        table = entity.__table__ if entity is Log else archive.logs
+        batch = []
+        for row in db.query(entity.id, entity.timestamp).yield_per(batch_size):
+            local_date, local_minute = local_keys(row.timestamp)
+            batch.append({"row_id": row.id, "local_date": local_date, "local_minute": local_minute})
+            if len(batch) >= batch_size:
+                updated += _write_local_keys(db, table, batch)
+                batch = []
+        updated += _write_local_keys(db, table, batch)
+    return updated
+
+def _write_local_keys(db: Session, table, batch) -> int:
+    if batch:
+        db.connection().execute(
+            update(table).where(table.c.id == bindparam("row_id"))
+            .values(local_date=bindparam("local_date"), local_minute=bindparam("local_minute")),
+            batch,
+        )
+    return len(batch)
+
+def format_duration(seconds: int) -> str:
+    hours, remainder = divmod(int(seconds), 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+def parse_duration(details):
+    """Seconds in an "HH:MM:SS" string, or None if ``details`` is not one."""
+    if not details or details.count(":") != 2:
+        return None
+    try:
+        hours, minutes, seconds = map(int, details.split(":"))
+    except ValueError:
+        return None
+    return hours * 3600 + minutes * 60 + seconds
+
+def sync_session_fields(log, changed):
+    """Keep ``status``/``duration_seconds`` and the legacy ``details`` string in step.
+
+    ``changed`` names the fields the caller set; whichever representation was
+    written wins, so old clients that only know ``details`` keep working.
+    """
+    if "details" in changed:
+        if log.details == SESSION_ONGOING:
+            log.status = SESSION_ONGOING
+        else:
+            seconds = parse_duration(log.details)
+            if seconds is not None:
+                log.duration_seconds = seconds
+            if log.status == SESSION_ONGOING:
+                log.status = None
+    elif "status" in changed:
+        if log.status == SESSION_ONGOING:
+            log.details = SESSION_ONGOING
+        elif log.details == SESSION_ONGOING:
+            log.details = None
+
+    if log.status == SESSION_ONGOING:
+        log.duration_seconds = None
+        return
+    if log.duration_seconds is None and log.end_timestamp is not None and log.timestamp is not None:
+        log.duration_seconds = int((_as_aware(log.end_timestamp) - _as_aware(log.timestamp)).total_seconds())
+    if log.duration_seconds is not None and (log.details is None or ("details" not in changed and "duration_seconds" in changed)):
+        log.details = format_duration(log.duration_seconds)
+    log.status = SESSION_COMPLETED if log.details is not None or log.status == SESSION_COMPLETED else None
+
+def _filter_logs(query, entity=Log, event=None, cursor=None, start=None, end=None):
     if event:
-        query = query.filter(Log.event == event)
-    return query.order_by(Log.timestamp.desc()).offset(skip).limit(limit).all()
+        query = query.filter(entity.event == event)
+    if start:
+        query = query.filter(entity.timestamp >= _as_aware(start))
+    if end:
+        query = query.filter(entity.timestamp < _as_aware(end))
+    if cursor:
+        # Keyset pagination: rows strictly after the cursor in (timestamp, id) descending order.
+        # The timestamp is bound with the column's type so it is stored-format UTC, like the rows.
+        timestamp, log_id = decode_cursor(cursor)
+        query = query.filter(tuple_(entity.timestamp, entity.id) <
+                             tuple_(bindparam(None, timestamp, type_=entity.timestamp.type), log_id))
+    return query.order_by(entity.timestamp.desc(), entity.id.desc())
 
-def stop_ongoing_session(db: Session, event_type: str):
-    ongoing = db.query(Log).filter(
-        and_(Log.event == event_type, Log.details == "ongoing")
+def _page(db: Session, query_for, skip: int, limit: int, **filters):
+    """A page of ``query_for(entity)`` rows, newest first, across the hot and archived tiers.
+
+    The archive is only read when the page may reach past the archive cutoff:
+    every archived row is older than it, so a full page of hot rows at or after
+    the cutoff is the answer on its own.
+    """
+    hot = _filter_logs(query_for(Log), Log, **filters)
+    cutoff = archive.get_cutoff(db)
+    if cutoff is None or (filters.get("start") and _as_aware(filters["start"]) >= cutoff):
+        return hot.offset(skip).limit(limit).all()
+    rows = hot.limit(skip + limit).all()
+    if len(rows) == skip + limit and rows[-1].timestamp >= cutoff:
+        return rows[skip:]
+    rows += _filter_logs(query_for(archive.ArchivedLog), archive.ArchivedLog, **filters).limit(skip + limit).all()
+    rows.sort(key=lambda r: (r.timestamp, r.id), reverse=True)
+    return rows[skip:skip + limit]
+
+def get_logs(db: Session, skip: int = 0, limit: int = 100, event: str = None,
+             cursor: str = None, start: datetime = None, end: datetime = None):
+    return _page(db, db.query, skip, limit, event=event, cursor=cursor, start=start, end=end)
+
+def get_log_rows(db: Session, fields, skip: int = 0, limit: int = 100, event: str = None,
+                 cursor: str = None, start: datetime = None, end: datetime = None):
+    """Like get_logs, but selects only the columns behind ``fields`` and returns plain dicts.
+
+    Returns ``(rows, next_cursor)``; next_cursor is None once the last page is reached.
+    """
+    columns = {"id", "timestamp"} | {f for f in fields if f != "duration_minutes"}
+    if "duration_minutes" in fields:
+        columns.add("duration_seconds")
+    rows = _page(db, lambda entity: db.query(*[getattr(entity, c) for c in LOG_FIELDS if c in columns]),
+                 skip, limit, event=event, cursor=cursor, start=start, end=end)
+
+    items = _row_dicts(rows, fields)
+    next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id) if rows and len(rows) == limit else None
+    return items, next_cursor
+
+def _row_dicts(rows, fields):
+    items = []
+    for row in rows:
+        values = row._mapping
+        item = {f: values[f] for f in fields if f != "duration_minutes"}
+        if "duration_minutes" in fields:
+            item["duration_minutes"] = round((values["duration_seconds"] or 0) / 60, 2)
+        items.append(item)
+    return items
+
+def get_ongoing(db: Session, event_type: str):
+    return db.query(Log).filter(
+        and_(Log.event == event_type, Log.status == SESSION_ONGOING)
     ).order_by(Log.timestamp.desc()).first()
-    
-    if ongoing:
-        end_time = get_current_time()
-        start_time = ongoing.timestamp
-        if start_time.tzinfo is None:
-            start_time = tz.localize(start_time)
-            
-        duration = end_time - start_time
-        hours, remainder = divmod(int(duration.total_seconds()), 3600)
-        minutes, seconds = divmod(remainder, 60)
-        duration_str = f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-        
-        ongoing.details = duration_str
-        ongoing.end_timestamp = end_time
-        db.commit()
-        db.refresh(ongoing)
+
+SESSION_EVENTS = ("Feeding", "Sleep")
+
+def _newest_ids(events, status: str = None, entity=Log):
+    # One index seek per event type for its newest row, so the cost does not grow with history
+    newest = []
+    for event in events:
+        query = select(entity.id).where(entity.event == event)
+        if status:
+            query = query.where(entity.status == status)
+        newest.append(query.order_by(entity.timestamp.desc(), entity.id.desc()).limit(1).scalar_subquery())
+    return entity.id.in_(newest)
+
+def _newest(db: Session, query_for, events, status: str = None):
+    """``query_for(entity)`` rows for the newest log of each type in ``events``, newest first.
+
+    The archive is only searched for types without a hot row after its cutoff.
+    """
+    rows = query_for(Log).filter(_newest_ids(events, status)).all()
+    cutoff = archive.get_cutoff(db)
+    if cutoff is not None:
+        recent = {r.event for r in rows if r.timestamp >= cutoff}
+        older = [e for e in events if e not in recent]
+        if older:
+            entity = archive.ArchivedLog
+            rows += query_for(entity).filter(_newest_ids(older, status, entity)).all()
+    newest = {}
+    for row in sorted(rows, key=lambda r: (r.timestamp, r.id), reverse=True):
+        newest.setdefault(row.event, row)
+    return list(newest.values())
+
+def get_latest(db: Session, events, status: str = None):
+    """The newest log of any type in ``events``, optionally with the given status."""
+    rows = _newest(db, db.query, events, status)
+    return rows[0] if rows else None
+
+def get_ongoing_sessions(db: Session, events=SESSION_EVENTS):
+    """Ongoing sessions, newest first."""
+    return db.query(Log).filter(
+        and_(Log.event.in_(events), Log.status == SESSION_ONGOING)
+    ).order_by(Log.timestamp.desc(), Log.id.desc()).all()
+
+def get_time_since(db: Session, events):
+    """How long ago the newest log of any type in ``events`` was, as seconds and as "2h 5m"."""
+    rows = _newest(db, lambda entity: db.query(entity.event, entity.timestamp, entity.id), events)
+    latest = rows[0] if rows else None
+    if latest is None:
+        return {"event": None, "timestamp": None, "seconds": None, "text": "Never"}
+    now = get_current_time()
+    return {
+        "event": latest.event,
+        "timestamp": latest.timestamp,
+        "seconds": int((now - _as_aware(latest.timestamp)).total_seconds()),
+        "text": _time_since_str(now, latest.timestamp),
+    }
+
+def stop_ongoing_session(db: Session, event_type: str):
+    """Stop the ongoing ``event_type`` session; returns it, or None if there was none."""
+    stopped = stop_session(db, event_type)["stopped"]
+    return stopped[0] if stopped else None
+
+# Session transitions. Each is a single transaction on the write engine, whose
+# BEGIN IMMEDIATE holds the write lock from the first lookup, so concurrent taps
+# queue up instead of both seeing no ongoing session. Every transition stops all
+# ongoing sessions of its type, which also heals duplicates left by older clients.
+SWITCH_SIDES = {"Left": "Right", "Right": "Left"}
+
+def _stop(db: Session, ongoing: Log, end_time: datetime) -> Log:
+    start_time = _as_aware(ongoing.timestamp)
+    duration = max(0, int((end_time - start_time).total_seconds()))
+    # details keeps the "HH:MM:SS" form older clients read
+    ongoing.status = SESSION_COMPLETED
+    ongoing.duration_seconds = duration
+    ongoing.details = format_duration(duration)
+    ongoing.end_timestamp = max(end_time, start_time)
+    _record_write(db, _summary_keys(ongoing), "updated", ongoing)
     return ongoing
 
-def get_stats(db: Session):
+def _transition(db: Session, event: str, start: LogCreate = None, end_time: datetime = None):
+    end_time = end_time or get_current_time()
+    stopped = [_stop(db, log, end_time) for log in get_ongoing_sessions(db, [event])]
+    started = _insert_logs(db, [start])[0] if start is not None else None
+    db.commit()
+    for log in stopped + ([started] if started is not None else []):
+        db.refresh(log)
+    return {"stopped": stopped, "started": started}
+
+def start_session(db: Session, event: str, orientation: str = None, timestamp: datetime = None,
+                  comments: str = None):
+    """Stop any ongoing ``event`` session and start a new one; feeds take the next feed_id.
+
+    The stopped session ends when the new one starts. Returns ``{"stopped", "started"}``.
+    """
+    now = get_current_time()
+    start = LogCreate(event=event, status=SESSION_ONGOING, orientation=orientation,
+                      timestamp=timestamp or now, comments=comments,
+                      feed_id=next_feed_id(db) if event == "Feeding" else None)
+    return _transition(db, event, start, end_time=_as_aware(start.timestamp))
+
+def stop_session(db: Session, event: str):
+    """Stop every ongoing ``event`` session; returns ``{"stopped", "started": None}``."""
+    return _transition(db, event)
+
+def switch_session(db: Session, event: str, orientation: str = None):
+    """Stop the ongoing feed and carry on from the other side under the same feed_id.
+
+    ``orientation`` defaults to the other breast; with no feed ongoing this starts one.
+    """
+    if event != "Feeding":
+        raise ValueError(f"Only feeds can switch side, not {event}")
+    ongoing = get_ongoing(db, event)
+    if ongoing is None:
+        return start_session(db, event, orientation=orientation)
+    orientation = orientation or SWITCH_SIDES.get(ongoing.orientation)
+    if orientation is None:
+        raise ValueError(f"No side to switch to from {ongoing.orientation or 'an unknown side'}")
+    now = get_current_time()
+    start = LogCreate(event=event, status=SESSION_ONGOING, orientation=orientation, timestamp=now,
+                      feed_id=ongoing.feed_id or next_feed_id(db))
+    return _transition(db, event, start, end_time=now)
+
+def get_sessions(db: Session, events=SESSION_EVENTS):
+    """The ongoing session of each type in ``events``, or None; one indexed lookup."""
+    sessions = dict.fromkeys(events)
+    for log in get_ongoing_sessions(db, events):
+        if sessions[log.event] is None:
+            sessions[log.event] = log
+    return sessions
+
+DIAPER_TYPES = ["Pee", "Poop", "Mixed"]
+
+def _time_since_str(now, ts):
+    if ts is None: return "Never"
+    ts = _as_aware(ts)
+    diff = now - ts
+    h, rem = divmod(int(diff.total_seconds()), 3600)
+    m = rem // 60
+    return f"{h}h {m}m" if h > 0 else f"{m}m"
+
+# Daily rollup: one daily_summary row per (local day, event), recomputed for the
+# affected keys inside every write transaction so history reads cost O(days).
+ORIENTATION_COLUMNS = {"Left": "left_count", "Right": "right_count", "Expressed": "expressed_count"}
+
+def _summary_keys(log: Log):
+    return {(log.local_date, log.event)}
+
+def _new_summary(day: str, event: str):
+    return DailySummary(day=day, event=event, count=0, done_count=0, minutes=0.0,
+                        left_count=0, right_count=0, expressed_count=0)
+
+def _rollup_columns(entity):
+    # Per (day, event) aggregates, computed by SQLite over the day's rows
+    return (
+        entity.event,
+        func.count().label("count"),
+        func.count(case((entity.status == SESSION_COMPLETED, 1))).label("done_count"),
+        (func.total(entity.duration_seconds) / 60).label("minutes"),
+        *[func.count(case((entity.orientation == o, 1))).label(c) for o, c in ORIENTATION_COLUMNS.items()],
+    )
+
+# Days recomputed per statement, to keep the bound parameters well under SQLite's limit
+ROLLUP_CHUNK_DAYS = 500
+
+def _write_rollup(db: Session, where, since=None):
+    """INSERT the rollup rows for the raw rows matching ``where(entity)`` with one grouped SELECT."""
+    source = archive.source(db, where, since)
+    ranked = select(
+        source.local_date, source.event, source.status, source.duration_seconds, source.orientation,
+        source.weight, source.height,
+        func.row_number().over(
+            partition_by=(source.local_date, source.event),
+            order_by=(source.timestamp.desc(), source.id.desc()),
+        ).label("position"),
+    ).where(where(source)).subquery()
+    # Growth rows also carry the day's last reading
+    last_growth = and_(ranked.c.position == 1, ranked.c.event == "Growth")
+    rollup = select(
+        ranked.c.local_date, *_rollup_columns(ranked.c),
+        func.max(case((last_growth, ranked.c.weight))),
+        func.max(case((last_growth, ranked.c.height))),
+    ).group_by(ranked.c.local_date, ranked.c.event)
+    names = ["day", "event", "count", "done_count", "minutes", *ORIENTATION_COLUMNS.values(), "weight", "height"]
+    db.execute(insert(DailySummary.__table__).from_select(names, rollup))
+
+def refresh_daily_summary(db: Session, keys):
+    """Recompute the rollup rows for ``keys`` from the (flushed) raw rows; the caller commits.
+
+    Touched days are recomputed together, a chunk of days per statement, for
+    every event type touched in any of them; a row recomputed without need is
+    rewritten with the same values. Days before the archive cutoff are counted
+    across both tiers.
+    """
+    db.flush()
+    events = sorted({event for _, event in keys})
+    days = sorted({day for day, _ in keys})
+    for i in range(0, len(days), ROLLUP_CHUNK_DAYS):
+        chunk = days[i:i + ROLLUP_CHUNK_DAYS]
+
+        def in_days(entity, chunk=chunk):
+            return and_(entity.event.in_(events), entity.local_date.in_(chunk))
+
+        db.query(DailySummary).filter(
+            and_(DailySummary.day.in_(chunk), DailySummary.event.in_(events))
+        ).delete(synchronize_session="fetch")
+        _write_rollup(db, in_days, _as_aware(datetime.fromisoformat(chunk[0])))
+
+def rebuild_daily_summary(db: Session):
+    """Recompute the whole rollup from `logs`; the caller commits."""
+    db.query(DailySummary).delete()
+    _write_rollup(db, lambda entity: entity.local_date.isnot(None))
+    db.flush()
+    return db.query(DailySummary).count()
+
+def rebuild_local_days(db: Session):
+    """Re-bucket every log by local day in the current timezone and rebuild the rollup; the caller commits.
+
+    Returns ``(logs, rollup_rows)``.
+    """
+    logs = rebuild_local_keys(db)
+    rows = rebuild_daily_summary(db)
+    note_change(db, EVENT_VERSION_KEYS, action="rebuilt")
+    return logs, rows
+
+def rebuild_on_timezone_change(engine):
+    """Run rebuild_local_days on ``engine`` whenever a config.yaml reload changes the timezone."""
+    def rebuild(previous, current):
+        with Session(engine) as db:
+            rebuild_local_days(db)
+            db.commit()
+    config.service.on_timezone_change(rebuild)
+
+# Data version: bumped by every write so caches in any process can tell when to recompute
+def bump_version(db: Session, key: str = DATA_VERSION_KEY, amount: int = 1) -> int:
+    return db.execute(
+        sqlite_insert(AppState)
+        .values(key=key, value=amount)
+        .on_conflict_do_update(index_elements=["key"], set_={"value": AppState.value + amount})
+        .returning(AppState.value)
+    ).scalar_one()
+
+def get_data_version(db: Session) -> int:
+    return get_version(db)
+
+def bump_data_version(db: Session) -> int:
+    return bump_version(db)
+
+def note_change(db: Session, events=(), **change):
+    """Bump the data version (and those of ``events``) and queue ``change`` for the
+    change listeners (see events.py).
+
+    Listeners only hear about it once the surrounding transaction commits.
+    """
+    for key in sorted({EVENT_VERSION_KEYS[e] for e in events if e in EVENT_VERSION_KEYS}):
+        bump_version(db, key)
+    change["version"] = bump_data_version(db)
+    db.info.setdefault("pending_changes", []).append(change)
+
+# Change journal: every inserted or updated log takes the next revision, and every
+# deleted one leaves a tombstone at its revision, so clients can ask for what changed
+LOG_REVISION_KEY = "log_revision"
+CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 5000
+
+def next_revision(db: Session, count: int = 1) -> int:
+    """Reserve ``count`` revisions and return the last one; the write lock keeps them in commit order."""
+    return bump_version(db, LOG_REVISION_KEY, count)
+
+def get_log_revision(db: Session) -> int:
+    return get_version(db, LOG_REVISION_KEY)
+
+def clear_tombstones(db: Session, first_rev: int, last_rev: int):
+    # A live row must never also look deleted; ids were reused before logs was AUTOINCREMENT
+    db.query(LogTombstone).filter(
+        LogTombstone.id.in_(select(Log.id).where(Log.rev.between(first_rev, last_rev)))
+    ).delete(synchronize_session=False)
+
+def get_changes(db: Session, since: int = 0, limit: int = CHANGES_LIMIT):
+    """Logs inserted or updated, and ids deleted, after revision ``since``, oldest first.
+
+    Returns ``{"rev", "logs", "deleted", "has_more"}``. ``rev`` is the revision to
+    pass as ``since`` next time; with ``has_more`` the caller should ask again
+    straight away. A ``rev`` lower than ``since`` means the client's mirror came
+    from another database and must be rebuilt.
+    """
+    limit = max(1, min(limit, MAX_CHANGES_LIMIT))
+    fields = list(LOG_FIELDS)
+    # Archived rows keep their revision, so a client that far behind still hears of them
+    source = archive.source(db, lambda entity: entity.rev > since)
+    rows = db.query(*[getattr(source, c) for c in fields if c != "duration_minutes"]).filter(
+        source.rev > since
+    ).order_by(source.rev).limit(limit + 1).all()
+    tombstones = db.query(LogTombstone.id, LogTombstone.rev).filter(
+        LogTombstone.rev > since
+    ).order_by(LogTombstone.rev).limit(limit + 1).all()
+
+    changes = sorted([(r.rev, "log", r) for r in rows] + [(t.rev, "deleted", t) for t in tombstones],
+                     key=lambda c: c[0])
+    has_more = len(changes) > limit
+    changes = changes[:limit]
+    rev = changes[-1][0] if has_more else get_log_revision(db)
+    return {
+        "rev": rev,
+        "logs": _row_dicts([r for _, kind, r in changes if kind == "log"], fields),
+        "deleted": [t.id for _, kind, t in changes if kind == "deleted"],
+        "has_more": has_more,
+    }
+
+def _record_write(db: Session, keys, action: str, log: Log):
+    """Bookkeeping shared by every write path; runs inside the caller's transaction."""
+    if action == "deleted":
+        db.merge(LogTombstone(id=log.id, rev=next_revision(db), event=log.event))
+    else:
+        log.rev = next_revision(db)
+    refresh_daily_summary(db, keys)
+    note_change(db, {event for _, event in keys}, action=action, id=log.id, event=log.event)
+
+def get_daily_summaries(db: Session, first_day: date):
+    """Rollup rows from ``first_day`` onwards as {day: {event: DailySummary}}."""
+    days = {}
+    for s in db.query(DailySummary).filter(DailySummary.day >= first_day.isoformat()).all():
+        days.setdefault(s.day, {})[s.event] = s
+    return days
+
+# Analytics: time-bucketed series. Day and coarser buckets aggregate the rollup in
+# SQL, so a year costs O(days); hour buckets group the raw rows of a short range.
+ANALYTICS_BUCKETS = {"hour": timedelta(hours=1), "day": timedelta(days=1),
+                     "week": timedelta(weeks=1), "month": timedelta(days=31)}
+ANALYTICS_DEFAULT_POINTS = 200
+ANALYTICS_MAX_POINTS = 1000
+
+def _bucket_start(day: date, bucket: str) -> date:
+    if bucket == "week":
+        return day - timedelta(days=day.weekday())
+    if bucket == "month":
+        return day.replace(day=1)
+    return day
+
+def _next_bucket(day: date, bucket: str) -> date:
+    if bucket == "month":
+        return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return day + ANALYTICS_BUCKETS[bucket]
+
+def _rollup_bucket(bucket: str):
+    # Mondays and first-of-month as ISO dates, to match _bucket_start
+    if bucket == "week":
+        return func.date(DailySummary.day, "-6 days", "weekday 1")
+    if bucket == "month":
+        return func.strftime("%Y-%m-01", DailySummary.day)
+    return DailySummary.day
+
+def choose_bucket(bucket: str, start, end, max_points: int = ANALYTICS_DEFAULT_POINTS) -> str:
+    """``bucket``, or the first coarser one that keeps the range within ``max_points``."""
+    names = list(ANALYTICS_BUCKETS)
+    if bucket not in ANALYTICS_BUCKETS:
+        raise ValueError(f"Unknown bucket: {bucket}. Use one of: {', '.join(names)}")
+    for name in names[names.index(bucket):]:
+        if (end - start) / ANALYTICS_BUCKETS[name] <= max_points:
+            return name
+    raise ValueError(f"Range too long for {max_points} points")
+
+def _analytics_point(start: str, row=None) -> dict:
+    count = row.count if row else 0
+    done = row.done_count if row else 0
+    minutes = (row.minutes or 0.0) if row else 0.0
+    return {
+        "start": start, "count": count, "done_count": done, "minutes": round(minutes, 1),
+        "avg_minutes": round(minutes / done, 1) if done else None, "hours": round(minutes / 60, 2),
+        "left_count": row.left_count if row else 0, "right_count": row.right_count if row else 0,
+        "expressed_count": row.expressed_count if row else 0, "weight": None, "height": None,
+    }
+
+def _rollup_series(db: Session, events, bucket: str, first_day: date, last_day: date):
+    key = _rollup_bucket(bucket).label("bucket")
+    in_range = and_(DailySummary.event.in_(events), DailySummary.day >= first_day.isoformat(),
+                    DailySummary.day <= last_day.isoformat())
+    rows = {r.bucket: r for r in db.query(
+        key, func.sum(DailySummary.count).label("count"), func.sum(DailySummary.done_count).label("done_count"),
+        func.sum(DailySummary.minutes).label("minutes"),
+        *[func.sum(getattr(DailySummary, c)).label(c) for c in ORIENTATION_COLUMNS.values()],
+    ).filter(in_range).group_by(key)}
+
+    points, day = {}, _bucket_start(first_day, bucket)
+    while day <= last_day:
+        points[day.isoformat()] = _analytics_point(day.isoformat(), rows.get(day.isoformat()))
+        day = _next_bucket(day, bucket)
+
+    if "Growth" in events:
+        # SQLite fills bare columns from the row that won max(), i.e. the bucket's last reading
+        for r in db.query(key, func.max(DailySummary.day), DailySummary.weight, DailySummary.height).filter(
+            in_range, DailySummary.event == "Growth"
+        ).group_by(key):
+            if r.bucket in points:
+                points[r.bucket].update(weight=r.weight, height=r.height)
+    return list(points.values())
+
+def _hour_series(db: Session, events, start, end):
+    def in_range(entity):
+        return and_(entity.event.in_(events), entity.timestamp >= start, entity.timestamp < end)
+    source = archive.source(db, in_range, start)
+    # Local hours come straight from the precomputed local columns
+    hour = (source.local_minute // 60).label("hour")
+    rows = db.query(
+        source.local_date, hour, func.count().label("count"),
+        func.count(case((source.status == SESSION_COMPLETED, 1))).label("done_count"),
+        (func.total(source.duration_seconds) / 60).label("minutes"),
+        *[func.count(case((source.orientation == o, 1))).label(c) for o, c in ORIENTATION_COLUMNS.items()],
+    ).filter(in_range(source)).group_by(source.local_date, hour).all()
+
+    points, step = {}, start.astimezone(timezone.utc).replace(minute=0, second=0, microsecond=0)
+    while step < end:
+        label = _local_naive(step).strftime("%Y-%m-%dT%H:00")
+        points.setdefault(label, _analytics_point(label))
+        step += timedelta(hours=1)
+    for r in rows:
+        label = f"{r.local_date}T{int(r.hour):02d}:00"
+        points[label] = _analytics_point(label, r)
+
+    if "Growth" in events:
+        # SQLite fills bare columns from the row that won max(), i.e. the hour's last reading
+        for r in db.query(source.local_date, hour, func.max(source.timestamp), source.weight, source.height).filter(
+            in_range(source), source.event == "Growth"
+        ).group_by(source.local_date, hour):
+            label = f"{r.local_date}T{int(r.hour):02d}:00"
+            if label in points:
+                points[label].update(weight=r.weight, height=r.height)
+    return list(points.values())
+
+def get_analytics(db: Session, events, bucket: str = "day", start=None, end=None,
+                  max_points: int = ANALYTICS_DEFAULT_POINTS):
+    """Series of per-bucket aggregates for ``events`` between ``start`` and ``end``.
+
+    Naive bounds are local time; the range defaults to the last ``HISTORY_DAYS``
+    days. Raises ValueError for an unknown bucket or an inverted range.
+    """
+    now = get_current_time()
+    end = _as_aware(end) if end else now
+    start = _as_aware(start) if start else (
+        now.replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=HISTORY_DAYS - 1))
+    if start >= end:
+        raise ValueError("from must be before to")
+    max_points = max(1, min(max_points, ANALYTICS_MAX_POINTS))
+    chosen = choose_bucket(bucket, start, end, max_points)
+    if chosen == "hour":
+        points = _hour_series(db, events, start, end)
+    else:
+        last = _local_naive(end - timedelta(microseconds=1))
+        points = _rollup_series(db, events, chosen, _local_naive(start).date(), last.date())
+    return {"events": list(events), "requested_bucket": bucket, "bucket": chosen,
+            "start": start, "end": end, "points": points}
+
+def get_stats(db: Session, history_days: int = HISTORY_DAYS):
     now = get_current_time()
     today_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
-    yesterday_start = today_start - timedelta(days=1)
-    
-    # Feeding stats
-    def get_feed_metrics(start, end=None):
-        query = db.query(Log).filter(and_(Log.event == "Feeding", Log.details != "ongoing", Log.timestamp >= start))
-        if end:
-            query = query.filter(Log.timestamp < end)
-        feeds = query.all()
-        
-        count = len(feeds)
-        total_minutes = 0
-        for f in feeds:
-            if f.details and ":" in f.details:
-                parts = list(map(int, f.details.split(':')))
-                total_minutes += parts[0]*60 + parts[1] + parts[2]/60
-        
-        avg = total_minutes / count if count > 0 else 0
-        return count, total_minutes, avg
+    today = today_start.date()
+    yesterday = today - timedelta(days=1)
 
-    t_count, t_dur, t_avg = get_feed_metrics(today_start)
-    y_count, y_dur, y_avg = get_feed_metrics(yesterday_start, today_start)
+    # Day-bucketed figures come from the rollup, so this costs O(days) rather than O(rows)
+    days = get_daily_summaries(db, today - timedelta(days=max(history_days, 2) - 1))
+    empty = _new_summary("", "")
+
+    def day_total(event, field, day):
+        return getattr(days.get(day.isoformat(), {}).get(event, empty), field)
+
+    def today_total(event, field):
+        # Today has no upper bound, so anything timestamped later than today counts towards it
+        return sum(getattr(d[event], field) for day, d in days.items() if day >= today.isoformat() and event in d)
+
+    # Feeding stats
+    t_count, t_dur = today_total("Feeding", "done_count"), today_total("Feeding", "minutes")
+    y_count, y_dur = day_total("Feeding", "done_count", yesterday), day_total("Feeding", "minutes", yesterday)
+    t_avg = t_dur / t_count if t_count > 0 else 0
+    y_avg = y_dur / y_count if y_count > 0 else 0
     
     feeding_stats = {
         "today_count": t_count,
@@ -90,17 +733,10 @@ def get_stats(db: Session):
     }
     
     # Diaper stats
-    def get_diaper_count(event_type, start, end=None):
-        query = db.query(Log).filter(and_(Log.event == event_type, Log.timestamp >= start))
-        if end:
-            query = query.filter(Log.timestamp < end)
-        return query.count()
-
-    diaper_types = ["Pee", "Poop", "Mixed"]
     diapers = {}
-    for dt in diaper_types:
-        tc = get_diaper_count(dt, today_start)
-        yc = get_diaper_count(dt, yesterday_start, today_start)
+    for dt in DIAPER_TYPES:
+        tc = today_total(dt, "count")
+        yc = day_total(dt, "count", yesterday)
         diapers[dt.lower()] = {"today_count": tc, "yesterday_count": yc, "delta": tc - yc}
     
     # Total diapers
@@ -108,22 +744,17 @@ def get_stats(db: Session):
     y_total = sum(d["yesterday_count"] for d in diapers.values())
     diapers["total"] = {"today_count": t_total, "yesterday_count": y_total, "delta": t_total - y_total}
     
-    # Last diaper
-    last_diaper = db.query(Log).filter(Log.event.in_(diaper_types)).order_by(Log.timestamp.desc()).first()
-    
+    # Last diaper: one query, an index seek per type, covers every "last X" string
+    last_seen = {r.event: r.timestamp for r in _newest(
+        db, lambda entity: db.query(entity.event, entity.timestamp, entity.id), DIAPER_TYPES)}
+
     def get_last_str(event_types):
-        l = db.query(Log).filter(Log.event.in_(event_types)).order_by(Log.timestamp.desc()).first()
-        if not l: return "Never"
-        lt = l.timestamp
-        if lt.tzinfo is None: lt = tz.localize(lt)
-        diff = now - lt
-        h, rem = divmod(int(diff.total_seconds()), 3600)
-        m = rem // 60
-        return f"{h}h {m}m" if h > 0 else f"{m}m"
-
-    if last_diaper:
-        diapers["last_type"] = last_diaper.event
-        diapers["last_time_str"] = get_last_str(diaper_types)
+        times = [last_seen[e] for e in event_types if last_seen.get(e) is not None]
+        return _time_since_str(now, max(times)) if times else "Never"
+
+    if last_seen:
+        diapers["last_type"] = max(last_seen, key=lambda e: last_seen[e])
+        diapers["last_time_str"] = get_last_str(DIAPER_TYPES)
     else:
         diapers["last_type"] = None
         diapers["last_time_str"] = "Never"
@@ -131,11 +762,7 @@ def get_stats(db: Session):
     diapers["last_pee_str"] = get_last_str(["Pee", "Mixed"])
     diapers["last_poop_str"] = get_last_str(["Poop", "Mixed"])
 
-    # Fetch last 7 days of logs for history/predictions
-    seven_days_ago = today_start - timedelta(days=7)
-    past_logs = db.query(Log).filter(Log.timestamp >= seven_days_ago).all()
-
-    # History (7 days)
+    # History
     history = {
         "feeding": [],
         "diaper": [],
@@ -143,215 +770,46 @@ def get_stats(db: Session):
         "growth": []
     }
     
-    for i in range(7):
-        day_date = (today_start - timedelta(days=i)).replace(tzinfo=None)
-        day_end = day_date + timedelta(days=1)
-        day_str = day_date.strftime("%Y-%m-%d")
-        
-        # Feeding Day
-        day_feeds = [l for l in past_logs if l.event == "Feeding" and day_date <= l.timestamp.replace(tzinfo=None) < day_end]
-        orientations = {"Left": 0, "Right": 0, "Expressed": 0}
-        for f in day_feeds:
-            if f.orientation in orientations:
-                orientations[f.orientation] += 1
+    for i in range(history_days):
+        day_str = (today - timedelta(days=i)).strftime("%Y-%m-%d")
+        day = days.get(day_str, {})
+        feed = day.get("Feeding", empty)
         
         history["feeding"].append({
             "date": day_str,
-            "count": len(day_feeds),
-            "details": orientations
+            "count": feed.count,
+            "details": {"Left": feed.left_count, "Right": feed.right_count, "Expressed": feed.expressed_count}
         })
         
-        # Diaper Day
-        day_diapers = [l for l in past_logs if l.event in diaper_types and day_date <= l.timestamp.replace(tzinfo=None) < day_end]
-        d_types = {"Pee": 0, "Poop": 0, "Mixed": 0}
-        for d in day_diapers:
-            if d.event in d_types:
-                d_types[d.event] += 1
-        
+        d_types = {dt: day.get(dt, empty).count for dt in DIAPER_TYPES}
         history["diaper"].append({
             "date": day_str,
-            "count": len(day_diapers),
+            "count": sum(d_types.values()),
             "details": d_types
         })
         
-        # Sleep Day Total
-        day_sleeps = [l for l in past_logs if l.event == "Sleep" and l.details != "ongoing" and day_date <= l.timestamp.replace(tzinfo=None) < day_end]
-        total_sleep_min = 0
-        for s in day_sleeps:
-            if s.timestamp and s.end_timestamp:
-                dur = (s.end_timestamp.replace(tzinfo=None) - s.timestamp.replace(tzinfo=None)).total_seconds() / 60
-                total_sleep_min += dur
-        
         history["sleep"].append({
             "date": day_str,
-            "total_hours": round(total_sleep_min / 60, 1)
+            "total_hours": round(day.get("Sleep", empty).minutes / 60, 1)
         })
         
-        # Growth Day
-        day_growth = [l for l in past_logs if l.event == "Growth" and day_date <= l.timestamp.replace(tzinfo=None) < day_end]
-        if day_growth:
-            # Take the last one of the day
-            g = day_growth[-1]
+        if "Growth" in day:
+            g = day["Growth"]
             history["growth"].append({
                 "date": day_str,
                 "weight": g.weight,
                 "height": g.height
             })
 
-    # Sleep predictions (14 days)
-    sleep_logs = [l for l in past_logs if l.event == "Sleep" and l.details != "ongoing"]
-    sleep_data = []
-    for s in sleep_logs:
-        st = s.timestamp
-        if st.tzinfo is None: st = tz.localize(st)
-        et = s.end_timestamp
-        if et and et.tzinfo is None: et = tz.localize(et)
-        if et:
-            sleep_data.append({
-                "date": st.strftime("%Y-%m-%d"),
-                "start": st.strftime("%H:%M"),
-                "end": et.strftime("%H:%M"),
-                "is_predicted": False,
-                "duration": (et - st).total_seconds() / 60
-            })
+    # Sleep predictions: cached until a Sleep row or the config changes
+    predictions = {"sleep": get_sleep_predictions(db, now)}
 
-    # Sleep predictions based on age and history
-    # Age calculation
-    val_dob = config['user']['date_of_birth']
-    if isinstance(val_dob, str):
-        dob = datetime.strptime(val_dob, "%Y-%m-%d").date()
-    else:
-        dob = val_dob # Assumed to be date or datetime
-    if hasattr(dob, 'date'): dob = dob.date()
-    age_months = (now.date().year - dob.year) * 12 + now.date().month - dob.month
-    if now.date().day < dob.day: age_months -= 1
-
-    # Developmental Norms
-    # Simplified stages
-    if age_months < 3:
-        stage = "Newborn"
-        norm_total = 14.0 # Avg
-        norm_naps = 4
-        # Small frequent sleeps
-        base_norms = [
-            {"start": "09:00", "end": "11:00"},
-            {"start": "13:00", "end": "15:00"},
-            {"start": "17:00", "end": "18:30"},
-            {"start": "20:00", "end": "07:00"}
-        ]
-    elif age_months < 6:
-        stage = "3-6 Months"
-        norm_total = 13.0
-        norm_naps = 3
-        base_norms = [
-            {"start": "09:30", "end": "11:00"},
-            {"start": "13:30", "end": "15:30"},
-            {"start": "19:30", "end": "07:00"}
-        ]
-    else:
-        stage = "6-12 Months"
-        norm_total = 12.0
-        norm_naps = 2
-        base_norms = [
-            {"start": "09:30", "end": "11:00"},
-            {"start": "14:00", "end": "16:00"},
-            {"start": "19:00", "end": "07:00"}
-        ]
-
-    # Combine history + norms
-    slots = []
-    for s in sleep_logs:
-        st = s.timestamp
-        et = s.end_timestamp
-        if not et: continue
-        
-        # Ensure we compare naive datetimes if SQLite stores them as such
-        if st.tzinfo: st = st.replace(tzinfo=None)
-        if et.tzinfo: et = et.replace(tzinfo=None)
-        
-        sm = st.hour * 60 + st.minute
-        em = et.hour * 60 + et.minute
-        if em < sm: em += 1440
-        slots.append((sm, em))
-
-    base_windows = []
-    if slots:
-        slots.sort()
-        clusters = []
-        curr = [slots[0]]
-        for i in range(1, len(slots)):
-            if slots[i][0] - curr[-1][0] < 120: 
-                curr.append(slots[i])
-            else:
-                clusters.append(curr)
-                curr = [slots[i]]
-        clusters.append(curr)
-        
-        for c in clusters:
-            if len(c) >= 2:
-                avg_s = sum(x[0] for x in c) / len(c)
-                avg_e = sum(x[1] for x in c) / len(c)
-                hs, ms = divmod(int(avg_s) % 1440, 60)
-                he, me = divmod(int(avg_e) % 1440, 60)
-                base_windows.append({"start": f"{hs:02d}:{ms:02d}", "end": f"{he:02d}:{me:02d}"})
-
-    # If history is sparse, use norms
-    if not base_windows or len(base_windows) < 2:
-        base_windows = base_norms
-
-    # Sort base windows by start time for summary
-    base_windows.sort(key=lambda x: x["start"])
-    
-    # Calculate durations for metadata
-    prediction_details = []
-    total_min = 0
-    nap_count = 0
-    for w in base_windows:
-        hs, ms = map(int, w["start"].split(':'))
-        he, me = map(int, w["end"].split(':'))
-        sm = hs * 60 + ms
-        em = he * 60 + me
-        if em < sm: em += 1440
-        dur = em - sm
-        total_min += dur
-        is_nap = dur < 300 # Rough heuristic: > 5 hours is night sleep
-        if is_nap: nap_count += 1
-        
-        prediction_details.append({
-            "start": w["start"],
-            "end": w["end"],
-            "duration": round(dur / 60, 1),
-            "type": "Nap" if is_nap else "Night"
-        })
+    # Ongoing: one query for both session types, newest first
+    ongoing = get_ongoing_sessions(db)
+    ongoing_feed = next((l for l in ongoing if l.event == "Feeding"), None)
+    ongoing_sleep = next((l for l in ongoing if l.event == "Sleep"), None)
 
-    next_7_days = []
-    for i in range(1, 15): # 14 day view as requested earlier
-        future_date = (now + timedelta(days=i)).strftime("%Y-%m-%d")
-        for w in base_windows:
-            next_7_days.append({
-                "date": future_date,
-                "start": w["start"],
-                "end": w["end"],
-                "is_predicted": True
-            })
-
-    predictions = {
-        "sleep": {
-            "past": sleep_data,
-            "future": next_7_days,
-            "summary": {
-                "stage": stage,
-                "nap_count": nap_count,
-                "total_hours": round(total_min / 60, 1),
-                "details": prediction_details
-            }
-        }
-    }
-
-    # Ongoing
-    ongoing_feed = db.query(Log).filter(and_(Log.event == "Feeding", Log.details == "ongoing")).order_by(Log.timestamp.desc()).first()
-    ongoing_sleep = db.query(Log).filter(and_(Log.event == "Sleep", Log.details == "ongoing")).order_by(Log.timestamp.desc()).first()
-    last_completed_feed = db.query(Log).filter(and_(Log.event == "Feeding", Log.details != "ongoing")).order_by(Log.timestamp.desc()).first()
+    last_completed_feed = get_latest(db, ["Feeding"], status=SESSION_COMPLETED)
     
     return {
         "feeding": feeding_stats,
@@ -364,12 +822,36 @@ def get_stats(db: Session):
     }
 
 def delete_log(db: Session, log_id: int):
-    log = db.query(Log).filter(Log.id == log_id).first()
+    log = _writable_log(db, log_id)
     if log:
+        keys = _summary_keys(log)
         db.delete(log)
+        _record_write(db, keys, "deleted", log)
         db.commit()
     return log
 
+# Feed ids come from a sequence in app_state instead of a MAX over the logs, so two
+# feeds started at once cannot take the same id
+FEED_ID_KEY = "feed_id"
+
+def next_feed_id(db: Session) -> int:
+    return bump_version(db, FEED_ID_KEY)
+
+def advance_feed_id(db: Session, feed_ids):
+    """Move the sequence past feed_ids written by hand (imports, edits, old clients)."""
+    highest = max((i for i in feed_ids if i is not None), default=None)
+    if highest is not None:
+        db.execute(
+            sqlite_insert(AppState)
+            .values(key=FEED_ID_KEY, value=highest)
+            .on_conflict_do_update(index_elements=["key"], set_={"value": func.max(AppState.value, highest)})
+        )
+
 def get_latest_feed_id(db: Session):
-    result = db.query(func.max(Log.feed_id)).filter(Log.event == "Feeding").first()
-    return result[0] if result[0] is not None else 0
+    return get_version(db, FEED_ID_KEY)
+
+def max_feed_id(db: Session):
+    """The highest feed_id in either tier; seeds the sequence."""
+    ids = [db.query(func.max(entity.feed_id)).filter(entity.event == "Feeding").scalar()
+           for entity in archive.tiers(db)]
+    return max((i for i in ids if i is not None), default=0)
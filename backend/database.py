@@ -1,14 +1,162 @@
+"""SQLite engines shared by the API, the bot and the maintenance commands.
+
+The API and ``telegram_bot.py`` write to the same file from separate processes,
+so every connection is opened in WAL mode with a busy timeout. Reads and writes
+go through separate pools: ``read_engine`` hands out query-only connections
+whose transactions see one consistent snapshot without ever taking the write
+lock, and ``engine`` (the write engine) starts every transaction with
+``BEGIN IMMEDIATE`` so concurrent writers queue on the busy timeout instead of
+failing when a read transaction tries to upgrade to a write.
+
+``async_engine`` and ``async_read_engine`` are the same pair on aiosqlite, for
+the async endpoints and the Telegram bot, so DB round trips do not block the
+event loop.
+
+Settings can be overridden from an optional ``database`` section in config.yaml::
+
+    database:
+      read_pool_size: 4
+      pragmas:
+        busy_timeout: 10000
+        synchronous: full
+      write_queue:
+        enabled: true
+        window_ms: 5
+      archive:
+        enabled: true
+        hot_days: 180
+
+With the archive enabled every connection also attaches ``<database>_archive.db``
+as ``archive`` (see archive.py).
+"""
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.ext.asyncio import AsyncEngine, async_sessionmaker, create_async_engine
 from sqlmodel import create_engine, Session
 import os
+import yaml
+
+from . import archive
 
 # Robustly find the database in the project root
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DB_NAME = "baby_log.db"
 DATABASE_PATH = os.path.join(BASE_DIR, DB_NAME)
 DATABASE_URL = f"sqlite:///{DATABASE_PATH}"
+ASYNC_DATABASE_URL = f"sqlite+aiosqlite:///{DATABASE_PATH}"
+
+# Applied to every new connection, in this order (journal_mode first: it is persistent)
+DEFAULT_PRAGMAS = {
+    "journal_mode": "wal",
+    "busy_timeout": 5000,      # ms to wait for another process's write lock
+    "synchronous": "normal",   # durable at checkpoints; safe with WAL
+    "cache_size": -16000,      # negative means KiB, i.e. 16 MiB per connection
+    "mmap_size": 134217728,    # 128 MiB of memory-mapped reads
+    "temp_store": "memory",
+}
+DEFAULT_SETTINGS = {
+    "read_pool_size": 4,
+    "write_pool_size": 1,
+    "pool_timeout": 30,
+    "pragmas": {},
+    # Group commit for single-event writes (see write_queue.py); off unless enabled
+    "write_queue": {"enabled": False, "window_ms": 5, "max_batch": 64},
+    # Cold storage for logs older than hot_days (see archive.py); off unless enabled
+    "archive": {"enabled": False, "hot_days": 180},
+    # How timestamps written before migration 6 are stored; it converts "local" ones to UTC
+    "legacy_timestamps": "local",
+}
+
+def load_settings(path: str = os.path.join(BASE_DIR, "config.yaml")) -> dict:
+    settings = dict(DEFAULT_SETTINGS)
+    try:
+        with open(path, "r") as f:
+            section = (yaml.safe_load(f) or {}).get("database") or {}
+    except FileNotFoundError:
+        section = {}
+    settings.update(section)
+    settings["pragmas"] = {**DEFAULT_PRAGMAS, **(section.get("pragmas") or {})}
+    settings["write_queue"] = {**DEFAULT_SETTINGS["write_queue"], **(section.get("write_queue") or {})}
+    settings["archive"] = {**DEFAULT_SETTINGS["archive"], **(section.get("archive") or {})}
+    return settings
+
+def _install_listeners(engine: Engine, pragmas: dict, begin: str, query_only: bool, archive_path: str = None):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        # Let SQLAlchemy's "begin" event, not pysqlite, decide how transactions start
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        try:
+            for name, value in pragmas.items():
+                cursor.execute(f"PRAGMA {name} = {value}")
+            if query_only:
+                cursor.execute("PRAGMA query_only = ON")
+        finally:
+            cursor.close()
+        if archive_path:
+            archive.attach(dbapi_connection, archive_path)
+
+    @event.listens_for(engine, "begin")
+    def on_begin(conn):
+        conn.exec_driver_sql(begin)
+
+def _archive_path(engine: Engine, settings: dict):
+    path = make_url(str(engine.url)).database
+    if not settings["archive"]["enabled"] or not path or path == ":memory:":
+        return None
+    return archive.path_for(path)
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+def _configure(engine: Engine, role: str, settings: dict):
+    _install_listeners(
+        engine,
+        settings["pragmas"],
+        begin="BEGIN IMMEDIATE" if role == "write" else "BEGIN",
+        query_only=role == "read",
+        archive_path=_archive_path(engine, settings),
+    )
+
+def _pool_options(role: str, settings: dict) -> dict:
+    if role not in ("read", "write"):
+        raise ValueError(f"Unknown engine role: {role}")
+    return dict(pool_size=settings[f"{role}_pool_size"], max_overflow=0, pool_timeout=settings["pool_timeout"])
+
+def make_engine(url: str = DATABASE_URL, role: str = "write", settings: dict = None) -> Engine:
+    """Create the read or write engine for ``url`` with the configured pragmas and pool."""
+    settings = settings or load_settings()
+    engine = create_engine(url, connect_args={"check_same_thread": False}, **_pool_options(role, settings))
+    _configure(engine, role, settings)
+    return engine
+
+def make_async_engine(url: str = ASYNC_DATABASE_URL, role: str = "write", settings: dict = None,
+                      **options) -> AsyncEngine:
+    """Async counterpart of make_engine; ``url`` must use an async driver such as aiosqlite."""
+    settings = settings or load_settings()
+    engine = create_async_engine(url, **(options or _pool_options(role, settings)))
+    _configure(engine.sync_engine, role, settings)
+    return engine
+
+_settings = load_settings()
+engine = make_engine(DATABASE_URL, "write", _settings)
+read_engine = make_engine(DATABASE_URL, "read", _settings)
+async_engine = make_async_engine(ASYNC_DATABASE_URL, "write", _settings)
+async_read_engine = make_async_engine(ASYNC_DATABASE_URL, "read", _settings)
+
+# Objects must stay usable after commit: lazy loads are not possible outside run_sync
+AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+AsyncReadSessionLocal = async_sessionmaker(async_read_engine, expire_on_commit=False)
 
 def get_session():
     with Session(engine) as session:
         yield session
+
+def get_read_session():
+    with Session(read_engine) as session:
+        yield session
+
+async def get_async_session():
+    async with AsyncSessionLocal() as session:
+        yield session
+
+async def get_async_read_session():
+    async with AsyncReadSessionLocal() as session:
+        yield session
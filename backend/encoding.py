@@ -0,0 +1,73 @@
+"""JSON encoding and response compression for the hot endpoints.
+
+``dumps`` encodes plain rows and dicts with orjson, writing UTC datetimes
+with a ``Z`` suffix as Pydantic does, so the fast paths produce the same JSON
+as the response schemas. Without orjson it falls back to the stdlib encoder.
+Bodies of at least ``MIN_COMPRESS_SIZE`` bytes are compressed with brotli when
+the optional ``brotli`` package is installed and the client accepts it, and
+with gzip otherwise.
+"""
+import gzip
+import json
+from datetime import date, datetime
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+MIN_COMPRESS_SIZE = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+def _default(value):
+    if isinstance(value, datetime):
+        return value.isoformat().replace("+00:00", "Z")
+    if isinstance(value, date):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_UTC_Z)
+    return json.dumps(value, default=_default, separators=(",", ":")).encode()
+
+def available_encodings() -> tuple:
+    """Supported content codings, most preferred first."""
+    return ("br", "gzip") if brotli is not None else ("gzip",)
+
+def compress(body: bytes, encoding: str, level: int = None) -> bytes:
+    """``body`` in the given coding; ``level`` overrides the default gzip level or brotli quality."""
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY if level is None else level)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL if level is None else level, mtime=0)
+    raise ValueError(f"Unsupported encoding: {encoding}")
+
+def accepted_encodings(header: str) -> set:
+    """Codings named in an Accept-Encoding header with a non-zero q-value."""
+    accepted = set()
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        q = params.strip()
+        if q.startswith("q="):
+            try:
+                if float(q[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if name:
+            accepted.add(name.strip().lower())
+    return accepted
+
+def choose_encoding(header: str, size: int):
+    """The coding to compress a ``size``-byte body with, or None to send it as is."""
+    if size < MIN_COMPRESS_SIZE:
+        return None
+    accepted = accepted_encodings(header)
+    return next((e for e in available_encodings() if e in accepted or "*" in accepted), None)
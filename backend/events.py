@@ -0,0 +1,101 @@
+"""Server-sent change events.
+
+Writes made through crud leave a note in ``session.info["pending_changes"]``;
+an ``after_commit`` listener hands those to the broadcaster, which fans them out
+to every connected ``/events`` stream. Writes from other processes (the Telegram
+bot, other API workers) are picked up by ``watch_data_version``, which polls the
+shared ``data_version`` counter and announces any version it has not seen yet.
+"""
+import asyncio
+import json
+import logging
+from typing import Callable, Optional
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT_SECONDS = 15
+POLL_SECONDS = 1.0
+
+class Broadcaster:
+    def __init__(self, queue_size: int = 100):
+        self.queue_size = queue_size
+        self.version = 0
+        self._subscribers = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def attach(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def _publish(self, message: dict):
+        self.version = max(self.version, message.get("version", 0))
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(message)
+            except asyncio.QueueFull:
+                # A stalled client only needs to know that something changed
+                self.unsubscribe(queue)
+
+    def publish(self, message: dict):
+        """Thread-safe: may be called from the sync endpoints' worker threads."""
+        if self._loop is None or self._loop.is_closed():
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._publish(message)
+        else:
+            self._loop.call_soon_threadsafe(self._publish, message)
+
+broadcaster = Broadcaster()
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_changes(session):
+    for change in session.info.pop("pending_changes", []):
+        broadcaster.publish(change)
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("pending_changes", None)
+
+async def watch_data_version(get_version: Callable[[], int], interval: float = POLL_SECONDS):
+    """Announce data versions written by other processes."""
+    while True:
+        try:
+            version = await asyncio.to_thread(get_version)
+            if version > broadcaster.version:
+                broadcaster.publish({"action": "external", "version": version})
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            logger.exception("Polling the data version failed")
+        await asyncio.sleep(interval)
+
+def format_sse(message: dict, event_name: str = "change") -> str:
+    return f"event: {event_name}\ndata: {json.dumps(message)}\n\n"
+
+async def stream(request, queue: asyncio.Queue):
+    """Yield SSE frames for ``queue`` until the client disconnects."""
+    try:
+        yield "retry: 5000\n" + format_sse({"version": broadcaster.version}, "hello")
+        while not await request.is_disconnected():
+            try:
+                message = await asyncio.wait_for(queue.get(), timeout=HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield format_sse(message)
+    finally:
+        broadcaster.unsubscribe(queue)
@@ -0,0 +1,148 @@
+"""Streaming export of the logs table as CSV, NDJSON or Parquet.
+
+Rows are read through a server-side cursor in chunks of ``CHUNK_SIZE`` and each
+chunk is encoded and handed on before the next one is fetched, so memory stays
+flat however large the table is. With rows in the archive (see archive.py)
+both tiers are streamed in order and merged. Exports use the same column names as
+``schemas.LogCreate`` so a file can be fed straight back into the importer.
+"""
+import csv
+import heapq
+import io
+import json
+from datetime import datetime
+from itertools import islice
+from typing import Iterator, Optional
+
+from sqlalchemy import and_, select
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+
+from . import archive, crud
+from .models import Log
+
+CHUNK_SIZE = 5000
+EXPORT_COLUMNS = ("id", "event", "details", "status", "duration_seconds", "timestamp", "comments",
+                  "end_timestamp", "orientation", "feed_id", "weight", "height")
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+
+class ExportUnavailable(Exception):
+    """The requested format needs an optional dependency that is not installed."""
+
+def _select(entity, event: Optional[str], start: Optional[datetime], end: Optional[datetime]):
+    conditions = []
+    if event:
+        conditions.append(entity.event == event)
+    if start:
+        conditions.append(entity.timestamp >= crud._as_aware(start))
+    if end:
+        conditions.append(entity.timestamp < crud._as_aware(end))
+    query = select(*[getattr(entity, c) for c in EXPORT_COLUMNS])
+    if conditions:
+        query = query.where(and_(*conditions))
+    return query.order_by(entity.timestamp, entity.id)
+
+def iter_chunks(engine: Engine, event: str = None, start: datetime = None, end: datetime = None,
+                chunk_size: int = CHUNK_SIZE) -> Iterator[list]:
+    """Yield lists of row tuples, holding one chunk in memory at a time."""
+    with engine.connect() as conn:
+        with Session(conn) as db:
+            entities = archive.tiers(db, crud._as_aware(start))
+        streaming = conn.execution_options(stream_results=True, yield_per=chunk_size)
+        if len(entities) == 1:
+            yield from streaming.execute(_select(Log, event, start, end)).partitions()
+            return
+        # Each tier comes back in (timestamp, id) order, so a lazy merge keeps the export in order
+        rows = heapq.merge(*(streaming.execute(_select(e, event, start, end)) for e in entities),
+                           key=lambda row: (row.timestamp, row.id))
+        while True:
+            chunk = list(islice(rows, chunk_size))
+            if not chunk:
+                return
+            yield chunk
+
+def _text(value):
+    return value.isoformat() if isinstance(value, datetime) else value
+
+def encode_csv(chunks: Iterator[list]) -> Iterator[bytes]:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(EXPORT_COLUMNS)
+    for rows in chunks:
+        writer.writerows([_text(v) for v in row] for row in rows)
+        yield buffer.getvalue().encode()
+        buffer.seek(0)
+        buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue().encode()
+
+def encode_ndjson(chunks: Iterator[list]) -> Iterator[bytes]:
+    for rows in chunks:
+        yield "".join(
+            json.dumps(dict(zip(EXPORT_COLUMNS, map(_text, row)))) + "\n" for row in rows
+        ).encode()
+
+class _DrainableSink(io.RawIOBase):
+    """Write-only file object whose contents can be taken away between writes."""
+
+    def __init__(self):
+        self._parts = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._parts.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data, self._parts = b"".join(self._parts), []
+        return data
+
+def encode_parquet(chunks: Iterator[list]) -> Iterator[bytes]:
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ExportUnavailable("Parquet export requires the optional 'pyarrow' package")
+
+    # UTC instants, as in the CSV and NDJSON exports; rows come back timezone-aware
+    utc = pa.timestamp("us", tz="UTC")
+    schema = pa.schema([
+        ("id", pa.int64()), ("event", pa.string()), ("details", pa.string()),
+        ("status", pa.string()), ("duration_seconds", pa.int64()),
+        ("timestamp", utc), ("comments", pa.string()), ("end_timestamp", utc),
+        ("orientation", pa.string()), ("feed_id", pa.int64()), ("weight", pa.float64()), ("height", pa.float64()),
+    ])
+
+    sink = _DrainableSink()
+    # One row group per chunk; bytes are handed on as soon as each group is written
+    with pq.ParquetWriter(sink, schema, compression="zstd") as writer:
+        for rows in chunks:
+            columns = list(zip(*rows))
+            arrays = [pa.array(values, type=field.type) for field, values in zip(schema, columns)]
+            writer.write_table(pa.Table.from_arrays(arrays, schema=schema))
+            data = sink.drain()
+            if data:
+                yield data
+    yield sink.drain()
+
+ENCODERS = {"csv": encode_csv, "ndjson": encode_ndjson, "parquet": encode_parquet}
+
+def stream_export(engine: Engine, fmt: str, **filters) -> Iterator[bytes]:
+    if fmt == "parquet":
+        # Fail before the first byte is sent rather than halfway through a response
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ExportUnavailable("Parquet export requires the optional 'pyarrow' package")
+    return ENCODERS[fmt](iter_chunks(engine, **filters))
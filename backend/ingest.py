@@ -0,0 +1,217 @@
+"""Batched ingestion of historical logs from JSON arrays, NDJSON and CSV.
+
+Records are validated one by one with ``schemas.LogCreate``; invalid ones are
+reported with their 1-based row number and skipped, the rest are inserted with
+one executemany per batch and committed batch by batch. Parsers are generators
+over chunks or lines, so memory stays flat no matter how large the input is.
+The rollup rows for every touched (day, event) are recomputed once at the end.
+"""
+import csv
+import json
+from types import SimpleNamespace
+from typing import AsyncIterator, Iterable, Iterator, Optional
+
+from pydantic import ValidationError
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from . import crud
+from .models import Log
+from .schemas import IngestError, IngestReport, LogCreate
+
+BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 1000
+MAX_RECORD_CHARS = 1_000_000
+# Records the API parses before handing them to a worker thread to validate and insert
+HANDOFF_SIZE = 1000
+
+class RecordError(Exception):
+    """A record that could not even be parsed (bad JSON line, non-object value)."""
+
+class MalformedBody(Exception):
+    """A request body that is not a well-formed JSON array or NDJSON stream; nothing after it is read."""
+
+class Ingestor:
+    def __init__(self, db: Session, batch_size: int = BATCH_SIZE):
+        self.db = db
+        self.batch_size = batch_size
+        self.report = IngestReport()
+        self._row = 0
+        self._batch = []
+        self._keys = set()
+
+    def _error(self, message: str):
+        self.report.rejected += 1
+        if len(self.report.errors) < MAX_REPORTED_ERRORS:
+            self.report.errors.append(IngestError(row=self._row, error=message))
+        else:
+            self.report.errors_truncated = True
+
+    def add(self, record) -> bool:
+        """Validate one record; returns True once the batch is full and should be flushed."""
+        self._row += 1
+        if isinstance(record, RecordError):
+            self._error(str(record))
+            return False
+        if not isinstance(record, dict):
+            self._error("Expected a JSON object")
+            return False
+        try:
+            log = LogCreate.model_validate(record)
+        except ValidationError as e:
+            self._error("; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors()))
+            return False
+
+        row = log.model_dump()
+        row["timestamp"] = crud._as_aware(row["timestamp"] or crud.get_current_time())
+        row["end_timestamp"] = crud._as_aware(row["end_timestamp"])
+        row["local_date"], row["local_minute"] = crud.local_keys(row["timestamp"])
+        self._keys.add((row["local_date"], row["event"]))
+        fields = SimpleNamespace(**row)
+        crud.sync_session_fields(fields, log.model_fields_set)
+        self._batch.append(vars(fields))
+        return len(self._batch) >= self.batch_size
+
+    def add_all(self, records: Iterable):
+        """add() each record, flushing whenever a batch fills."""
+        for record in records:
+            if self.add(record):
+                self.flush()
+
+    def flush(self):
+        if not self._batch:
+            return
+        last_rev = crud.next_revision(self.db, len(self._batch))
+        first_rev = last_rev - len(self._batch) + 1
+        for rev, row in enumerate(self._batch, first_rev):
+            row["rev"] = rev
+        self.db.execute(insert(Log.__table__), self._batch)
+        crud.clear_tombstones(self.db, first_rev, last_rev)
+        crud.advance_feed_id(self.db, [row["feed_id"] for row in self._batch if row["event"] == "Feeding"])
+        crud.note_change(self.db, {row["event"] for row in self._batch}, action="bulk", count=len(self._batch))
+        self.db.commit()
+        self.report.accepted += len(self._batch)
+        self._batch = []
+
+    def finish(self, records: Iterable = ()) -> IngestReport:
+        """Add any last ``records``, flush the tail batch and bring the rollup in line with everything committed."""
+        try:
+            self.add_all(records)
+            self.flush()
+        finally:
+            self.db.rollback()
+            if self._keys:
+                crud.refresh_daily_summary(self.db, self._keys)
+                crud.note_change(self.db, action="bulk", count=0)
+                self.db.commit()
+        return self.report
+
+def ingest(db: Session, records: Iterable, batch_size: int = BATCH_SIZE) -> IngestReport:
+    ingestor = Ingestor(db, batch_size=batch_size)
+    try:
+        ingestor.add_all(records)
+    finally:
+        report = ingestor.finish()
+    return report
+
+def _decode_line(line):
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return RecordError(f"Invalid JSON: {e}")
+
+def iter_ndjson(lines: Iterable[str]) -> Iterator:
+    for line in lines:
+        if line.strip():
+            yield _decode_line(line)
+
+def iter_csv(lines: Iterable[str]) -> Iterator[dict]:
+    for record in csv.DictReader(lines):
+        # Empty cells mean "not set", not an empty string
+        yield {k: (v if v != "" else None) for k, v in record.items() if k}
+
+def read_file(path: str, fmt: Optional[str] = None) -> Iterator:
+    """Stream records from a .csv / .ndjson / .jsonl file."""
+    fmt = fmt or ("csv" if path.lower().endswith(".csv") else "ndjson")
+    with open(path, "r", encoding="utf-8", newline="") as f:
+        yield from (iter_csv(f) if fmt == "csv" else iter_ndjson(f))
+
+async def iter_request_records(chunks: AsyncIterator[bytes]) -> AsyncIterator:
+    """Decode a request body holding either one JSON array of objects or NDJSON.
+
+    The body is consumed incrementally: array elements are pulled out one at a
+    time with ``raw_decode`` and NDJSON is split on newlines, so only the record
+    currently being parsed is buffered. A record longer than
+    ``MAX_RECORD_CHARS``, or an array with anything but one comma between its
+    elements, raises ``MalformedBody``.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ""
+    mode = None
+    # Array state: what may come next ("first" element or "]", "element", "separator" or nothing once "closed")
+    expect = "first"
+    pending = b""
+
+    async for chunk in chunks:
+        pending += chunk
+        try:
+            text = pending.decode("utf-8")
+            pending = b""
+        except UnicodeDecodeError as e:
+            # A multi-byte character was split across chunks; keep its start for next time
+            text, pending = pending[:e.start].decode("utf-8"), pending[e.start:]
+        buffer += text
+
+        if mode is None:
+            buffer = buffer.lstrip()
+            if not buffer:
+                continue
+            mode = "array" if buffer[0] == "[" else "ndjson"
+            if mode == "array":
+                buffer = buffer[1:]
+
+        if mode == "ndjson":
+            *lines, buffer = buffer.split("\n")
+            for line in lines + [buffer]:
+                if len(line) > MAX_RECORD_CHARS:
+                    raise MalformedBody(f"NDJSON line longer than {MAX_RECORD_CHARS} characters")
+            for line in lines:
+                if line.strip():
+                    yield _decode_line(line)
+            continue
+
+        while True:
+            buffer = buffer.lstrip()
+            if not buffer:
+                break
+            if expect == "closed":
+                raise MalformedBody("Unexpected data after the JSON array")
+            if expect == "separator":
+                if buffer[0] not in ",]":
+                    raise MalformedBody("Expected ',' or ']' after a JSON array element")
+                expect = "element" if buffer[0] == "," else "closed"
+                buffer = buffer[1:]
+                continue
+            if buffer[0] == "]" and expect == "first":
+                expect, buffer = "closed", buffer[1:]
+                continue
+            if buffer[0] in ",]":
+                raise MalformedBody("Expected a JSON array element")
+            try:
+                record, end = decoder.raw_decode(buffer)
+            except ValueError:
+                # Incomplete element; wait for more data unless it is clearly not going to parse
+                if len(buffer) > MAX_RECORD_CHARS:
+                    raise MalformedBody(f"JSON array element longer than {MAX_RECORD_CHARS} characters or malformed")
+                break
+            if type(record) in (int, float) and buffer[end:end + 1] in ("", ".", "e", "E", "+", "-"):
+                # A number may go on in the next chunk
+                break
+            buffer = buffer[end:]
+            expect = "separator"
+            yield record
+
+    if mode == "ndjson" and buffer.strip():
+        yield _decode_line(buffer)
+    elif mode == "array" and expect != "closed":
+        raise MalformedBody("Truncated or malformed JSON array")
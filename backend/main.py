@@ -1,16 +1,36 @@
-from fastapi import FastAPI, Depends, HTTPException
+import asyncio
+import os
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Depends, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.encoders import jsonable_encoder
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Mount, Router
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from typing import List, Optional
-import yaml
+from typing import Dict, List, Optional
 from datetime import datetime
 
-from . import crud, models, schemas, database
-from .database import engine, get_session
+from . import async_crud, cache, crud, encoding, events, export, ingest, metrics, schemas, database, migrations, static
+from .config import get_config as current_config
+from .database import engine, read_engine, get_session, get_read_session, get_async_session, get_async_read_session
 
-models.Log.metadata.create_all(bind=engine)
+def current_data_version():
+    with database.Session(read_engine) as db:
+        return crud.get_data_version(db)
 
-app = FastAPI(title="Baby Tracker API")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    migrations.upgrade(engine)
+    crud.rebuild_on_timezone_change(engine)
+    events.broadcaster.attach(asyncio.get_running_loop())
+    events.broadcaster.version = current_data_version()
+    watcher = asyncio.create_task(events.watch_data_version(current_data_version))
+    yield
+    watcher.cancel()
+
+app = FastAPI(title="Baby Tracker API", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -18,56 +38,260 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag", "X-Next-Cursor", "X-Log-Revision"],
 )
+app.add_middleware(metrics.MetricsMiddleware)
+
+# "Time since" strings and the today/yesterday split move with the clock, so cached
+# dashboards also expire after a short TTL even when no write has happened.
+DASHBOARD_CACHE_TTL = 15
+dashboard_cache = cache.TTLCache(ttl=DASHBOARD_CACHE_TTL)
 
 @app.get("/config")
-def get_config():
-    with open("config.yaml", "r") as f:
-        config = yaml.safe_load(f)
-    return config["user"]
+async def get_config(request: Request):
+    config = current_config()
+    etag = cache.etag_for(config.version)
+    if cache.is_not_modified(request, etag):
+        return cache.not_modified_response(etag)
+    return JSONResponse(jsonable_encoder(config.user), headers={"ETag": etag, "Cache-Control": "no-cache"})
+
+@app.get("/ready", include_in_schema=False)
+async def ready(db: AsyncSession = Depends(get_async_read_session)):
+    """Readiness probe for the process supervisor: startup has run and the database answers."""
+    return {"status": "ready", "pid": os.getpid(), "data_version": await async_crud.get_data_version(db)}
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/dashboard", response_model=schemas.DashboardData)
-def get_dashboard(db: Session = Depends(get_session)):
-    return crud.get_stats(db)
+async def get_dashboard(request: Request, history_days: int = crud.HISTORY_DAYS,
+                        db: AsyncSession = Depends(get_async_read_session)):
+    history_days = max(1, min(history_days, 366))
+    key = (await async_crud.get_data_version(db), current_config().version, history_days,
+           crud.get_current_time().date())
+    entry = dashboard_cache.get(key)
+    if entry is None:
+        stats = await async_crud.get_stats(db, history_days=history_days)
+        stats = schemas.DashboardData.model_validate(stats, from_attributes=True)
+        entry = dashboard_cache.set(key, cache.CachedBody(stats.model_dump_json().encode()))
+    return cache.conditional_response(request, entry)
+
+@app.get("/analytics", response_model=schemas.AnalyticsSeries)
+async def get_analytics(
+    request: Request,
+    event: List[str] = Query(...),
+    bucket: str = "day",
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    max_points: int = crud.ANALYTICS_DEFAULT_POINTS,
+    db: AsyncSession = Depends(get_async_read_session),
+):
+    # The default range ends now, so the current hour and the timezone are part of the key too
+    hour = crud.get_current_time().replace(minute=0, second=0, microsecond=0)
+    etag = cache.etag_for("analytics", await async_crud.get_data_version(db), current_config().version,
+                          hour, event, bucket, start, end, max_points)
+    if cache.is_not_modified(request, etag):
+        return cache.not_modified_response(etag)
+    try:
+        series = await async_crud.get_analytics(db, event, bucket=bucket, start=start, end=end,
+                                                max_points=max_points)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    body = schemas.AnalyticsSeries.model_validate(series).model_dump_json().encode()
+    return cache.conditional_response(request, body, etag)
+
+@app.get("/events")
+async def stream_events(request: Request):
+    queue = events.broadcaster.subscribe()
+    return StreamingResponse(
+        events.stream(request, queue),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 @app.get("/logs", response_model=List[schemas.LogRead])
-def read_logs(skip: int = 0, limit: int = 100, event: Optional[str] = None, db: Session = Depends(get_session)):
-    return crud.get_logs(db, skip=skip, limit=limit, event=event)
+async def read_logs(
+    request: Request,
+    skip: int = 0,
+    limit: int = 100,
+    event: Optional[str] = None,
+    cursor: Optional[str] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    fields: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_session),
+):
+    try:
+        field_list = crud.parse_fields(fields)
+        if cursor:
+            crud.decode_cursor(cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # The list only changes when the data version does, so the ETag can be checked before querying
+    etag = cache.etag_for("logs", await async_crud.get_data_version(db), skip, limit, event, cursor, start, end, fields)
+    if cache.is_not_modified(request, etag):
+        return cache.not_modified_response(etag)
+
+    # Plain rows straight from typed columns, encoded without a per-row model (see encoding.py)
+    rows, next_cursor = await async_crud.get_log_rows(db, field_list or crud.LOG_FIELDS, skip=skip, limit=limit,
+                                                      event=event, cursor=cursor, start=start, end=end)
+    body = encoding.dumps(rows)
+    # Same read transaction as the rows, so delta sync can start from here (GET /logs/changes)
+    headers = {"X-Log-Revision": str(await async_crud.get_log_revision(db))}
+    if next_cursor:
+        headers["X-Next-Cursor"] = next_cursor
+    return cache.conditional_response(request, body, etag, headers=headers)
+
+@app.get("/logs/changes", response_model=schemas.LogChanges)
+async def get_log_changes(
+    request: Request,
+    since: int = 0,
+    limit: int = crud.CHANGES_LIMIT,
+    db: AsyncSession = Depends(get_async_read_session),
+):
+    etag = cache.etag_for("changes", await async_crud.get_data_version(db), since, limit)
+    if cache.is_not_modified(request, etag):
+        return cache.not_modified_response(etag)
+    changes = await async_crud.get_changes(db, since=since, limit=limit)
+    return cache.conditional_response(request, encoding.dumps(changes), etag)
+
+@app.get("/logs/latest", response_model=schemas.LogRead)
+async def get_latest_log(
+    event: List[str] = Query(...),
+    status: Optional[str] = None,
+    db: AsyncSession = Depends(get_async_read_session),
+):
+    latest = await async_crud.get_latest(db, event, status=status)
+    if not latest:
+        raise HTTPException(status_code=404, detail=f"No {' / '.join(event)} log found")
+    return latest
+
+@app.get("/logs/ongoing", response_model=List[schemas.LogRead])
+async def get_ongoing_sessions(db: AsyncSession = Depends(get_async_read_session)):
+    return await async_crud.get_ongoing_sessions(db)
+
+@app.get("/logs/since", response_model=schemas.TimeSince)
+async def get_time_since(event: List[str] = Query(...), db: AsyncSession = Depends(get_async_read_session)):
+    return await async_crud.get_time_since(db, event)
+
+@app.get("/logs/export")
+def export_logs(
+    format: str = "csv",
+    event: Optional[str] = None,
+    start: Optional[datetime] = Query(None, alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    db: Session = Depends(get_read_session),
+):
+    if format not in export.FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported format: {format}")
+    try:
+        body = export.stream_export(db.get_bind(), format, event=event, start=start, end=end)
+    except export.ExportUnavailable as e:
+        raise HTTPException(status_code=501, detail=str(e))
+    media_type, extension = export.FORMATS[format]
+    return StreamingResponse(
+        body, media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="baby_logs.{extension}"'},
+    )
 
 @app.post("/logs", response_model=schemas.LogRead)
-def create_log(log: schemas.LogCreate, db: Session = Depends(get_session)):
-    return crud.log_event(db, log)
+async def create_log(log: schemas.LogCreate, db: AsyncSession = Depends(get_async_session)):
+    return await async_crud.submit_log_event(db, log)
+
+@app.post("/logs/bulk", response_model=schemas.IngestReport)
+async def bulk_create_logs(request: Request, db: Session = Depends(get_session)):
+    """Insert a JSON array or NDJSON body of LogCreate records in batches.
+
+    Invalid rows are reported and skipped; valid rows are committed batch by batch.
+    A malformed body is answered with 400 once the rows before the fault are in.
+    Records are only decoded on the event loop; validation and inserts run in the
+    threadpool, ``ingest.HANDOFF_SIZE`` records at a time.
+    """
+    ingestor = ingest.Ingestor(db)
+    records, malformed = [], None
+    try:
+        async for record in ingest.iter_request_records(request.stream()):
+            records.append(record)
+            if len(records) >= ingest.HANDOFF_SIZE:
+                await run_in_threadpool(ingestor.add_all, records)
+                records = []
+    except ingest.MalformedBody as e:
+        malformed = e
+    finally:
+        report = await run_in_threadpool(ingestor.finish, records)
+    if malformed is not None:
+        raise HTTPException(status_code=400, detail=f"{malformed}; {report.accepted} rows before it were imported")
+    return report
 
 @app.post("/logs/{event_type}/stop", response_model=schemas.LogRead)
-def stop_session(event_type: str, db: Session = Depends(get_session)):
-    stopped = crud.stop_ongoing_session(db, event_type)
+async def stop_session(event_type: str, db: AsyncSession = Depends(get_async_session)):
+    stopped = await async_crud.stop_ongoing_session(db, event_type)
     if not stopped:
         raise HTTPException(status_code=404, detail=f"No ongoing {event_type} session found")
     return stopped
 
+@app.get("/sessions", response_model=Dict[str, Optional[schemas.LogRead]])
+async def get_sessions(db: AsyncSession = Depends(get_async_read_session)):
+    return await async_crud.get_sessions(db)
+
+def _session_event(event: str) -> str:
+    if event not in crud.SESSION_EVENTS:
+        raise HTTPException(status_code=404, detail=f"{event} has no sessions")
+    return event
+
+@app.post("/sessions/{event}/start", response_model=schemas.SessionTransition)
+async def start_session(event: str, start: Optional[schemas.SessionStart] = None,
+                        db: AsyncSession = Depends(get_async_session)):
+    start = start or schemas.SessionStart()
+    return await async_crud.start_session(db, _session_event(event), **start.dict())
+
+@app.post("/sessions/{event}/stop", response_model=schemas.SessionTransition)
+async def stop_sessions(event: str, db: AsyncSession = Depends(get_async_session)):
+    return await async_crud.stop_session(db, _session_event(event))
+
+@app.post("/sessions/{event}/switch", response_model=schemas.SessionTransition)
+async def switch_session(event: str, orientation: Optional[str] = None,
+                         db: AsyncSession = Depends(get_async_session)):
+    try:
+        return await async_crud.switch_session(db, _session_event(event), orientation=orientation)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
 @app.delete("/logs/{log_id}")
-def delete_log(log_id: int, db: Session = Depends(get_session)):
-    success = crud.delete_log(db, log_id)
+async def delete_log(log_id: int, db: AsyncSession = Depends(get_async_session)):
+    success = await async_crud.delete_log(db, log_id)
     if not success:
         raise HTTPException(status_code=404, detail="Log not found")
     return {"status": "success"}
 
 @app.put("/logs/{log_id}", response_model=schemas.LogRead)
-def update_log(log_id: int, log_data: schemas.LogCreate, db: Session = Depends(get_session)):
-    db_log = db.query(models.Log).filter(models.Log.id == log_id).first()
+async def update_log(log_id: int, log_data: schemas.LogCreate, db: AsyncSession = Depends(get_async_session)):
+    db_log = await async_crud.update_log(db, log_id, log_data)
     if not db_log:
         raise HTTPException(status_code=404, detail="Log not found")
-    
-    for key, value in log_data.dict(exclude_unset=True).items():
-        setattr(db_log, key, value)
-    
-    db.commit()
-    db.refresh(db_log)
     return db_log
 
 @app.get("/latest-feed-id")
-def get_latest_feed_id(db: Session = Depends(get_session)):
-    return {"feed_id": crud.get_latest_feed_id(db)}
+async def get_latest_feed_id(db: AsyncSession = Depends(get_async_read_session)):
+    return {"feed_id": await async_crud.get_latest_feed_id(db)}
+
+def create_site(dist: str = static.DIST_DIR):
+    """The API under /api, as behind the Vite dev proxy, and the built frontend at /.
+
+    Production entry point for one process serving both:
+    ``uvicorn backend.main:create_site --factory`` (see run.py --prod).
+    """
+    router = Router(routes=[Mount("/api", app=app), Mount("/", app=static.Frontend(dist))])
+
+    async def site(scope, receive, send):
+        # Mounted apps never see lifespan events, so the API's startup runs from here
+        if scope["type"] == "lifespan":
+            await app(scope, receive, send)
+        else:
+            await router(scope, receive, send)
+    return site
 
 if __name__ == "__main__":
     import uvicorn
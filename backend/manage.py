@@ -0,0 +1,117 @@
+"""Maintenance commands for the backend.
+
+Run from the project root (next to config.yaml), e.g.::
+
+    python -m backend.manage migrate
+    python -m backend.manage explain
+    python -m backend.manage rebuild-rollup
+    python -m backend.manage import history.csv
+    python -m backend.manage export --format ndjson -o backup.ndjson
+    python -m backend.manage archive --days 180
+"""
+import argparse
+import logging
+import sys
+from datetime import datetime, timedelta
+
+from sqlmodel import Session
+
+from . import archive, crud, export, ingest, migrations
+from .database import engine, load_settings
+
+def cmd_migrate(args):
+    before = migrations.current_version(engine)
+    after = migrations.upgrade(engine, target=args.target)
+    print(f"Schema version: {before} -> {after}")
+
+def cmd_explain(args):
+    migrations.upgrade(engine)
+    with Session(engine) as db:
+        for statement, plan in migrations.explain_queries(db):
+            print(" ".join(statement.split()))
+            for line in plan:
+                print(f"    {line}")
+            print()
+
+def cmd_rebuild_rollup(args):
+    migrations.upgrade(engine)
+    with Session(engine) as db:
+        logs, rows = crud.rebuild_local_days(db)
+        db.commit()
+    print(f"Re-bucketed {logs} logs by local day; rebuilt daily_summary: {rows} rows")
+
+def cmd_import(args):
+    migrations.upgrade(engine)
+    with Session(engine) as db:
+        report = ingest.ingest(db, ingest.read_file(args.path, args.format), batch_size=args.batch_size)
+    print(f"Imported {report.accepted} rows, rejected {report.rejected}")
+    for error in report.errors:
+        print(f"  row {error.row}: {error.error}")
+    if report.errors_truncated:
+        print(f"  ... only the first {len(report.errors)} errors are shown")
+
+def cmd_export(args):
+    migrations.upgrade(engine)
+    try:
+        chunks = export.stream_export(engine, args.format, event=args.event, start=args.start, end=args.end)
+    except export.ExportUnavailable as e:
+        sys.exit(str(e))
+    out = open(args.output, "wb") if args.output else sys.stdout.buffer
+    try:
+        for chunk in chunks:
+            out.write(chunk)
+    finally:
+        if args.output:
+            out.close()
+
+def cmd_archive(args):
+    settings = load_settings()["archive"]
+    if not settings["enabled"]:
+        sys.exit("The archive is disabled; set database.archive.enabled in config.yaml first")
+    migrations.upgrade(engine)
+    days = args.days if args.days is not None else settings["hot_days"]
+    # Whole local days stay hot
+    cutoff = crud.get_current_time().replace(hour=0, minute=0, second=0, microsecond=0) - timedelta(days=days)
+    with Session(engine) as db:
+        moved = archive.archive_logs(db, cutoff, batch_size=args.batch_size)
+    print(f"Moved {moved} logs from before {cutoff:%Y-%m-%d} to {archive.path_for(engine.url.database)}")
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.manage", description="Baby Tracker maintenance commands")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("migrate", help="Upgrade the database schema in place")
+    p.add_argument("--target", type=int, default=None, help="Stop at this schema version")
+    p.set_defaults(func=cmd_migrate)
+
+    p = sub.add_parser("explain", help="Show EXPLAIN QUERY PLAN for the hot crud queries")
+    p.set_defaults(func=cmd_explain)
+
+    p = sub.add_parser("rebuild-rollup", help="Recompute the local day keys and the daily_summary rollup, e.g. after a timezone change")
+    p.set_defaults(func=cmd_rebuild_rollup)
+
+    p = sub.add_parser("import", help="Stream a CSV or NDJSON file of logs into the database")
+    p.add_argument("path")
+    p.add_argument("--format", choices=["csv", "ndjson"], default=None, help="Defaults to the file extension")
+    p.add_argument("--batch-size", type=int, default=ingest.BATCH_SIZE)
+    p.set_defaults(func=cmd_import)
+
+    p = sub.add_parser("export", help="Stream the logs table as CSV, NDJSON or Parquet")
+    p.add_argument("--format", choices=sorted(export.FORMATS), default="csv")
+    p.add_argument("--event", default=None)
+    p.add_argument("--from", dest="start", type=datetime.fromisoformat, default=None)
+    p.add_argument("--to", dest="end", type=datetime.fromisoformat, default=None)
+    p.add_argument("-o", "--output", default=None, help="Defaults to stdout")
+    p.set_defaults(func=cmd_export)
+
+    p = sub.add_parser("archive", help="Move old logs to the archive database")
+    p.add_argument("--days", type=int, default=None, help="Days to keep hot; defaults to database.archive.hot_days")
+    p.add_argument("--batch-size", type=int, default=archive.BATCH_SIZE)
+    p.set_defaults(func=cmd_archive)
+
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+    args = parser.parse_args(argv)
+    args.func(args)
+
+if __name__ == "__main__":
+    main()
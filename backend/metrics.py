@@ -0,0 +1,274 @@
+"""In-process request, query and crud timing, exposed in Prometheus text format.
+
+Every SQL statement that runs through SQLAlchemy is timed by engine events
+and charged to the current ``Tracker`` (a context variable), so
+``MetricsMiddleware`` can record the statement count and DB time of each
+request next to its latency and response size, and the ``async_crud``
+wrappers do the same per crud call for the API and the bot. ``GET /metrics``
+renders ``registry``; the bot can serve its own with ``start_http_server``.
+
+Requests and crud calls slower than ``slow_request_ms`` are logged with the
+statements that ran. Both are set from an optional ``metrics`` section in
+config.yaml::
+
+    metrics:
+      slow_request_ms: 500
+      bot_port: 9101
+"""
+import bisect
+import contextvars
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from .config import get_config
+
+logger = logging.getLogger(__name__)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+SLOW_LOG_STATEMENTS = 50
+SLOW_LOG_SQL_CHARS = 300
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(pairs) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}" if pairs else ""
+
+def _number(value: float) -> str:
+    return repr(float(value)) if value != float("inf") else "+Inf"
+
+class Metric:
+    kind = None
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name, self.help, self.label_names = name, help, tuple(labels)
+        self._lock = threading.Lock()
+        self._series = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels[name]) for name in self.label_names)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            series = sorted(self._series.items())
+        for key, value in series:
+            lines.extend(self._render_series(list(zip(self.label_names, key)), value))
+        return lines
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._series.get(self._key(labels), 0)
+
+    def _render_series(self, pairs, value):
+        return [f"{self.name}_total{_labels(pairs)} {_number(value)}"]
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._series.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._series[key] = (counts, total + value)
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return sum(series[0]) if series else 0
+
+    def _render_series(self, pairs, value):
+        counts, total = value
+        lines, cumulative = [], 0
+        for bound, count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += count
+            lines.append(f"{self.name}_bucket{_labels(pairs + [('le', _number(bound))])} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(pairs)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(pairs)} {cumulative}")
+        return lines
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def add(self, metric: Metric) -> Metric:
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        return "\n".join(line for metric in self.metrics for line in metric.render()) + "\n"
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.add(Histogram(
+    "babylog_http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")))
+REQUEST_STATEMENTS = registry.add(Histogram(
+    "babylog_http_request_db_statements", "SQL statements per HTTP request", ("method", "route"), COUNT_BUCKETS))
+REQUEST_DB_SECONDS = registry.add(Histogram(
+    "babylog_http_request_db_seconds", "Time spent in SQL per HTTP request", ("method", "route")))
+RESPONSE_BYTES = registry.add(Histogram(
+    "babylog_http_response_size_bytes", "HTTP response body size", ("method", "route"), SIZE_BUCKETS))
+CRUD_SECONDS = registry.add(Histogram(
+    "babylog_crud_call_duration_seconds", "Async crud call latency, from the API and the bot", ("function",)))
+CRUD_STATEMENTS = registry.add(Histogram(
+    "babylog_crud_call_db_statements", "SQL statements per async crud call", ("function",), COUNT_BUCKETS))
+DB_STATEMENTS = registry.add(Counter("babylog_db_statements", "SQL statements executed"))
+DB_SECONDS = registry.add(Counter("babylog_db_seconds", "Time spent executing SQL statements"))
+
+class Tracker:
+    """Statements run during one request or crud call; nested trackers also charge their parent."""
+
+    def __init__(self, parent: Optional["Tracker"] = None):
+        self.parent = parent
+        self.statements = []
+        self.db_seconds = 0.0
+
+    def record(self, statement: str, seconds: float):
+        tracker = self
+        while tracker is not None:
+            tracker.statements.append((statement, seconds))
+            tracker.db_seconds += seconds
+            tracker = tracker.parent
+
+_current = contextvars.ContextVar("babylog_metrics_tracker", default=None)
+
+@contextmanager
+def track():
+    tracker = Tracker(_current.get())
+    token = _current.set(tracker)
+    try:
+        yield tracker
+    finally:
+        _current.reset(token)
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info.get("metrics_started")
+    if not started:
+        return
+    seconds = time.perf_counter() - started.pop()
+    DB_STATEMENTS.inc()
+    DB_SECONDS.inc(seconds)
+    tracker = _current.get()
+    if tracker is not None:
+        tracker.record(statement, seconds)
+
+@event.listens_for(Engine, "handle_error")
+def _handle_error(context):
+    started = context.connection.info.get("metrics_started") if context.connection is not None else None
+    if started:
+        started.pop()
+
+def slow_threshold() -> Optional[float]:
+    """Seconds above which requests and crud calls are logged, or None when disabled."""
+    value = (get_config().data.get("metrics") or {}).get("slow_request_ms")
+    return float(value) / 1000 if value is not None else None
+
+def log_if_slow(what: str, seconds: float, tracker: Tracker):
+    threshold = slow_threshold()
+    if threshold is None or seconds < threshold:
+        return
+    lines = [f"  {s * 1000:8.2f}ms  {' '.join(sql.split())[:SLOW_LOG_SQL_CHARS]}"
+             for sql, s in tracker.statements[:SLOW_LOG_STATEMENTS]]
+    if len(tracker.statements) > SLOW_LOG_STATEMENTS:
+        lines.append(f"  ... {len(tracker.statements) - SLOW_LOG_STATEMENTS} more")
+    logger.warning("Slow %s: %.1fms, %d statements, %.1fms in SQL\n%s", what, seconds * 1000,
+                   len(tracker.statements), tracker.db_seconds * 1000, "\n".join(lines))
+
+def timed(name: str):
+    """Decorate an async function so each call is timed as a crud call."""
+    def decorator(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            with track() as tracker:
+                try:
+                    return await fn(*args, **kwargs)
+                finally:
+                    elapsed = time.perf_counter() - started
+                    CRUD_SECONDS.observe(elapsed, function=name)
+                    CRUD_STATEMENTS.observe(len(tracker.statements), function=name)
+                    log_if_slow(f"crud.{name}", elapsed, tracker)
+        return wrapper
+    return decorator
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route latency, SQL and response size.
+
+    Plain ASGI rather than BaseHTTPMiddleware, so streamed responses (SSE,
+    exports) pass through unbuffered. Routes are labelled by their path
+    template; unmatched paths share one label.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        response = {"status": 500, "bytes": 0}
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        with track() as tracker:
+            try:
+                await self.app(scope, receive, send_wrapper)
+            finally:
+                elapsed = time.perf_counter() - started
+                route = getattr(scope.get("route"), "path", "unmatched")
+                method = scope["method"]
+                REQUEST_SECONDS.observe(elapsed, method=method, route=route, status=response["status"])
+                REQUEST_STATEMENTS.observe(len(tracker.statements), method=method, route=route)
+                REQUEST_DB_SECONDS.observe(tracker.db_seconds, method=method, route=route)
+                RESPONSE_BYTES.observe(response["bytes"], method=method, route=route)
+                log_if_slow(f"{method} {scope['path']}", elapsed, tracker)
+
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_http_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serve ``registry`` at any path on a daemon thread, for processes without an API (the bot)."""
+    server = ThreadingHTTPServer((host, port), _Handler)
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    return server
@@ -0,0 +1,300 @@
+"""Versioned schema migrations for the SQLite database.
+
+Each migration is a function taking a Connection, registered in ``MIGRATIONS``
+with a monotonically increasing version. Migrations spell out their DDL as it
+stood at that version rather than reading it from the models, so replaying
+them on an old database never creates a later column early. ``upgrade`` applies the pending ones
+in order, each in its own write-locked transaction together with its
+``schema_version`` row, so an existing ``baby_log.db`` can be brought up to
+date in place.
+"""
+import logging
+from datetime import datetime, timezone
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection, Engine
+
+logger = logging.getLogger(__name__)
+
+def _has_column(conn: Connection, table: str, column: str) -> bool:
+    return any(c["name"].lower() == column.lower() for c in inspect(conn).get_columns(table))
+
+def _add_column(conn: Connection, table: str, column: str, ddl: str):
+    if not _has_column(conn, table, column):
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def _initial(conn: Connection):
+    # A pre-migration database already has `logs`
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS logs ("
+        "id INTEGER NOT NULL, event VARCHAR NOT NULL, details VARCHAR, timestamp DATETIME NOT NULL, "
+        "comments VARCHAR, end_timestamp DATETIME, orientation VARCHAR, feed_id INTEGER, "
+        "weight FLOAT, height FLOAT, PRIMARY KEY (id))"
+    ))
+
+def _logs_indexes(conn: Connection):
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_logs_timestamp ON logs (timestamp)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_logs_event_timestamp ON logs (event, timestamp)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_logs_event_details_timestamp ON logs (event, details, timestamp)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_logs_event_feed_id ON logs (event, feed_id)"))
+
+def _rebuild_rollup(conn: Connection):
+    from sqlmodel import Session
+    from . import crud
+
+    with Session(bind=conn) as db:
+        crud.rebuild_daily_summary(db)
+        db.commit()
+
+def _daily_summary(conn: Connection):
+    # Filled by the rollup rebuild in upgrade()
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS daily_summary ("
+        "day VARCHAR NOT NULL, event VARCHAR NOT NULL, count INTEGER NOT NULL, done_count INTEGER NOT NULL, "
+        "minutes FLOAT NOT NULL, left_count INTEGER NOT NULL, right_count INTEGER NOT NULL, "
+        "expressed_count INTEGER NOT NULL, weight FLOAT, height FLOAT, PRIMARY KEY (day, event))"
+    ))
+
+def _app_state(conn: Connection):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS app_state ("key" VARCHAR NOT NULL, value INTEGER NOT NULL, PRIMARY KEY ("key"))'
+    ))
+    conn.execute(text("INSERT OR IGNORE INTO app_state (key, value) VALUES ('data_version', 0)"))
+
+def _session_fields(conn: Connection):
+    from . import crud
+
+    _add_column(conn, "logs", "status", "VARCHAR")
+    _add_column(conn, "logs", "duration_seconds", "INTEGER")
+    conn.execute(text("UPDATE logs SET status = 'ongoing', duration_seconds = NULL WHERE details = 'ongoing'"))
+    parsed = [
+        {"id": row.id, "seconds": seconds}
+        for row in conn.execute(text("SELECT id, details FROM logs WHERE details LIKE '%:%:%'"))
+        if (seconds := crud.parse_duration(row.details)) is not None
+    ]
+    if parsed:
+        conn.execute(text("UPDATE logs SET duration_seconds = :seconds WHERE id = :id"), parsed)
+    # Sessions imported with an end time but no duration string
+    conn.execute(text(
+        "UPDATE logs SET duration_seconds = CAST(ROUND((julianday(end_timestamp) - julianday(timestamp)) * 86400) AS INTEGER) "
+        "WHERE duration_seconds IS NULL AND end_timestamp IS NOT NULL AND status IS NULL"
+    ))
+    conn.execute(text(
+        "UPDATE logs SET details = printf('%02d:%02d:%02d', duration_seconds / 3600, duration_seconds % 3600 / 60, duration_seconds % 60) "
+        "WHERE details IS NULL AND duration_seconds IS NOT NULL"
+    ))
+    conn.execute(text("UPDATE logs SET status = 'completed' WHERE status IS NULL AND details IS NOT NULL"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_logs_event_details_timestamp"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_logs_event_status_timestamp ON logs (event, status, timestamp)"))
+
+STORAGE_FORMAT = "%Y-%m-%d %H:%M:%S.%f"
+
+def _legacy_timestamps() -> str:
+    # How rows written before migration 6 store their timestamps: "local" or "utc"
+    from .database import load_settings
+    return load_settings()["legacy_timestamps"]
+
+def _timestamps_to_utc(conn: Connection):
+    from . import crud
+
+    for column in ("timestamp", "end_timestamp"):
+        rows = conn.execute(text(f"SELECT id, {column} AS value FROM logs WHERE {column} IS NOT NULL")).all()
+        converted = []
+        for row in rows:
+            local = datetime.fromisoformat(row.value)
+            if local.tzinfo is None:
+                local = crud._as_aware(local)
+            converted.append({"id": row.id, "value": local.astimezone(timezone.utc).strftime(STORAGE_FORMAT)})
+        if converted:
+            conn.execute(text(f"UPDATE logs SET {column} = :value WHERE id = :id"), converted)
+
+def _local_keys(conn: Connection):
+    """Store timestamps as UTC and backfill the local_date / local_minute columns.
+
+    Existing rows are read as local wall-clock time in the configured timezone,
+    as the app wrote them, and converted to UTC. Like every migration this runs
+    once per database. A database whose rows already hold UTC must set
+    ``database.legacy_timestamps: utc`` in config.yaml before upgrading.
+    """
+    from sqlmodel import Session
+    from . import crud
+
+    _add_column(conn, "logs", "local_date", "VARCHAR")
+    _add_column(conn, "logs", "local_minute", "INTEGER")
+    if _legacy_timestamps() == "local":
+        _timestamps_to_utc(conn)
+    with Session(bind=conn) as db:
+        crud.rebuild_local_keys(db)
+        db.flush()
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_logs_event_local_date ON logs (event, local_date)"))
+
+def _change_journal(conn: Connection):
+    _add_column(conn, "logs", "rev", "INTEGER")
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS log_tombstones ("
+        "id INTEGER NOT NULL, rev INTEGER NOT NULL, event VARCHAR NOT NULL, PRIMARY KEY (id))"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_log_tombstones_rev ON log_tombstones (rev)"))
+    # Existing rows are numbered in id order
+    conn.execute(text("UPDATE logs SET rev = id WHERE rev IS NULL"))
+    conn.execute(text(
+        "INSERT INTO app_state (key, value) VALUES ('log_revision', (SELECT COALESCE(MAX(rev), 0) FROM logs)) "
+        "ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)"
+    ))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_logs_rev ON logs (rev)"))
+
+def _feed_id_sequence(conn: Connection):
+    from sqlmodel import Session
+    from . import crud
+
+    with Session(bind=conn) as db:
+        crud.advance_feed_id(db, [crud.max_feed_id(db)])
+        db.flush()
+
+LOGS_V9_COLUMNS = (
+    "id, event, details, status, duration_seconds, timestamp, local_date, local_minute, rev, "
+    "comments, end_timestamp, orientation, feed_id, weight, height"
+)
+
+LOGS_V9_INDEXES = [
+    "CREATE INDEX ix_logs_timestamp ON logs (timestamp)",
+    "CREATE INDEX ix_logs_event_timestamp ON logs (event, timestamp)",
+    "CREATE INDEX ix_logs_event_status_timestamp ON logs (event, status, timestamp)",
+    "CREATE INDEX ix_logs_event_feed_id ON logs (event, feed_id)",
+    "CREATE INDEX ix_logs_event_local_date ON logs (event, local_date)",
+    "CREATE INDEX ix_logs_rev ON logs (rev)",
+]
+
+def _logs_autoincrement(conn: Connection):
+    """Rebuild ``logs`` with AUTOINCREMENT where migration 1 made it without, and keep ids above the archive's."""
+    sql = conn.execute(text("SELECT sql FROM sqlite_master WHERE type = 'table' AND name = 'logs'")).scalar()
+    if "AUTOINCREMENT" not in sql.upper():
+        conn.execute(text("ALTER TABLE logs RENAME TO logs_rowid"))
+        for index in inspect(conn).get_indexes("logs_rowid"):
+            conn.execute(text(f'DROP INDEX "{index["name"]}"'))
+        conn.execute(text(
+            "CREATE TABLE logs ("
+            "id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT, event VARCHAR NOT NULL, details VARCHAR, "
+            "status VARCHAR, duration_seconds INTEGER, timestamp DATETIME NOT NULL, local_date VARCHAR, "
+            "local_minute INTEGER, rev INTEGER, comments VARCHAR, end_timestamp DATETIME, orientation VARCHAR, "
+            "feed_id INTEGER, weight FLOAT, height FLOAT)"
+        ))
+        for ddl in LOGS_V9_INDEXES:
+            conn.execute(text(ddl))
+        conn.execute(text(f"INSERT INTO logs ({LOGS_V9_COLUMNS}) SELECT {LOGS_V9_COLUMNS} FROM logs_rowid"))
+        conn.execute(text("DROP TABLE logs_rowid"))
+    has_archive = conn.execute(text(
+        "SELECT 1 FROM pragma_database_list WHERE name = 'archive'"
+    )).scalar() and conn.execute(text(
+        "SELECT 1 FROM archive.sqlite_master WHERE type = 'table' AND name = 'logs'"
+    )).scalar()
+    if has_archive:
+        # sqlite_sequence has no unique key, so update the row the rebuild made or add one
+        highest = conn.execute(text("SELECT MAX(id) FROM archive.logs")).scalar() or 0
+        updated = conn.execute(text(
+            "UPDATE main.sqlite_sequence SET seq = MAX(seq, :highest) WHERE name = 'logs'"
+        ), {"highest": highest}).rowcount
+        if not updated:
+            conn.execute(text("INSERT INTO main.sqlite_sequence (name, seq) VALUES ('logs', :highest)"), {"highest": highest})
+
+MIGRATIONS = [
+    (1, "initial", _initial),
+    (2, "logs_indexes", _logs_indexes),
+    (3, "daily_summary", _daily_summary),
+    (4, "app_state", _app_state),
+    (5, "session_fields", _session_fields),
+    (6, "local_keys", _local_keys),
+    (7, "change_journal", _change_journal),
+    (8, "feed_id_sequence", _feed_id_sequence),
+    (9, "logs_autoincrement", _logs_autoincrement),
+]
+
+# Migrations after which daily_summary must be recomputed. The rebuild runs once,
+# with the last pending migration, so it always sees the final schema.
+REBUILDS_ROLLUP = {"daily_summary", "session_fields", "local_keys"}
+
+def _ensure_version_table(conn: Connection):
+    conn.execute(text(
+        "CREATE TABLE IF NOT EXISTS schema_version ("
+        "version INTEGER PRIMARY KEY, name TEXT NOT NULL, applied_at TEXT NOT NULL)"
+    ))
+
+def current_version(engine: Engine) -> int:
+    with engine.begin() as conn:
+        _ensure_version_table(conn)
+        return conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+
+def _take_write_lock(conn: Connection):
+    # The write engine's begin listener has already issued BEGIN IMMEDIATE
+    if not conn.connection.driver_connection.in_transaction:
+        conn.exec_driver_sql("BEGIN IMMEDIATE")
+
+def upgrade(engine: Engine, target: int = None) -> int:
+    """Apply pending migrations up to ``target`` (default: latest) and return the new version.
+
+    Every step takes the write lock before reading ``schema_version``, so when the
+    API and the bot start together one applies each migration and the other waits
+    on the lock, re-reads the version and skips what is already recorded.
+    """
+    rebuild = False
+    while True:
+        with engine.begin() as conn:
+            _take_write_lock(conn)
+            _ensure_version_table(conn)
+            version = conn.execute(text("SELECT COALESCE(MAX(version), 0) FROM schema_version")).scalar()
+            pending = [m for m in MIGRATIONS if m[0] > version and (target is None or m[0] <= target)]
+            if not pending:
+                # Another process applied the rest after we ran a migration that needs the rebuild
+                if rebuild:
+                    _rebuild_rollup(conn)
+                return version
+            number, name, migrate = pending[0]
+            logger.info("Applying migration %03d_%s", number, name)
+            migrate(conn)
+            rebuild = rebuild or name in REBUILDS_ROLLUP
+            if rebuild and len(pending) == 1:
+                _rebuild_rollup(conn)
+                rebuild = False
+            conn.execute(
+                text("INSERT INTO schema_version (version, name, applied_at) VALUES (:v, :n, :t)"),
+                {"v": number, "n": name, "t": datetime.utcnow().isoformat()},
+            )
+
+def explain_queries(db):
+    """Run the hot crud queries once and return ``(sql, plan)`` pairs from EXPLAIN QUERY PLAN.
+
+    The statements are captured from the real crud functions, so the plans show
+    exactly what the dashboard, the log list and the session lookups execute.
+    """
+    from sqlalchemy import event
+    from . import crud
+
+    captured = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and not executemany:
+            captured.append((statement, parameters))
+
+    bind = db.get_bind()
+    event.listen(bind, "before_cursor_execute", capture)
+    try:
+        crud.get_stats(db)
+        crud.get_logs(db)
+        crud.get_logs(db, event="Feeding")
+        crud.get_ongoing(db, "Feeding")
+        crud.get_ongoing_sessions(db)
+        crud.get_latest(db, ["Feeding"], status=crud.SESSION_COMPLETED)
+        crud.get_time_since(db, crud.DIAPER_TYPES)
+        crud.get_latest_feed_id(db)
+        crud.get_analytics(db, ["Feeding"], bucket="hour")
+        crud.get_analytics(db, ["Feeding", "Growth"], bucket="week")
+        crud.get_changes(db, since=0)
+    finally:
+        event.remove(bind, "before_cursor_execute", capture)
+
+    results = []
+    conn = db.connection()
+    for statement, parameters in captured:
+        rows = conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters).fetchall()
+        results.append((statement, [row[-1] for row in rows]))
+    return results
@@ -1,17 +1,88 @@
-from datetime import datetime
+from datetime import datetime, timezone
 from typing import Optional
+from sqlalchemy import DateTime, Index, TypeDecorator
 from sqlmodel import Field, SQLModel
 
+class UTCTimestamp(TypeDecorator):
+    """Aware datetimes stored as naive UTC text and read back as aware UTC.
+
+    Declared explicitly so the storage format does not depend on the SQLModel
+    release; ordering and range predicates compare instants on every row.
+    """
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if value.utcoffset() is None:
+            raise ValueError("Timestamps must be timezone-aware")
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+    def process_result_value(self, value, dialect):
+        return value.replace(tzinfo=timezone.utc) if value is not None else None
+
 class Log(SQLModel, table=True):
     __tablename__ = "logs"
+    # Keep in sync with the index migrations in migrations.py
+    __table_args__ = (
+        Index("ix_logs_timestamp", "timestamp"),
+        Index("ix_logs_event_timestamp", "event", "timestamp"),
+        Index("ix_logs_event_status_timestamp", "event", "status", "timestamp"),
+        Index("ix_logs_event_feed_id", "event", "feed_id"),
+        Index("ix_logs_event_local_date", "event", "local_date"),
+        Index("ix_logs_rev", "rev"),
+        # Ids are never handed out again, even after the row is deleted or archived
+        {"sqlite_autoincrement": True},
+    )
 
     id: Optional[int] = Field(default=None, primary_key=True)
     event: str
     details: Optional[str] = None
-    timestamp: datetime = Field(default_factory=datetime.utcnow)
+    # "ongoing" / "completed"; details still carries the legacy "ongoing" / "HH:MM:SS" form
+    status: Optional[str] = None
+    duration_seconds: Optional[int] = None
+    timestamp: datetime = Field(default_factory=lambda: datetime.now(timezone.utc), sa_type=UTCTimestamp)
+    # Local calendar day ("YYYY-MM-DD") and minutes after local midnight of `timestamp`
+    # in the configured timezone; derived by crud on every write
+    local_date: Optional[str] = None
+    local_minute: Optional[int] = None
+    # Change journal revision, from the "log_revision" counter; bumped on every insert and update
+    rev: Optional[int] = None
     comments: Optional[str] = None
-    end_timestamp: Optional[datetime] = Field(default=None)
+    end_timestamp: Optional[datetime] = Field(default=None, sa_type=UTCTimestamp)
     orientation: Optional[str] = None
     feed_id: Optional[int] = None
     weight: Optional[float] = None
     height: Optional[float] = None
+
+class DailySummary(SQLModel, table=True):
+    """Per local day and event type rollup of `logs`, maintained by crud on every write."""
+    __tablename__ = "daily_summary"
+
+    day: str = Field(primary_key=True)
+    event: str = Field(primary_key=True)
+    count: int = 0
+    done_count: int = 0
+    minutes: float = 0.0
+    left_count: int = 0
+    right_count: int = 0
+    expressed_count: int = 0
+    weight: Optional[float] = None
+    height: Optional[float] = None
+
+class AppState(SQLModel, table=True):
+    """Small key/value counters shared by every process using the database."""
+    __tablename__ = "app_state"
+
+    key: str = Field(primary_key=True)
+    value: int = 0
+
+class LogTombstone(SQLModel, table=True):
+    """A deleted log's id and the revision of its deletion, for delta sync (see crud.get_changes)."""
+    __tablename__ = "log_tombstones"
+    __table_args__ = (Index("ix_log_tombstones_rev", "rev"),)
+
+    id: int = Field(primary_key=True)
+    rev: int
+    event: str
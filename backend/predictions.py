@@ -0,0 +1,207 @@
+"""Sleep-window prediction from recent history.
+
+Completed sleeps from the last ``window_days`` are placed on the 24-hour clock
+by their local start time and weighted by recency (halving every
+``half_life_days``). A circular kernel density over start times finds the
+recurring sleeps; each sleep is assigned to its nearest peak, and clusters
+seen on enough of the observed days become predicted windows. A window's start
+is the weighted circular mean of its starts, and its length is the weighted
+mean of the real durations, so sleeps across midnight are handled. With fewer
+than two regular windows, the developmental norms from config are used.
+
+The model is cached and rebuilt only when the ``sleep_version`` counter, the
+config, the local date or the window changes. The window is bounded, so the
+cost stays flat however long the history grows.
+
+Configure it from an optional ``predictions`` section in config.yaml::
+
+    predictions:
+      window_days: 30
+      half_life_days: 7
+"""
+import threading
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from sqlalchemy import and_
+from sqlalchemy.orm import Session
+
+from . import archive
+from .common import EVENT_VERSION_KEYS, HISTORY_DAYS, SESSION_ONGOING, _as_aware, _local_naive, get_current_time, get_version
+from .config import get_config
+
+WINDOW_DAYS = 30
+MIN_WINDOW_DAYS, MAX_WINDOW_DAYS = 7, 180
+HALF_LIFE_DAYS = 7.0
+FORECAST_DAYS = 14
+
+MINUTES_PER_DAY = 1440
+BIN_MINUTES = 10
+KERNEL_SIGMA_MINUTES = 30
+CLUSTER_RADIUS_MINUTES = 120
+MIN_PEAK_FRACTION = 0.1   # of the highest density peak
+MIN_DAY_SUPPORT = 0.4     # share of (weighted) observed days a window must appear on
+NAP_MAX_MINUTES = 300     # Rough heuristic: > 5 hours is night sleep
+
+def settings():
+    section = get_config().data.get("predictions") or {}
+    window = int(section.get("window_days", WINDOW_DAYS))
+    return (
+        max(MIN_WINDOW_DAYS, min(window, MAX_WINDOW_DAYS)),
+        float(section.get("half_life_days", HALF_LIFE_DAYS)),
+    )
+
+def _hhmm(minutes: float) -> str:
+    hours, minutes = divmod(int(round(minutes)) % MINUTES_PER_DAY, 60)
+    return f"{hours:02d}:{minutes:02d}"
+
+def _circular_kernel(sigma_bins: float, bins: int) -> np.ndarray:
+    offsets = np.arange(bins)
+    distance = np.minimum(offsets, bins - offsets)
+    return np.exp(-0.5 * (distance / sigma_bins) ** 2)
+
+def _circular_distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    diff = np.abs(a - b) % MINUTES_PER_DAY
+    return np.minimum(diff, MINUTES_PER_DAY - diff)
+
+def fit_windows(starts, durations, days, weights):
+    """Recurring sleep windows from per-sleep arrays.
+
+    ``starts`` are local start times in minutes after midnight, ``durations``
+    are in minutes, ``days`` are local day ordinals and ``weights`` are
+    recency weights. Returns ``[{"start": "HH:MM", "end": "HH:MM"}]`` in start order.
+    """
+    starts, durations = np.asarray(starts, float), np.asarray(durations, float)
+    days, weights = np.asarray(days), np.asarray(weights, float)
+    if starts.size < 2:
+        return []
+
+    bins = MINUTES_PER_DAY // BIN_MINUTES
+    histogram = np.bincount((starts // BIN_MINUTES).astype(int) % bins, weights=weights, minlength=bins)
+    kernel = _circular_kernel(KERNEL_SIGMA_MINUTES / BIN_MINUTES, bins)
+    density = np.real(np.fft.ifft(np.fft.fft(histogram) * np.fft.fft(kernel)))
+    peaks = np.flatnonzero(
+        (density > np.roll(density, 1)) & (density >= np.roll(density, -1))
+        & (density >= MIN_PEAK_FRACTION * density.max())
+    )
+    if peaks.size == 0:
+        return []
+    centres = (peaks + 0.5) * BIN_MINUTES
+
+    distances = _circular_distance(starts[:, None], centres[None, :])
+    nearest = distances.argmin(axis=1)
+    in_radius = distances[np.arange(starts.size), nearest] <= CLUSTER_RADIUS_MINUTES
+
+    # Each observed day counts once, at the weight of its first sleep
+    observed_days, first = np.unique(days, return_index=True)
+    day_weight = dict(zip(observed_days.tolist(), weights[first].tolist()))
+    total_day_weight = sum(day_weight.values())
+
+    windows = []
+    for cluster in range(centres.size):
+        members = in_radius & (nearest == cluster)
+        if members.sum() < 2:
+            continue
+        support = sum(day_weight[d] for d in np.unique(days[members]).tolist()) / total_day_weight
+        if support < MIN_DAY_SUPPORT:
+            continue
+        w = weights[members]
+        angles = starts[members] * (2 * np.pi / MINUTES_PER_DAY)
+        mean_angle = np.arctan2((w * np.sin(angles)).sum(), (w * np.cos(angles)).sum())
+        start = (mean_angle % (2 * np.pi)) * MINUTES_PER_DAY / (2 * np.pi)
+        duration = np.average(durations[members], weights=w)
+        windows.append({"start": _hhmm(start), "end": _hhmm(start + duration)})
+    return sorted(windows, key=lambda x: x["start"])
+
+def _load_sleeps(db: Session, since: str):
+    def completed(entity):
+        return and_(entity.event == "Sleep", entity.local_date >= since, entity.end_timestamp.isnot(None),
+                    entity.status.is_distinct_from(SESSION_ONGOING))
+    source = archive.source(db, completed, _as_aware(datetime.fromisoformat(since)))
+    return db.query(source.timestamp, source.end_timestamp, source.local_date, source.local_minute).filter(
+        completed(source)
+    ).order_by(source.timestamp, source.id).all()
+
+def build_sleep_predictions(db: Session, now, window_days: int = WINDOW_DAYS,
+                            half_life_days: float = HALF_LIFE_DAYS, past_days: int = HISTORY_DAYS):
+    today = now.date()
+    rows = _load_sleeps(db, (today - timedelta(days=max(window_days, past_days))).isoformat())
+
+    past_since = (today - timedelta(days=past_days)).isoformat()
+    past, starts, durations, days, weights = [], [], [], [], []
+    for row in rows:
+        st, et = _as_aware(row.timestamp), _as_aware(row.end_timestamp)
+        duration = (et - st).total_seconds() / 60
+        if row.local_date >= past_since:
+            past.append({
+                "date": row.local_date,
+                "start": _hhmm(row.local_minute),
+                "end": _local_naive(et).strftime("%H:%M"),
+                "is_predicted": False,
+                "duration": duration,
+            })
+        age_days = (now - st).total_seconds() / 86400
+        if age_days <= window_days and duration > 0:
+            starts.append(row.local_minute)
+            durations.append(duration)
+            days.append(date.fromisoformat(row.local_date).toordinal())
+            weights.append(0.5 ** (max(age_days, 0) / half_life_days))
+
+    base_windows = fit_windows(starts, durations, days, weights)
+
+    norms = get_config().stage(now.date())
+    if len(base_windows) < 2:
+        base_windows = sorted((dict(w) for w in norms["windows"]), key=lambda x: x["start"])
+
+    details = []
+    total_min = 0
+    nap_count = 0
+    for w in base_windows:
+        hs, ms = map(int, w["start"].split(":"))
+        he, me = map(int, w["end"].split(":"))
+        dur = (he * 60 + me - hs * 60 - ms) % MINUTES_PER_DAY
+        total_min += dur
+        is_nap = dur < NAP_MAX_MINUTES
+        nap_count += is_nap
+        details.append({"start": w["start"], "end": w["end"], "duration": round(dur / 60, 1),
+                        "type": "Nap" if is_nap else "Night"})
+
+    future = [
+        {"date": (now + timedelta(days=i)).strftime("%Y-%m-%d"), "start": w["start"], "end": w["end"],
+         "is_predicted": True}
+        for i in range(1, FORECAST_DAYS + 1)
+        for w in base_windows
+    ]
+
+    return {
+        "past": past,
+        "future": future,
+        "summary": {
+            "stage": norms["stage"],
+            "nap_count": nap_count,
+            "total_hours": round(total_min / 60, 1),
+            "details": details,
+        },
+    }
+
+_cache_lock = threading.Lock()
+_cache = {}
+
+def get_sleep_predictions(db: Session, now=None):
+    """Cached build_sleep_predictions; rebuilt when a Sleep row, the config or the day changes."""
+    now = now or get_current_time()
+    window_days, half_life_days = settings()
+    key = (get_version(db, EVENT_VERSION_KEYS["Sleep"]), get_config().version,
+           now.date(), window_days, half_life_days)
+    with _cache_lock:
+        if key in _cache:
+            return _cache[key]
+    result = build_sleep_predictions(db, now, window_days, half_life_days)
+    with _cache_lock:
+        _cache.clear()
+        _cache[key] = result
+    return result
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
@@ -1,10 +1,12 @@
 from datetime import datetime
-from typing import Optional, List
+from typing import Optional, List, Literal
 from pydantic import BaseModel, computed_field
 
 class LogBase(BaseModel):
     event: str
     details: Optional[str] = None
+    status: Optional[Literal["ongoing", "completed"]] = None
+    duration_seconds: Optional[int] = None
     timestamp: Optional[datetime] = None
     comments: Optional[str] = None
     end_timestamp: Optional[datetime] = None
@@ -18,21 +20,25 @@ class LogCreate(LogBase):
 
 class LogRead(LogBase):
     id: int
+    rev: Optional[int] = None
 
     @computed_field
     @property
     def duration_minutes(self) -> float:
-        if not self.details or ":" not in self.details or self.details == "ongoing":
-            return 0.0
-        try:
-            parts = list(map(int, self.details.split(':')))
-            return round(float(parts[0]*60 + parts[1] + parts[2]/60), 2)
-        except (ValueError, IndexError, TypeError):
-            return 0.0
+        return round((self.duration_seconds or 0) / 60, 2)
 
     class Config:
         from_attributes = True
 
+class SessionStart(BaseModel):
+    orientation: Optional[str] = None
+    timestamp: Optional[datetime] = None
+    comments: Optional[str] = None
+
+class SessionTransition(BaseModel):
+    stopped: List[LogRead]
+    started: Optional[LogRead] = None
+
 class DailyStats(BaseModel):
     today_count: int
     yesterday_count: int
@@ -76,3 +82,46 @@ class DashboardData(BaseModel):
     last_completed_feed: Optional[LogRead]
     predictions: Optional[dict] = None
     history: Optional[dict] = None
+
+class TimeSince(BaseModel):
+    event: Optional[str] = None
+    timestamp: Optional[datetime] = None
+    seconds: Optional[int] = None
+    text: str
+
+class LogChanges(BaseModel):
+    rev: int
+    logs: List[LogRead]
+    deleted: List[int]
+    has_more: bool
+
+class AnalyticsPoint(BaseModel):
+    start: str
+    count: int = 0
+    done_count: int = 0
+    minutes: float = 0.0
+    avg_minutes: Optional[float] = None
+    hours: float = 0.0
+    left_count: int = 0
+    right_count: int = 0
+    expressed_count: int = 0
+    weight: Optional[float] = None
+    height: Optional[float] = None
+
+class AnalyticsSeries(BaseModel):
+    events: List[str]
+    requested_bucket: str
+    bucket: str
+    start: datetime
+    end: datetime
+    points: List[AnalyticsPoint]
+
+class IngestError(BaseModel):
+    row: int
+    error: str
+
+class IngestReport(BaseModel):
+    accepted: int = 0
+    rejected: int = 0
+    errors: List[IngestError] = []
+    errors_truncated: bool = False
@@ -0,0 +1,111 @@
+"""Serving the built frontend (``frontend/dist``) from the API process.
+
+``python run.py --prod`` runs ``npm run build`` when the sources are newer than
+the build, then ``precompress`` writes a ``.gz`` (and, with the optional
+``brotli`` package, a ``.br``) copy of every compressible file at the highest
+level, so nothing is compressed per request. ``Frontend`` loads the build into
+memory once and answers with strong ETags and 304s through
+``cache.conditional_response``. Vite's content-hashed files under ``assets/``
+are cached by browsers for a year; everything else, index.html included, is
+revalidated on every load. Paths that name no file fall back to index.html.
+"""
+import mimetypes
+import os
+from typing import Optional
+
+from fastapi import Request, Response
+
+from . import cache
+from .encoding import MIN_COMPRESS_SIZE, available_encodings, compress
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DIST_DIR = os.path.join(BASE_DIR, "frontend", "dist")
+
+COMPRESSIBLE = {".html", ".js", ".mjs", ".css", ".svg", ".json", ".map", ".txt", ".xml", ".ico", ".webmanifest"}
+SUFFIXES = {"gzip": ".gz", "br": ".br"}
+# Build-time levels: slow to compress, but it happens once
+PRECOMPRESS_LEVELS = {"gzip": 9, "br": 11}
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+def _files(directory: str):
+    for root, _, names in os.walk(directory):
+        for name in names:
+            if not name.endswith(tuple(SUFFIXES.values())):
+                yield os.path.join(root, name)
+
+def precompress(directory: str = DIST_DIR) -> int:
+    """Write compressed copies of the compressible files in ``directory``; returns how many were written.
+
+    Copies newer than their source are kept, so running it again after an
+    unchanged build does nothing.
+    """
+    written = 0
+    for path in _files(directory):
+        if os.path.splitext(path)[1] not in COMPRESSIBLE or os.path.getsize(path) < MIN_COMPRESS_SIZE:
+            continue
+        body = None
+        for encoding in available_encodings():
+            target = path + SUFFIXES[encoding]
+            if os.path.exists(target) and os.path.getmtime(target) >= os.path.getmtime(path):
+                continue
+            if body is None:
+                with open(path, "rb") as f:
+                    body = f.read()
+            with open(target, "wb") as f:
+                f.write(compress(body, encoding, PRECOMPRESS_LEVELS[encoding]))
+            written += 1
+    return written
+
+class Asset:
+    __slots__ = ("body", "media_type", "cache_control")
+
+    def __init__(self, body: cache.CachedBody, media_type: str, cache_control: str):
+        self.body, self.media_type, self.cache_control = body, media_type, cache_control
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def load(directory: str, immutable_dir: str = "assets") -> dict:
+    """Every file in ``directory`` as ``{relative posix path: Asset}``, with its precompressed variants."""
+    assets = {}
+    for path in _files(directory):
+        name = os.path.relpath(path, directory).replace(os.sep, "/")
+        encoded = {e: _read(path + s) for e, s in SUFFIXES.items() if os.path.exists(path + s)}
+        media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        cache_control = IMMUTABLE if name.startswith(immutable_dir + "/") else REVALIDATE
+        assets[name] = Asset(cache.CachedBody(_read(path), encoded), media_type, cache_control)
+    return assets
+
+class Frontend:
+    """ASGI app serving a built single-page app from memory."""
+
+    def __init__(self, directory: str = DIST_DIR, index: str = "index.html"):
+        if not os.path.isfile(os.path.join(directory, index)):
+            raise RuntimeError(f"No frontend build in {directory}; run `npm run build` in frontend/")
+        self.index = index
+        self.assets = load(directory)
+
+    def find(self, path: str) -> Optional[Asset]:
+        name = path.lstrip("/") or self.index
+        asset = self.assets.get(name)
+        if asset is None and "." not in name.rsplit("/", 1)[-1]:
+            # Client-side routes are served the app shell
+            asset = self.assets[self.index]
+        return asset
+
+    async def __call__(self, scope, receive, send):
+        request = Request(scope, receive)
+        if request.method not in ("GET", "HEAD"):
+            response = Response(status_code=405, headers={"Allow": "GET, HEAD"})
+        else:
+            root = scope.get("root_path", "")
+            path = scope["path"][len(root):] if scope["path"].startswith(root) else scope["path"]
+            asset = self.find(path)
+            if asset is None:
+                response = Response(status_code=404)
+            else:
+                response = cache.conditional_response(request, asset.body, media_type=asset.media_type,
+                                                      cache_control=asset.cache_control)
+        await response(scope, receive, send)
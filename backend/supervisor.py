@@ -0,0 +1,268 @@
+"""Process supervisor behind ``run.py``: API workers, the bot and Vite as managed children.
+
+The supervisor binds the public port once and hands the listening socket to
+every API worker (``python -m backend.supervisor worker``), so N workers
+share it and the kernel spreads connections between them. Each worker also
+gets a private loopback socket that only the supervisor uses to poll its
+readiness endpoint (``GET /ready``). The supervisor itself imports nothing from
+the backend, so it stays small and survives anything the app does.
+
+- A child that exits is started again after an exponential backoff
+  (``BACKOFF_BASE`` doubling up to ``BACKOFF_MAX``), reset once it has stayed
+  up for ``STABLE_SECONDS``.
+- A worker that fails ``HEALTH_FAILURES`` health checks in a row is replaced.
+- SIGHUP restarts the workers one at a time: the replacement must report ready
+  before the old worker is asked to stop, and the old one finishes its
+  in-flight requests (up to ``GRACE_SECONDS``) first. Other services are then
+  restarted in turn.
+- SIGINT / SIGTERM stop every child gracefully, then kill stragglers.
+
+Caches in the workers are keyed on counters stored in the database (see
+``crud.note_change``), so they stay correct whichever process wrote.
+"""
+import argparse
+import http.client
+import logging
+import signal
+import socket
+import subprocess
+import sys
+import time
+from typing import Optional
+
+logger = logging.getLogger("supervisor")
+
+BACKOFF_BASE = 1.0
+BACKOFF_MAX = 60.0
+STABLE_SECONDS = 30.0
+HEALTH_INTERVAL = 10.0
+HEALTH_TIMEOUT = 2.0
+HEALTH_FAILURES = 3
+READY_TIMEOUT = 60.0
+GRACE_SECONDS = 10
+TICK_SECONDS = 0.2
+
+def backoff(failures: int) -> float:
+    """Seconds to wait before the next start after ``failures`` quick exits in a row."""
+    return 0.0 if failures <= 0 else min(BACKOFF_MAX, BACKOFF_BASE * 2 ** (failures - 1))
+
+class Service:
+    """A child process that is kept running."""
+
+    def __init__(self, name: str, argv: list, cwd: str = None, env: dict = None):
+        self.name, self.argv, self.cwd, self.env = name, list(argv), cwd, env
+        self.proc: Optional[subprocess.Popen] = None
+        self.started_at = 0.0
+        self.failures = 0
+        self.restart_at: Optional[float] = 0.0
+
+    def spawn(self) -> subprocess.Popen:
+        # A session of its own, so Ctrl+C reaches only the supervisor, which then stops children in order
+        return subprocess.Popen(self.argv, cwd=self.cwd, env=self.env, start_new_session=True)
+
+    def start(self):
+        self.proc = self.spawn()
+        self.started_at = time.monotonic()
+        self.restart_at = None
+        logger.info("%s started (pid %d)", self.name, self.proc.pid)
+
+    def running(self) -> bool:
+        return self.proc is not None and self.proc.poll() is None
+
+    def check(self, now: float):
+        """Notice an exit and schedule the restart; start the process once its backoff is over."""
+        if self.proc is not None and self.restart_at is None and self.proc.poll() is not None:
+            uptime = now - self.started_at
+            self.failures = 0 if uptime >= STABLE_SECONDS else self.failures + 1
+            delay = backoff(self.failures)
+            logger.warning("%s exited with status %s after %.1fs; restarting in %.1fs",
+                           self.name, self.proc.returncode, uptime, delay)
+            self.restart_at = now + delay
+        if self.restart_at is not None and now >= self.restart_at:
+            self.start()
+
+    def terminate(self):
+        if self.running():
+            self.proc.send_signal(signal.SIGTERM)
+
+    def wait(self, deadline: float):
+        if self.proc is None:
+            return
+        try:
+            self.proc.wait(timeout=max(0.0, deadline - time.monotonic()))
+        except subprocess.TimeoutExpired:
+            logger.warning("%s did not stop in time; killing it", self.name)
+            self.proc.kill()
+            self.proc.wait()
+
+    def stop(self, grace: float = GRACE_SECONDS + 5):
+        self.terminate()
+        self.wait(time.monotonic() + grace)
+
+class Worker(Service):
+    """An API worker serving the shared listening socket, with a private one for health checks."""
+
+    def __init__(self, name: str, app: str, listener: socket.socket, ready_path: str,
+                 factory: bool = False, access_log: bool = True):
+        super().__init__(name, [])
+        self.app, self.listener, self.ready_path = app, listener, ready_path
+        self.factory, self.access_log = factory, access_log
+        self.private: Optional[socket.socket] = None
+        self.ready = False
+        self.health_failures = 0
+        self.checked_at = 0.0
+
+    def spawn(self) -> subprocess.Popen:
+        if self.private is not None:
+            self.private.close()
+        self.private = socket.create_server(("127.0.0.1", 0))
+        self.ready = False
+        self.health_failures = 0
+        fds = (self.listener.fileno(), self.private.fileno())
+        argv = [sys.executable, "-m", "backend.supervisor", "worker", self.app,
+                *[f"--fd={fd}" for fd in fds]]
+        if self.factory:
+            argv.append("--factory")
+        if not self.access_log:
+            argv.append("--no-access-log")
+        return subprocess.Popen(argv, pass_fds=fds, start_new_session=True)
+
+    def probe(self) -> bool:
+        """GET the readiness endpoint on this worker's private socket."""
+        if not self.running():
+            return False
+        conn = http.client.HTTPConnection("127.0.0.1", self.private.getsockname()[1], timeout=HEALTH_TIMEOUT)
+        try:
+            conn.request("GET", self.ready_path)
+            return conn.getresponse().status == 200
+        except (OSError, http.client.HTTPException):
+            return False
+        finally:
+            conn.close()
+
+    def check(self, now: float):
+        super().check(now)
+        if not self.running():
+            return
+        if not self.ready:
+            if self.probe():
+                self.ready = True
+                self.checked_at = now
+                logger.info("%s ready (pid %d)", self.name, self.proc.pid)
+            elif now - self.started_at > READY_TIMEOUT:
+                logger.warning("%s not ready after %.0fs; replacing it", self.name, READY_TIMEOUT)
+                self.stop()
+        elif now - self.checked_at >= HEALTH_INTERVAL:
+            self.checked_at = now
+            if self.probe():
+                self.health_failures = 0
+            else:
+                self.health_failures += 1
+                logger.warning("%s failed health check %d/%d", self.name, self.health_failures, HEALTH_FAILURES)
+                if self.health_failures >= HEALTH_FAILURES:
+                    self.stop()
+
+    def wait_ready(self, timeout: float = READY_TIMEOUT) -> bool:
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            if not self.running():
+                return False
+            if self.probe():
+                self.ready = True
+                self.checked_at = time.monotonic()
+                return True
+            time.sleep(TICK_SECONDS)
+        return False
+
+class Supervisor:
+    def __init__(self, host: str = "0.0.0.0", port: int = 8000, workers: int = 1, app: str = "backend.main:app",
+                 factory: bool = False, ready_path: str = "/ready", access_log: bool = True):
+        self.listener = socket.create_server((host, port), backlog=2048)
+        self.listener.set_inheritable(True)
+        self.workers = [Worker(f"worker-{i + 1}", app, self.listener, ready_path, factory, access_log)
+                        for i in range(workers)]
+        self.services = []
+        self._stopping = False
+        self._reload = False
+
+    def add(self, service: Service) -> Service:
+        self.services.append(service)
+        return service
+
+    def _on_stop(self, signum, frame):
+        self._stopping = True
+
+    def _on_reload(self, signum, frame):
+        self._reload = True
+
+    def rolling_restart(self):
+        """Replace each worker once its successor is ready, then restart the other services."""
+        logger.info("Rolling restart of %d workers", len(self.workers))
+        for i, old in enumerate(self.workers):
+            new = Worker(old.name, old.app, self.listener, old.ready_path, old.factory, old.access_log)
+            new.start()
+            if not new.wait_ready():
+                logger.error("%s replacement never became ready; keeping the old worker", old.name)
+                new.stop()
+                return
+            self.workers[i] = new
+            old.stop()
+            if old.private is not None:
+                old.private.close()
+        for service in self.services:
+            service.stop()
+            service.start()
+
+    def start(self):
+        for child in self.workers + self.services:
+            child.start()
+
+    def run(self):
+        """Start every child and keep them running until SIGINT or SIGTERM."""
+        signal.signal(signal.SIGINT, self._on_stop)
+        signal.signal(signal.SIGTERM, self._on_stop)
+        signal.signal(signal.SIGHUP, self._on_reload)
+        self.start()
+        try:
+            while not self._stopping:
+                if self._reload:
+                    self._reload = False
+                    self.rolling_restart()
+                now = time.monotonic()
+                for child in self.workers + self.services:
+                    child.check(now)
+                time.sleep(TICK_SECONDS)
+        finally:
+            self.shutdown()
+
+    def shutdown(self):
+        children = self.workers + self.services
+        for child in children:
+            child.terminate()
+        deadline = time.monotonic() + GRACE_SECONDS + 5
+        for child in children:
+            child.wait(deadline)
+        self.listener.close()
+
+def serve_worker(app: str, fds, factory: bool = False, access_log: bool = True):
+    """Run one uvicorn worker on inherited listening sockets."""
+    import uvicorn
+
+    sockets = [socket.socket(fileno=fd) for fd in fds]
+    config = uvicorn.Config(app, factory=factory, access_log=access_log,
+                            timeout_graceful_shutdown=GRACE_SECONDS)
+    uvicorn.Server(config).run(sockets=sockets)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="python -m backend.supervisor")
+    sub = parser.add_subparsers(dest="command", required=True)
+    p = sub.add_parser("worker", help="Run one API worker on sockets passed by the supervisor")
+    p.add_argument("app")
+    p.add_argument("--fd", type=int, action="append", required=True)
+    p.add_argument("--factory", action="store_true")
+    p.add_argument("--no-access-log", dest="access_log", action="store_false")
+    args = parser.parse_args(argv)
+    serve_worker(args.app, args.fd, factory=args.factory, access_log=args.access_log)
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,63 @@
+import asyncio
+import io
+import json
+import os
+import shutil
+import tempfile
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy.ext.asyncio import async_sessionmaker
+from sqlalchemy.pool import NullPool
 from sqlmodel import Session, SQLModel, create_engine
-from backend.main import app
-from backend.database import get_session
-from backend.models import Log
-from datetime import datetime
+from backend.main import app, dashboard_cache
+from backend.database import get_session, get_read_session, get_async_session, get_async_read_session, make_async_engine
+from backend import archive, async_crud, crud, export, ingest, predictions, schemas
+from backend.models import Log, DailySummary
+from sqlalchemy import event, text
+from datetime import datetime, timedelta, timezone
 
-# Setup test database
-DATABASE_URL = "sqlite:///./test.db"
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+# Setup test database, in a scratch directory so the suite leaves the checkout clean
+DATABASE_DIR = tempfile.mkdtemp(prefix="babylog-tests-")
+DATABASE_PATH = os.path.join(DATABASE_DIR, "test.db")
+engine = create_engine(f"sqlite:///{DATABASE_PATH}", connect_args={"check_same_thread": False})
+
+@event.listens_for(engine, "connect")
+def attach_archive(dbapi_connection, connection_record):
+    archive.attach(dbapi_connection, archive.path_for(DATABASE_PATH))
 
 def override_get_session():
     with Session(engine) as session:
         yield session
 
+# TestClient may run each request on a fresh event loop, so async connections are not pooled
+async_engine = make_async_engine(f"sqlite+aiosqlite:///{DATABASE_PATH}", poolclass=NullPool)
+event.listen(async_engine.sync_engine, "connect", attach_archive)
+async_session = async_sessionmaker(async_engine, expire_on_commit=False)
+
+async def override_get_async_session():
+    async with async_session() as session:
+        yield session
+
 app.dependency_overrides[get_session] = override_get_session
+app.dependency_overrides[get_read_session] = override_get_session
+app.dependency_overrides[get_async_session] = override_get_async_session
+app.dependency_overrides[get_async_read_session] = override_get_async_session
+
+@pytest.fixture(scope="module", autouse=True)
+def database_directory():
+    yield
+    engine.dispose()
+    shutil.rmtree(DATABASE_DIR, ignore_errors=True)
 
 @pytest.fixture(name="session")
 def session_fixture():
     SQLModel.metadata.create_all(engine)
+    dashboard_cache.clear()
+    predictions.clear_cache()
     with Session(engine) as session:
         yield session
     SQLModel.metadata.drop_all(engine)
+    archive.metadata.drop_all(engine)
 
 def test_create_log(session):
     client = TestClient(app)
@@ -53,6 +89,21 @@ def test_ongoing_feed(session):
     data = response.json()
     assert data["details"] != "ongoing"
     assert ":" in data["details"]
+    assert data["status"] == "completed"
+    assert data["duration_seconds"] is not None
+
+def test_session_fields_follow_details(session):
+    client = TestClient(app)
+    ongoing = client.post("/logs", json={"event": "Sleep", "status": "ongoing"}).json()
+    assert ongoing["details"] == "ongoing" and ongoing["duration_seconds"] is None
+
+    feed = client.post("/logs", json={"event": "Feeding", "details": "00:15:30", "timestamp": "2025-02-01T09:00:00"}).json()
+    assert (feed["status"], feed["duration_seconds"], feed["duration_minutes"]) == ("completed", 930, 15.5)
+
+    edited = client.put(f"/logs/{feed['id']}", json={"event": "Feeding", "duration_seconds": 600}).json()
+    assert edited["details"] == "00:10:00"
+    summary = session.get(DailySummary, ("2025-02-01", "Feeding"))
+    assert (summary.done_count, summary.minutes) == (1, 10.0)
 
 def test_delete_log(session):
     client = TestClient(app)
@@ -64,3 +115,572 @@ def test_delete_log(session):
     
     get_resp = client.get("/logs")
     assert len(get_resp.json()) == 0
+
+def test_dashboard_counts(session):
+    client = TestClient(app)
+    client.post("/logs", json={"event": "Pee"})
+    client.post("/logs", json={"event": "Mixed"})
+    client.post("/logs", json={"event": "Feeding", "details": "00:15:00", "orientation": "Right"})
+
+    data = client.get("/dashboard").json()
+    assert data["diapers"]["pee"]["today_count"] == 1
+    assert data["diapers"]["total"]["today_count"] == 2
+    assert data["diapers"]["last_type"] in ("Pee", "Mixed")
+    assert data["feeding"]["today_count"] == 1
+    assert data["feeding"]["today_duration"] == 15.0
+    assert len(data["history"]["feeding"]) == 7
+    assert data["history"]["feeding"][0]["details"]["Right"] == 1
+    assert data["history"]["diaper"][0]["count"] == 2
+
+def test_daily_summary_follows_writes(session):
+    client = TestClient(app)
+    log_id = client.post("/logs", json={"event": "Pee"}).json()["id"]
+    client.post("/logs", json={"event": "Poop"})
+
+    client.put(f"/logs/{log_id}", json={"event": "Mixed"})
+    diapers = client.get("/dashboard").json()["diapers"]
+    assert diapers["pee"]["today_count"] == 0
+    assert diapers["mixed"]["today_count"] == 1
+
+    client.delete(f"/logs/{log_id}")
+    history = client.get("/dashboard?history_days=30").json()["history"]
+    assert len(history["diaper"]) == 30
+    assert history["diaper"][0]["details"] == {"Pee": 0, "Poop": 1, "Mixed": 0}
+
+    incremental = sorted((s.day, s.event, s.count) for s in session.query(DailySummary).all())
+    crud.rebuild_daily_summary(session)
+    session.commit()
+    assert sorted((s.day, s.event, s.count) for s in session.query(DailySummary).all()) == incremental
+
+def test_conditional_gets(session):
+    client = TestClient(app)
+    client.post("/logs", json={"event": "Pee"})
+
+    for path in ("/dashboard", "/logs", "/config"):
+        first = client.get(path)
+        etag = first.headers["etag"]
+        assert client.get(path, headers={"If-None-Match": etag}).status_code == 304
+
+    dash_etag = client.get("/dashboard").headers["etag"]
+    logs_etag = client.get("/logs").headers["etag"]
+    client.post("/logs", json={"event": "Poop"})
+    assert client.get("/dashboard", headers={"If-None-Match": dash_etag}).status_code == 200
+    assert client.get("/logs", headers={"If-None-Match": logs_etag}).status_code == 200
+
+def test_change_events_published_after_commit(session):
+    from backend import events
+    from backend.schemas import LogCreate
+
+    async def scenario():
+        events.broadcaster.attach(asyncio.get_running_loop())
+        queue = events.broadcaster.subscribe()
+        try:
+            log = await asyncio.to_thread(crud.log_event, session, LogCreate(event="Pee"))
+            message = await asyncio.wait_for(queue.get(), timeout=1)
+            assert message["action"] == "created"
+            assert message["id"] == log.id
+            assert message["version"] == crud.get_data_version(session)
+
+            await asyncio.to_thread(crud.delete_log, session, log.id)
+            message = await asyncio.wait_for(queue.get(), timeout=1)
+            assert message["action"] == "deleted"
+        finally:
+            events.broadcaster.unsubscribe(queue)
+            events.broadcaster.attach(None)
+
+    asyncio.run(scenario())
+
+def test_logs_cursor_pagination_and_projection(session):
+    client = TestClient(app)
+    for minute in range(5):
+        client.post("/logs", json={"event": "Pee", "timestamp": f"2025-03-01T10:0{minute}:00+00:00"})
+    client.post("/logs", json={"event": "Poop", "timestamp": "2025-03-02T10:00:00+00:00"})
+
+    # Legacy skip/limit still works
+    assert len(client.get("/logs?skip=1&limit=10").json()) == 5
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, "event": "Pee", "fields": "id,timestamp"}
+        if cursor:
+            params["cursor"] = cursor
+        resp = client.get("/logs", params=params)
+        assert resp.status_code == 200
+        page = resp.json()
+        assert all(set(item) == {"id", "timestamp"} for item in page)
+        seen += [item["id"] for item in page]
+        cursor = resp.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen)) == 5
+
+    ranged = client.get("/logs", params={"from": "2025-03-01T10:02:00+00:00", "to": "2025-03-02T00:00:00+00:00"}).json()
+    assert len(ranged) == 3
+    assert client.get("/logs?fields=bogus").status_code == 400
+    assert client.get("/logs?cursor=not-a-cursor").status_code == 400
+
+def test_logs_cursor_pages_across_a_second_boundary_tie(session):
+    client = TestClient(app)
+    for stamp in ["09:59:59.999999", "10:00:00", "10:00:00", "10:00:00", "10:00:00.500000"]:
+        client.post("/logs", json={"event": "Pee", "timestamp": f"2025-03-01T{stamp}+00:00"})
+    everything = [item["id"] for item in client.get("/logs").json()]
+
+    seen, cursor = [], None
+    while True:
+        resp = client.get("/logs", params={"limit": 2, **({"cursor": cursor} if cursor else {})})
+        seen += [item["id"] for item in resp.json()]
+        cursor = resp.headers.get("x-next-cursor")
+        if not cursor:
+            break
+    assert seen == everything
+
+    # The same instant written with another offset picks up at the same row
+    tied = crud.get_logs(session)[2]
+    utc = crud.encode_cursor(tied.timestamp, tied.id)
+    shifted = crud.encode_cursor(tied.timestamp.astimezone(timezone(timedelta(hours=1))), tied.id)
+    first = client.get("/logs", params={"limit": 10, "cursor": utc}).json()
+    assert [item["id"] for item in first] == everything[3:]
+    assert client.get("/logs", params={"limit": 10, "cursor": shifted}).json() == first
+    naive = crud.encode_cursor(tied.timestamp.replace(tzinfo=None), tied.id)
+    assert client.get("/logs", params={"cursor": naive}).status_code == 400
+
+def test_bulk_ingest_json_and_ndjson(session):
+    client = TestClient(app)
+    rows = [{"event": "Pee", "timestamp": "2025-02-01T08:00:00"}, {"event": "Poop"}, {"details": "missing event"}]
+    report = client.post("/logs/bulk", json=rows).json()
+    assert report["accepted"] == 2
+    assert report["rejected"] == 1
+    assert report["errors"][0]["row"] == 3
+
+    ndjson = '{"event": "Feeding", "details": "00:10:00", "timestamp": "2025-02-01T09:00:00"}\n{not json}\n{"event": "Pee", "timestamp": "2025-02-01T10:00:00"}\n'
+    report = client.post("/logs/bulk", content=ndjson, headers={"Content-Type": "application/x-ndjson"}).json()
+    assert (report["accepted"], report["rejected"]) == (2, 1)
+    assert report["errors"][0]["row"] == 2
+
+    assert len(client.get("/logs").json()) == 4
+    summary = session.get(DailySummary, ("2025-02-01", "Pee"))
+    assert summary is not None and summary.count == 2
+
+def test_bulk_ingest_validates_off_the_event_loop(session, monkeypatch):
+    monkeypatch.setattr(ingest, "HANDOFF_SIZE", 2)
+    on_loop = []
+    add = ingest.Ingestor.add
+
+    def recording(self, record):
+        try:
+            asyncio.get_running_loop()
+            on_loop.append(record)
+        except RuntimeError:
+            pass
+        return add(self, record)
+    monkeypatch.setattr(ingest.Ingestor, "add", recording)
+
+    rows = [{"event": "Pee"}, {"event": "Poop"}, {"details": "missing event"}, {"event": "Pee"}, {"event": "Poop"}]
+    report = TestClient(app).post("/logs/bulk", json=rows).json()
+    assert (report["accepted"], report["rejected"], report["errors"][0]["row"]) == (4, 1, 3)
+    assert on_loop == []
+
+def test_bulk_ingest_rejects_malformed_bodies(session, monkeypatch):
+    monkeypatch.setattr(ingest, "MAX_RECORD_CHARS", 100)
+    client = TestClient(app)
+    pee = '{"event": "Pee"}'
+    for body in [f"[{pee},,{pee}]", f"[{pee},]", f"[{pee} {pee}]", f"[{pee}] {pee}", f"[{pee}",
+                 f"[{pee}, " + "x" * 200, f"{pee}\n" + "x" * 200]:
+        response = client.post("/logs/bulk", content=body)
+        assert response.status_code == 400, body
+    assert client.post("/logs/bulk", content=f" [ {pee} , {pee} ] ").json()["accepted"] == 2
+    assert client.post("/logs/bulk", content="[]").json()["accepted"] == 0
+
+def test_export_round_trips_through_bulk_import(session):
+    client = TestClient(app)
+    client.post("/logs", json={"event": "Pee", "orientation": "Mum", "timestamp": "2025-02-01T08:00:00"})
+    client.post("/logs", json={"event": "Feeding", "details": "00:10:00", "timestamp": "2025-02-01T09:00:00"})
+
+    csv_resp = client.get("/logs/export?format=csv")
+    assert csv_resp.status_code == 200
+    lines = csv_resp.text.strip().splitlines()
+    assert lines[0].startswith("id,event,details,status,duration_seconds,timestamp")
+    assert len(lines) == 3
+
+    ndjson = client.get("/logs/export?format=ndjson&event=Feeding").text
+    assert [json.loads(line)["event"] for line in ndjson.strip().splitlines()] == ["Feeding"]
+
+    report = client.post("/logs/bulk", content=client.get("/logs/export?format=ndjson").content).json()
+    assert report["accepted"] == 2
+    assert client.get("/logs/export?format=xml").status_code == 400
+
+def test_parquet_export_uses_utc_instants():
+    pq = pytest.importorskip("pyarrow.parquet")
+    at = datetime(2025, 7, 1, 8, 30, tzinfo=timezone.utc)
+    row = (1, "Feeding", "00:10:00", "completed", 600, at, None, at + timedelta(minutes=10), "Left", 1, None, None)
+    ndjson = json.loads(b"".join(export.encode_ndjson(iter([[row]]))))
+    table = pq.read_table(io.BytesIO(b"".join(export.encode_parquet(iter([[row]])))))
+    assert str(table.schema.field("timestamp").type) == "timestamp[us, tz=UTC]"
+    assert table.column("timestamp")[0].as_py() == datetime.fromisoformat(ndjson["timestamp"]) == at
+
+def test_async_crud_runs_sync_logic(session):
+    async def scenario():
+        async with async_session() as db:
+            await async_crud.log_event(db, schemas.LogCreate(event="Feeding", details="ongoing", feed_id=1))
+            stopped = await async_crud.stop_ongoing_session(db, "Feeding")
+            return stopped, await async_crud.get_stats(db)
+
+    stopped, stats = asyncio.run(scenario())
+    assert stopped.status == "completed" and stopped.feed_id == 1
+    assert stats["ongoing_feed"] is None
+    assert stats["feeding"] == crud.get_stats(session)["feeding"]
+
+def test_session_transitions(session):
+    client = TestClient(app)
+    # A feed logged by hand moves the sequence past its id
+    client.post("/logs", json={"event": "Feeding", "details": "00:10:00", "feed_id": 4})
+
+    first = client.post("/sessions/Feeding/start", json={"orientation": "Left"}).json()
+    assert first["stopped"] == [] and first["started"]["feed_id"] == 5
+    second = client.post("/sessions/Feeding/start", json={"orientation": "Right"}).json()
+    assert [l["id"] for l in second["stopped"]] == [first["started"]["id"]]
+    assert second["stopped"][0]["status"] == "completed" and second["started"]["feed_id"] == 6
+
+    switched = client.post("/sessions/Feeding/switch").json()
+    assert switched["started"]["orientation"] == "Left" and switched["started"]["feed_id"] == 6
+    client.post("/sessions/Sleep/start")
+    sessions = client.get("/sessions").json()
+    assert sessions["Feeding"]["id"] == switched["started"]["id"] and sessions["Sleep"]["status"] == "ongoing"
+    assert client.get("/latest-feed-id").json() == {"feed_id": 6}
+
+    stopped = client.post("/sessions/Feeding/stop").json()
+    assert stopped["started"] is None and stopped["stopped"][0]["details"] != "ongoing"
+    assert client.post("/sessions/Feeding/stop").json()["stopped"] == []
+    assert client.post("/sessions/Sleep/switch").status_code == 400
+    assert client.post("/sessions/Pee/start").status_code == 404
+
+    # Concurrent starts queue on the write lock: one ongoing feed, no repeated feed_id
+    async def tap(orientation):
+        async with async_session() as db:
+            return await async_crud.start_session(db, "Feeding", orientation=orientation)
+
+    async def burst():
+        return await asyncio.gather(*(tap(o) for o in ["Left", "Right"] * 4))
+
+    started = [t["started"].feed_id for t in asyncio.run(burst())]
+    assert sorted(started) == list(range(7, 15))
+    assert len(client.get("/logs/ongoing").json()) == 2
+
+def test_point_lookups(session):
+    client = TestClient(app)
+    assert client.get("/logs/latest?event=Feeding").status_code == 404
+    assert client.get("/logs/since?event=Pee").json()["text"] == "Never"
+
+    client.post("/logs", json={"event": "Pee", "timestamp": "2025-02-01T08:00:00"})
+    client.post("/logs", json={"event": "Poop", "timestamp": "2025-02-01T09:00:00"})
+    client.post("/logs", json={"event": "Feeding", "details": "00:10:00", "feed_id": 1})
+    client.post("/logs", json={"event": "Feeding", "details": "ongoing", "feed_id": 2})
+
+    assert client.get("/logs/latest?event=Feeding").json()["feed_id"] == 2
+    assert client.get("/logs/latest?event=Feeding&status=completed").json()["feed_id"] == 1
+    assert client.get("/logs/latest?event=Pee&event=Mixed").json()["event"] == "Pee"
+    assert [l["feed_id"] for l in client.get("/logs/ongoing").json()] == [2]
+
+    since = client.get("/logs/since?event=Pee&event=Poop&event=Mixed").json()
+    assert since["event"] == "Poop" and since["seconds"] > 0
+
+def test_sleep_predictions_cached_until_sleep_changes(session):
+    client = TestClient(app)
+    first = predictions.get_sleep_predictions(session)
+    assert first["summary"]["details"]
+
+    client.post("/logs", json={"event": "Pee"})
+    assert predictions.get_sleep_predictions(session) is first
+
+    client.post("/logs", json={"event": "Sleep", "details": "ongoing"})
+    client.post("/logs/Sleep/stop")
+    second = predictions.get_sleep_predictions(session)
+    assert second is not first
+    assert len(second["past"]) == 1
+
+def test_metrics_count_requests_statements_and_crud_calls(session):
+    from backend import metrics
+    client = TestClient(app)
+    before = metrics.REQUEST_SECONDS.count(method="POST", route="/logs", status=200)
+    crud_before = metrics.CRUD_SECONDS.count(function="log_event")
+    client.post("/logs", json={"event": "Pee", "orientation": "Dad"})
+    client.get("/dashboard")
+
+    assert metrics.REQUEST_SECONDS.count(method="POST", route="/logs", status=200) == before + 1
+    assert metrics.CRUD_SECONDS.count(function="log_event") == crud_before + 1
+    series = metrics.REQUEST_STATEMENTS._series[("GET", "/dashboard")]
+    assert series[1] > 0  # statement count summed over requests
+
+    body = client.get("/metrics").text
+    assert 'babylog_http_request_duration_seconds_count{method="POST",route="/logs",status="200"}' in body
+    assert 'babylog_crud_call_db_statements_bucket{function="get_stats",le="+Inf"}' in body
+    assert "# TYPE babylog_db_statements counter" in body
+
+def test_slow_requests_are_logged_with_statements(session, caplog, monkeypatch):
+    from backend import metrics
+    monkeypatch.setattr(metrics, "slow_threshold", lambda: 0.0)
+    with caplog.at_level("WARNING", logger="backend.metrics"):
+        TestClient(app).get("/logs/ongoing")
+    slow = [r.getMessage() for r in caplog.records if r.getMessage().startswith("Slow GET /logs/ongoing")]
+    assert slow and "SELECT" in slow[0]
+
+def test_analytics_buckets_and_downsampling(session):
+    client = TestClient(app)
+    for ts, side in (("2024-03-04T09:00:00", "Left"), ("2024-03-04T13:00:00", "Right"),
+                     ("2024-03-06T09:30:00", "Left"), ("2024-04-02T08:00:00", "Expressed")):
+        end = ts[:11] + str(int(ts[11:13]) + 1).zfill(2) + ts[13:]
+        client.post("/logs", json={"event": "Feeding", "timestamp": ts, "end_timestamp": end,
+                                   "details": "00:20:00", "orientation": side})
+    client.post("/logs", json={"event": "Growth", "timestamp": "2024-03-05T10:00:00", "weight": 5.1})
+    client.post("/logs", json={"event": "Growth", "timestamp": "2024-03-07T10:00:00", "weight": 5.3})
+
+    days = client.get("/analytics", params={"event": "Feeding", "from": "2024-03-04", "to": "2024-03-08"}).json()
+    assert days["bucket"] == "day"
+    assert [p["start"] for p in days["points"]] == ["2024-03-04", "2024-03-05", "2024-03-06", "2024-03-07"]
+    monday = days["points"][0]
+    assert (monday["count"], monday["minutes"], monday["avg_minutes"]) == (2, 40.0, 20.0)
+    assert (monday["left_count"], monday["right_count"]) == (1, 1)
+    assert days["points"][1]["count"] == 0
+
+    weeks = client.get("/analytics", params={"event": "Feeding", "bucket": "week",
+                                             "from": "2024-03-01", "to": "2024-04-08"}).json()
+    assert weeks["points"][0]["start"] == "2024-02-26"
+    assert {p["start"]: p["count"] for p in weeks["points"]}["2024-03-04"] == 3
+
+    hours = client.get("/analytics", params={"event": "Feeding", "bucket": "hour",
+                                             "from": "2024-03-04T08:00", "to": "2024-03-04T14:00"}).json()
+    assert [(p["start"][11:], p["count"]) for p in hours["points"] if p["count"]] == [("09:00", 1), ("13:00", 1)]
+    assert len(hours["points"]) == 6
+
+    growth = client.get("/analytics", params={"event": "Growth", "bucket": "week",
+                                              "from": "2024-03-04", "to": "2024-03-11"}).json()
+    assert growth["points"][0]["weight"] == 5.3
+
+    # A year of days is more than max_points, so it comes back as weeks
+    year = client.get("/analytics", params={"event": "Feeding", "bucket": "day", "max_points": 100,
+                                            "from": "2023-06-01", "to": "2024-06-01"}).json()
+    assert year["bucket"] == "week" and len(year["points"]) <= 54
+    assert sum(p["count"] for p in year["points"]) == 4
+
+    assert client.get("/analytics", params={"event": "Feeding", "bucket": "fortnight"}).status_code == 400
+
+def test_local_day_keys_follow_dst(session):
+    client = TestClient(app)
+    # 00:30 BST on the day the clocks go back is still the previous day in UTC
+    for ts in ("2024-10-27T00:30:00", "2024-10-27T23:30:00", "2024-03-31T00:30:00", "2024-03-31T23:30:00"):
+        client.post("/logs", json={"event": "Pee", "timestamp": ts})
+
+    rows = session.execute(text("SELECT timestamp, local_date, local_minute FROM logs ORDER BY id")).all()
+    assert [tuple(r) for r in rows] == [
+        ("2024-10-26 23:30:00.000000", "2024-10-27", 30),
+        ("2024-10-27 23:30:00.000000", "2024-10-27", 1410),
+        ("2024-03-31 00:30:00.000000", "2024-03-31", 30),
+        ("2024-03-31 22:30:00.000000", "2024-03-31", 1410),
+    ]
+    assert sorted((s.day, s.count) for s in session.query(DailySummary).all()) == [
+        ("2024-03-31", 2), ("2024-10-27", 2)]
+
+    # The 25-hour day has 24 local hour labels: both 01:00 hours share one
+    hours = client.get("/analytics", params={"event": "Pee", "bucket": "hour",
+                                             "from": "2024-10-27", "to": "2024-10-28"}).json()["points"]
+    assert len(hours) == 24
+    assert {p["start"][11:16]: p["count"] for p in hours if p["count"]} == {"00:00": 1, "23:00": 1}
+
+def test_timezone_reload_rebuckets_logs(session, tmp_path, monkeypatch):
+    from backend import config
+    path = tmp_path / "config.yaml"
+    path.write_text("user:\n  date_of_birth: 2025-01-01\ntimezone: Europe/London\n")
+    monkeypatch.setattr(config, "service", config.ConfigService(str(path), check_interval=0))
+    crud.rebuild_on_timezone_change(engine)
+
+    TestClient(app).post("/logs", json={"event": "Pee", "timestamp": "2025-07-01T23:30:00+00:00"})
+    assert session.query(DailySummary.day).scalar() == "2025-07-02"
+
+    path.write_text("user:\n  date_of_birth: 2025-01-01\ntimezone: America/New_York\n")
+    os.utime(path, (2_000_000_000, 2_000_000_000))
+    assert config.get_config().timezone_name == "America/New_York"
+    session.expire_all()
+    assert session.query(Log.local_date, Log.local_minute).one() == ("2025-07-01", 19 * 60 + 30)
+    assert session.query(DailySummary.day).scalar() == "2025-07-01"
+
+def test_write_queue_commits_a_burst_in_order(session, monkeypatch):
+    from backend import metrics, write_queue
+    queue = write_queue.WriteQueue(async_session, window=0.05)
+    batches = metrics.CRUD_SECONDS.count(function="log_events")
+
+    async def burst():
+        return await asyncio.gather(*[
+            queue.submit(schemas.LogCreate(event="Pee", comments=str(i))) for i in range(10)])
+    logs = asyncio.run(burst())
+
+    assert [l.comments for l in logs] == [str(i) for i in range(10)]
+    assert [l.id for l in logs] == sorted(l.id for l in logs)
+    assert metrics.CRUD_SECONDS.count(function="log_events") == batches + 1
+    assert session.query(DailySummary).one().count == 10
+
+    # A failed batch is retried one write at a time
+    async def failing(db, logs):
+        raise RuntimeError("disk full")
+    monkeypatch.setattr(write_queue.async_crud, "log_events", failing)
+    logs = asyncio.run(burst())
+    assert len({l.id for l in logs}) == 10
+
+    # The API goes through the queue when one is configured
+    monkeypatch.setattr(write_queue, "queue", queue)
+    response = TestClient(app).post("/logs", json={"event": "Poop"})
+    assert response.status_code == 200 and response.json()["id"] > logs[-1].id
+
+def test_write_queue_never_exceeds_max_batch(session, monkeypatch):
+    from backend import write_queue
+    queue = write_queue.WriteQueue(async_session, window=0.05, max_batch=4)
+    sizes = []
+    log_events = write_queue.async_crud.log_events
+
+    async def recording(db, logs):
+        sizes.append(len(logs))
+        return await log_events(db, logs)
+    monkeypatch.setattr(write_queue.async_crud, "log_events", recording)
+
+    async def burst():
+        return await asyncio.gather(*[
+            queue.submit(schemas.LogCreate(event="Pee", comments=str(i))) for i in range(10)])
+    logs = asyncio.run(burst())
+
+    assert sizes == [4, 4, 2]
+    assert [l.comments for l in logs] == [str(i) for i in range(10)]
+    assert [l.id for l in logs] == sorted(l.id for l in logs)
+
+def test_logs_fast_path_matches_schema_and_compresses(session):
+    client = TestClient(app)
+    client.post("/logs", json={"event": "Feeding", "timestamp": "2024-03-04T09:00:00", "details": "00:20:00",
+                               "end_timestamp": "2024-03-04T09:20:00", "orientation": "Left", "feed_id": 1})
+    for i in range(30):
+        client.post("/logs", json={"event": "Growth", "weight": 5.1 + i / 10, "comments": "x" * 40})
+
+    response = client.get("/logs", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in response.headers
+    expected = [schemas.LogRead.model_validate(l).model_dump(mode="json")
+                for l in crud.get_logs(session, limit=100)]
+    assert response.json() == expected
+
+    # httpx decodes the body; the raw size shows it was compressed
+    compressed = client.get("/logs", headers={"Accept-Encoding": "gzip"})
+    assert compressed.headers["content-encoding"] == "gzip"
+    assert "Accept-Encoding" in compressed.headers["vary"]
+    assert int(compressed.headers["content-length"]) < len(response.content)
+    assert compressed.json() == expected
+    assert compressed.headers["etag"] != response.headers["etag"]
+    revalidated = client.get("/logs", headers={"Accept-Encoding": "gzip", "If-None-Match": compressed.headers["etag"]})
+    assert revalidated.status_code == 304
+
+    dashboard = client.get("/dashboard", headers={"Accept-Encoding": "gzip"})
+    assert dashboard.headers["content-encoding"] == "gzip"
+    assert schemas.DashboardData.model_validate(dashboard.json())
+
+def test_log_changes_delta_sync(session):
+    client = TestClient(app)
+    first = client.post("/logs", json={"event": "Pee"}).json()
+    listing = client.get("/logs")
+    since = int(listing.headers["x-log-revision"])
+    assert since == first["rev"]
+
+    second = client.post("/logs", json={"event": "Poop"}).json()
+    client.put(f"/logs/{first['id']}", json={"event": "Mixed"})
+    client.delete(f"/logs/{second['id']}")
+
+    changes = client.get("/logs/changes", params={"since": since}).json()
+    assert [(l["id"], l["event"]) for l in changes["logs"]] == [(first["id"], "Mixed")]
+    assert changes["deleted"] == [second["id"]]
+    assert not changes["has_more"] and changes["rev"] > since
+    assert client.get("/logs/changes", params={"since": changes["rev"]}).json()["logs"] == []
+
+    # Paging: a limit below the number of changes hands back a rev to resume from
+    page = client.get("/logs/changes", params={"since": 0, "limit": 1}).json()
+    assert page["has_more"] and len(page["logs"]) + len(page["deleted"]) == 1
+    rest = client.get("/logs/changes", params={"since": page["rev"]}).json()
+    assert not rest["has_more"] and rest["rev"] == changes["rev"]
+
+    # The deleted highest id is not handed out again, so it stays deleted
+    fresh = client.post("/logs", json={"event": "Pee"}).json()
+    assert fresh["id"] > second["id"]
+    resync = client.get("/logs/changes", params={"since": 0}).json()
+    assert fresh["id"] in [l["id"] for l in resync["logs"]] and resync["deleted"] == [second["id"]]
+
+def test_archived_logs_read_transparently(session):
+    client = TestClient(app)
+    now = datetime.now().replace(microsecond=0)
+    def at(days):
+        return (now - timedelta(days=days)).isoformat()
+    old_pee = client.post("/logs", json={"event": "Pee", "timestamp": at(400)}).json()
+    old_feed = client.post("/logs", json={"event": "Feeding", "timestamp": at(300), "details": "00:15:00",
+                                          "feed_id": 7}).json()
+    client.post("/logs", json={"event": "Sleep", "timestamp": at(250), "status": "ongoing"})
+    client.post("/logs", json={"event": "Poop", "timestamp": at(1)})
+    before = client.get("/logs").json()
+    hours = {"event": "Feeding", "bucket": "hour", "from": at(301), "to": at(299)}
+    series = client.get("/analytics", params=hours).json()
+    assert sum(p["count"] for p in series["points"]) == 1
+    export = client.get("/logs/export?format=ndjson").text
+
+    assert archive.archive_logs(session, crud.get_current_time() - timedelta(days=200)) == 2
+    # The ongoing session and recent rows stay hot
+    assert session.query(Log).count() == 2
+    assert client.get("/logs").json() == before
+    page = client.get("/logs", params={"limit": 3})
+    rest = client.get("/logs", params={"limit": 3, "cursor": page.headers["X-Next-Cursor"]}).json()
+    assert [l["id"] for l in page.json() + rest] == [l["id"] for l in before]
+    assert client.get("/analytics", params=hours).json() == series
+    assert client.get("/logs/export?format=ndjson").text == export
+    assert client.get("/latest-feed-id").json() == {"feed_id": 7}
+    assert crud.get_time_since(session, ["Pee"])["timestamp"] == crud._as_aware(datetime.fromisoformat(old_pee["timestamp"]))
+
+    # Changing an archived row moves it back; the rollup still counts the whole day
+    updated = client.put(f"/logs/{old_feed['id']}", json={"event": "Feeding", "comments": "first feed"}).json()
+    assert updated["comments"] == "first feed"
+    assert session.query(Log).count() == 3
+    assert session.query(DailySummary.count).filter(DailySummary.event == "Feeding").scalar() == 1
+    assert client.delete(f"/logs/{old_pee['id']}").status_code == 200
+    assert old_pee["id"] not in [l["id"] for l in client.get("/logs").json()]
+    assert session.query(archive.logs).count() == 0
+
+def test_archived_ids_are_not_reissued(session):
+    client = TestClient(app)
+    now = datetime.now().replace(microsecond=0)
+    client.post("/logs", json={"event": "Pee", "timestamp": now.isoformat()})
+    # Imported history: the highest id is also the oldest row
+    old = client.post("/logs", json={"event": "Poop", "timestamp": (now - timedelta(days=400)).isoformat()}).json()
+    assert archive.archive_logs(session, crud.get_current_time() - timedelta(days=200)) == 1
+
+    new = client.post("/logs", json={"event": "Mixed"}).json()
+    assert new["id"] > old["id"]
+    restored = client.put(f"/logs/{old['id']}", json={"event": "Poop", "comments": "restored"}).json()
+    assert restored["id"] == old["id"] and restored["comments"] == "restored"
+
+def test_site_serves_precompressed_frontend_and_api(session, tmp_path):
+    from backend import static
+    from backend.main import create_site
+    (tmp_path / "assets").mkdir()
+    (tmp_path / "index.html").write_text('<!doctype html><script src="/assets/app-1a2b3c.js"></script>')
+    script = "console.log('baby tracker');\n" * 200
+    (tmp_path / "assets" / "app-1a2b3c.js").write_text(script)
+    assert static.precompress(str(tmp_path)) >= 1
+    assert (tmp_path / "assets" / "app-1a2b3c.js.gz").exists()
+    assert static.precompress(str(tmp_path)) == 0
+    client = TestClient(create_site(str(tmp_path)))
+
+    asset = client.get("/assets/app-1a2b3c.js", headers={"Accept-Encoding": "gzip"})
+    assert asset.status_code == 200 and asset.text == script
+    assert asset.headers["Content-Encoding"] == "gzip"
+    assert asset.headers["Cache-Control"] == static.IMMUTABLE
+    again = client.get("/assets/app-1a2b3c.js", headers={"Accept-Encoding": "gzip", "If-None-Match": asset.headers["ETag"]})
+    assert again.status_code == 304 and again.headers["Cache-Control"] == static.IMMUTABLE
+
+    index = client.get("/")
+    assert index.headers["Cache-Control"] == "no-cache" and "app-1a2b3c.js" in index.text
+    assert client.get("/history/week").text == index.text
+    assert client.get("/assets/missing.js").status_code == 404
+    assert client.post("/").status_code == 405
+
+    assert client.get("/api/ready").json()["status"] == "ready"
+    assert client.post("/api/logs", json={"event": "Pee"}).status_code == 200
+    assert [l["event"] for l in client.get("/api/logs").json()] == ["Pee"]
@@ -0,0 +1,28 @@
+from datetime import datetime
+
+from backend.benchmarks import suite
+from backend.benchmarks.synthetic import generate
+
+END = datetime(2024, 6, 1)
+
+def test_generate_is_deterministic_and_exact():
+    rows = list(generate(rows=500, seed=3, end=END))
+    assert len(rows) == 500
+    assert rows == list(generate(rows=500, seed=3, end=END))
+    assert rows != list(generate(rows=500, seed=4, end=END))
+    assert rows[-1]["timestamp"].startswith("2024-06-01")
+    assert [r["timestamp"] for r in rows] == sorted(r["timestamp"] for r in rows)
+    feed_ids = [r["feed_id"] for r in rows if r["event"] == "Feeding"]
+    assert feed_ids == sorted(set(feed_ids))
+
+def test_compare_flags_p95_regressions_only():
+    baseline = {"1000": {"get_stats": {"p95": 10.0}, "log_event": {"p95": 2.0}}}
+    results = {"1000": {"get_stats": {"p95": 12.0}, "log_event": {"p95": 3.0}, "new case": {"p95": 50.0}}}
+    assert suite.compare(results, baseline, threshold=0.25) == [("1000", "log_event", 2.0, 3.0)]
+
+def test_suite_runs_every_case(tmp_path):
+    results = suite.run([300], iterations=2, data_dir=str(tmp_path))
+    cases = results["300"]
+    assert {"get_stats", "log_event", "stop_ongoing_session", "GET /dashboard", "get_logs offset=0"} <= set(cases)
+    assert all(s["n"] == 2 and s["p50"] <= s["max"] for s in cases.values())
+    assert (tmp_path / "synthetic-300-0.db").exists()
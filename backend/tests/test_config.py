@@ -0,0 +1,48 @@
+import os
+from datetime import date
+
+from backend.config import ConfigService
+
+def write(path, body, mtime):
+    path.write_text(body)
+    os.utime(path, (mtime, mtime))
+
+def test_reloads_when_the_file_changes(tmp_path):
+    path = tmp_path / "config.yaml"
+    write(path, "user:\n  name: A\n  date_of_birth: 2025-01-01\ntimezone: Europe/London\n", 1_000_000)
+    service = ConfigService(str(path), check_interval=0)
+
+    first = service.get()
+    assert service.get() is first
+    assert first.tz.zone == "Europe/London"
+    assert first.age_months(date(2025, 4, 15)) == 3
+    assert first.stage(date(2025, 2, 1))["stage"] == "Newborn"
+
+    write(path, "user:\n  name: B\n  date_of_birth: 2024-01-01\ntimezone: America/New_York\n", 1_000_100)
+    second = service.get()
+    assert second.version != first.version
+    assert (second.user["name"], second.tz.zone) == ("B", "America/New_York")
+    assert second.stage(date(2025, 2, 1))["stage"] == "6-12 Months"
+
+    # A half-written file is ignored until it parses again
+    write(path, "user: [unclosed\n", 1_000_200)
+    assert service.get() is second
+
+def test_timezone_change_runs_the_callbacks(tmp_path):
+    path = tmp_path / "config.yaml"
+    write(path, "timezone: Europe/London\n", 1_000_000)
+    service = ConfigService(str(path), check_interval=0)
+    calls = []
+    service.on_timezone_change(lambda previous, config: calls.append((previous.tz.zone, config.tz.zone)))
+    service.on_timezone_change(lambda previous, config: 1 / 0)
+
+    service.get()
+    write(path, "timezone: Europe/London\nuser: {name: A}\n", 1_000_100)
+    service.get()
+    assert calls == []
+
+    # A failing callback is logged and does not stop the reload
+    write(path, "timezone: Asia/Tokyo\n", 1_000_200)
+    assert service.get().tz.zone == "Asia/Tokyo"
+    service.get()
+    assert calls == [("Europe/London", "Asia/Tokyo")]
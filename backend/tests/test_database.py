@@ -0,0 +1,49 @@
+import threading
+
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+import pytest
+
+from backend import database
+
+def make_engines(tmp_path, **overrides):
+    settings = {**database.load_settings(), **overrides}
+    url = f"sqlite:///{tmp_path / 'pragmas.db'}"
+    writer = database.make_engine(url, "write", settings)
+    reader = database.make_engine(url, "read", settings)
+    with writer.begin() as conn:
+        conn.execute(text("CREATE TABLE t (x INTEGER)"))
+    return writer, reader
+
+def test_connections_get_configured_pragmas(tmp_path):
+    writer, reader = make_engines(tmp_path, pragmas={**database.DEFAULT_PRAGMAS, "busy_timeout": 1234})
+    with reader.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA journal_mode").scalar() == "wal"
+        assert conn.exec_driver_sql("PRAGMA busy_timeout").scalar() == 1234
+        assert conn.exec_driver_sql("PRAGMA temp_store").scalar() == 2
+        assert conn.exec_driver_sql("PRAGMA query_only").scalar() == 1
+        with pytest.raises(OperationalError):
+            conn.execute(text("INSERT INTO t VALUES (1)"))
+    with writer.connect() as conn:
+        assert conn.exec_driver_sql("PRAGMA query_only").scalar() == 0
+
+def test_open_read_transaction_does_not_block_writes(tmp_path):
+    writer, reader = make_engines(tmp_path)
+    with reader.connect() as read_conn:
+        read_conn.begin()
+        assert read_conn.execute(text("SELECT COUNT(*) FROM t")).scalar() == 0
+
+        done = threading.Event()
+        def write():
+            with writer.begin() as conn:
+                conn.execute(text("INSERT INTO t VALUES (1)"))
+            done.set()
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join(timeout=5)
+        assert done.is_set()
+
+        # The reader keeps its snapshot until its transaction ends
+        assert read_conn.execute(text("SELECT COUNT(*) FROM t")).scalar() == 0
+    with reader.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM t")).scalar() == 1
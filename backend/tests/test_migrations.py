@@ -0,0 +1,146 @@
+import threading
+
+from sqlalchemy import inspect, text
+from sqlmodel import Session, create_engine
+from backend import migrations
+
+LEGACY_SCHEMA = (
+    'CREATE TABLE "logs"(`id` INTEGER PRIMARY KEY AUTOINCREMENT, `event` TEXT, `details` TEXT, '
+    '`timestamp` TEXT, `Comments` TEXT, `End_timestamp` TEXT, `orientation` TEXT, '
+    'feed_id INTEGER, weight REAL, height REAL)'
+)
+
+def make_legacy_engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'legacy.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(LEGACY_SCHEMA))
+        conn.execute(text("INSERT INTO logs (event, timestamp) VALUES ('Pee', '2025-01-02 03:04:05.000000')"))
+        conn.execute(text(
+            "INSERT INTO logs (event, details, timestamp, End_timestamp) VALUES "
+            "('Feeding', '00:15:30', '2025-01-02 04:00:00.000000', NULL), "
+            "('Feeding', 'ongoing', '2025-01-02 06:00:00.000000', NULL), "
+            "('Sleep', NULL, '2025-01-02 05:00:00.000000', '2025-01-02 06:30:00.000000')"
+        ))
+    return engine
+
+def test_upgrade_legacy_database_in_place(tmp_path):
+    engine = make_legacy_engine(tmp_path)
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE logs SET feed_id = 3 WHERE details = '00:15:30'"))
+
+    version = migrations.upgrade(engine)
+    assert version == migrations.MIGRATIONS[-1][0]
+    # Re-running is a no-op
+    assert migrations.upgrade(engine) == version
+
+    index_names = {ix["name"] for ix in inspect(engine).get_indexes("logs")}
+    assert {"ix_logs_event_timestamp", "ix_logs_event_status_timestamp", "ix_logs_event_feed_id"} <= index_names
+    with engine.connect() as conn:
+        assert conn.execute(text("SELECT COUNT(*) FROM logs")).scalar() == 4
+        assert conn.execute(text("SELECT COUNT(*) FROM logs WHERE rev IS NULL")).scalar() == 0
+        assert conn.execute(text("SELECT value FROM app_state WHERE key = 'log_revision'")).scalar() == 4
+        assert conn.execute(text("SELECT value FROM app_state WHERE key = 'feed_id'")).scalar() == 3
+        sessions = conn.execute(text(
+            "SELECT event, details, status, duration_seconds FROM logs WHERE event != 'Pee' ORDER BY id"
+        )).all()
+    assert [tuple(row) for row in sessions] == [
+        ("Feeding", "00:15:30", "completed", 930),
+        ("Feeding", "ongoing", "ongoing", None),
+        ("Sleep", "01:30:00", "completed", 5400),
+    ]
+
+def test_logs_rebuilt_with_autoincrement(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'rowid.db'}")
+    with engine.begin() as conn:
+        conn.execute(text(LEGACY_SCHEMA.replace(" AUTOINCREMENT", "")))
+        conn.execute(text("INSERT INTO logs (event, timestamp) VALUES ('Pee', '2025-01-02 03:04:05.000000'), "
+                          "('Poop', '2025-01-02 04:04:05.000000')"))
+    migrations.upgrade(engine)
+
+    with engine.begin() as conn:
+        assert "AUTOINCREMENT" in conn.execute(text("SELECT sql FROM sqlite_master WHERE name = 'logs'")).scalar()
+        assert conn.execute(text("SELECT event FROM logs ORDER BY id")).scalars().all() == ["Pee", "Poop"]
+        conn.execute(text("DELETE FROM logs WHERE id = 2"))
+        conn.execute(text("INSERT INTO logs (event, timestamp) VALUES ('Mixed', '2025-01-02 05:04:05.000000')"))
+        assert conn.execute(text("SELECT id FROM logs WHERE event = 'Mixed'")).scalar() == 3
+    index_names = {ix["name"] for ix in inspect(engine).get_indexes("logs")}
+    assert {"ix_logs_event_timestamp", "ix_logs_event_local_date", "ix_logs_rev"} <= index_names
+
+def test_explain_queries_use_indexes(tmp_path):
+    engine = make_legacy_engine(tmp_path)
+    migrations.upgrade(engine)
+
+    with Session(engine) as db:
+        plans = migrations.explain_queries(db)
+    assert plans
+    for statement, plan in plans:
+        if "WHERE" in statement:
+            assert any("INDEX" in line for line in plan), (statement, plan)
+
+def test_local_keys_are_backfilled_in_utc(tmp_path):
+    engine = make_legacy_engine(tmp_path)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO logs (event, timestamp) VALUES ('Poop', '2025-07-01 00:30:00.000000')"))
+    migrations.upgrade(engine)
+
+    index_names = {ix["name"] for ix in inspect(engine).get_indexes("logs")}
+    assert "ix_logs_event_local_date" in index_names
+    with engine.connect() as conn:
+        winter = conn.execute(text("SELECT timestamp, local_date, local_minute FROM logs WHERE event = 'Pee'")).one()
+        summer = conn.execute(text("SELECT timestamp, local_date, local_minute FROM logs WHERE event = 'Poop'")).one()
+        days = conn.execute(text("SELECT day FROM daily_summary WHERE event = 'Poop'")).scalars().all()
+    # GMT: UTC and local time agree
+    assert tuple(winter) == ("2025-01-02 03:04:05.000000", "2025-01-02", 184)
+    # Written as local BST wall-clock time, converted to UTC
+    assert tuple(summer) == ("2025-06-30 23:30:00.000000", "2025-07-01", 30)
+    assert days == ["2025-07-01"]
+
+def test_legacy_utc_timestamps_are_kept(tmp_path, monkeypatch):
+    monkeypatch.setattr(migrations, "_legacy_timestamps", lambda: "utc")
+    engine = make_legacy_engine(tmp_path)
+    with engine.begin() as conn:
+        conn.execute(text("INSERT INTO logs (event, timestamp) VALUES ('Poop', '2025-07-01 00:30:00.000000')"))
+    migrations.upgrade(engine)
+
+    with engine.connect() as conn:
+        summer = conn.execute(text("SELECT timestamp, local_date, local_minute FROM logs WHERE event = 'Poop'")).one()
+    assert tuple(summer) == ("2025-07-01 00:30:00.000000", "2025-07-01", 90)
+
+def test_concurrent_upgrades_apply_each_migration_once(tmp_path):
+    make_legacy_engine(tmp_path)
+    url = f"sqlite:///{tmp_path / 'legacy.db'}"
+    engines = [create_engine(url), create_engine(url)]
+    barrier = threading.Barrier(len(engines))
+    errors = []
+
+    def run(engine):
+        barrier.wait()
+        try:
+            migrations.upgrade(engine)
+        except Exception as exc:
+            errors.append(exc)
+
+    threads = [threading.Thread(target=run, args=(engine,)) for engine in engines]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with engines[0].connect() as conn:
+        versions = conn.execute(text("SELECT version FROM schema_version ORDER BY version")).scalars().all()
+        summary = conn.execute(text("SELECT event, count FROM daily_summary ORDER BY event")).all()
+    assert versions == [number for number, _, _ in migrations.MIGRATIONS]
+    assert [tuple(row) for row in summary] == [("Feeding", 2), ("Pee", 1), ("Sleep", 1)]
+
+def test_fresh_upgrade_matches_models(tmp_path):
+    from sqlmodel import SQLModel
+    from backend import models  # noqa: F401
+
+    engine = create_engine(f"sqlite:///{tmp_path / 'fresh.db'}")
+    migrations.upgrade(engine)
+
+    inspector = inspect(engine)
+    for table in SQLModel.metadata.sorted_tables:
+        assert [c["name"] for c in inspector.get_columns(table.name)] == [c.name for c in table.columns], table.name
+        assert {ix["name"] for ix in inspector.get_indexes(table.name)} == {ix.name for ix in table.indexes}, table.name
@@ -0,0 +1,33 @@
+import numpy as np
+
+from backend.predictions import fit_windows
+
+def minutes(hhmm):
+    h, m = map(int, hhmm.split(":"))
+    return h * 60 + m
+
+def test_fit_windows_finds_regular_sleeps_across_midnight():
+    rng = np.random.default_rng(0)
+    starts, durations, days, weights = [], [], [], []
+    for day in range(30):
+        for start, length in (("09:30", 90), ("13:30", 120), ("19:30", 660)):
+            starts.append((minutes(start) + rng.normal(0, 15)) % 1440)
+            durations.append(length + rng.normal(0, 10))
+            days.append(day)
+            weights.append(0.5 ** ((29 - day) / 7))
+        # An occasional catnap should not become a window
+        if day % 10 == 0:
+            starts.append(minutes("16:45"))
+            durations.append(20)
+            days.append(day)
+            weights.append(0.5 ** ((29 - day) / 7))
+
+    windows = fit_windows(starts, durations, days, weights)
+    assert len(windows) == 3
+    for window, (start, end) in zip(windows, [("09:30", "11:00"), ("13:30", "15:30"), ("19:30", "06:30")]):
+        assert abs(minutes(window["start"]) - minutes(start)) <= 20
+        assert abs(minutes(window["end"]) - minutes(end)) <= 25
+
+def test_fit_windows_needs_history():
+    assert fit_windows([], [], [], []) == []
+    assert fit_windows([600], [60], [1], [1.0]) == []
@@ -0,0 +1,60 @@
+import http.client
+import os
+import sys
+import time
+
+from backend import supervisor
+
+async def app(scope, receive, send):
+    # Answers every request with the worker's pid; no lifespan, no database
+    if scope["type"] != "http":
+        return
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"text/plain")]})
+    await send({"type": "http.response.body", "body": str(os.getpid()).encode()})
+
+def fetch_pid(port: int) -> int:
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=5)
+    try:
+        conn.request("GET", "/ready")
+        return int(conn.getresponse().read())
+    finally:
+        conn.close()
+
+def test_backoff_doubles_up_to_the_cap():
+    assert [supervisor.backoff(n) for n in range(4)] == [0.0, 1.0, 2.0, 4.0]
+    assert supervisor.backoff(20) == supervisor.BACKOFF_MAX
+
+def test_crashing_service_restarts_with_backoff(monkeypatch):
+    monkeypatch.setattr(supervisor, "BACKOFF_BASE", 0.05)
+    service = supervisor.Service("crash", [sys.executable, "-c", "raise SystemExit(3)"])
+    service.start()
+    pids = {service.proc.pid}
+    deadline = time.monotonic() + 10
+    while service.failures < 3 and time.monotonic() < deadline:
+        service.check(time.monotonic())
+        pids.add(service.proc.pid)
+        time.sleep(0.01)
+    assert service.failures == 3 and len(pids) == 3
+    # The third quick exit is not restarted straight away
+    before = time.monotonic()
+    assert service.restart_at is not None and service.restart_at - before <= supervisor.backoff(3)
+    assert service.proc.returncode == 3
+    service.stop()
+
+def test_rolling_restart_replaces_every_worker_while_serving():
+    sup = supervisor.Supervisor("127.0.0.1", 0, workers=2, app="backend.tests.test_supervisor:app")
+    port = sup.listener.getsockname()[1]
+    try:
+        sup.start()
+        assert all(w.wait_ready(30) for w in sup.workers)
+        old = [w.proc for w in sup.workers]
+        assert fetch_pid(port) in {p.pid for p in old}
+
+        sup.rolling_restart()
+        new = {w.proc.pid for w in sup.workers}
+        assert all(p.poll() is not None for p in old)
+        assert new.isdisjoint(p.pid for p in old) and len(new) == 2
+        assert fetch_pid(port) in new
+    finally:
+        sup.shutdown()
+    assert all(not w.running() for w in sup.workers)
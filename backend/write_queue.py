@@ -0,0 +1,91 @@
+"""Group commit for single-event writes from the API and the bot.
+
+With the queue enabled, ``async_crud.submit_log_event`` does not commit each
+log on its own. Logs submitted within ``window_ms`` of the first one (or until
+``max_batch`` are waiting) are inserted in submission order and committed in
+one transaction, so a burst of taps costs one fsync and one turn on the
+SQLite write lock instead of one each. Each caller still gets its own log back,
+with its id, once the batch has committed.
+
+Batches are committed one at a time, in the order they were opened, so ids
+always follow submission order. If a batch fails, its logs are retried one by
+one so that a single bad write only fails its own caller. The queue batches
+within one process; the API and the bot each have their own.
+"""
+import asyncio
+import logging
+
+from . import async_crud, database
+
+logger = logging.getLogger(__name__)
+
+class WriteQueue:
+    def __init__(self, sessions, window: float = 0.005, max_batch: int = 64):
+        self.sessions = sessions
+        self.window = window
+        self.max_batch = max_batch
+        self._batch = []
+        self._full = None
+        self._commit_lock = asyncio.Lock()
+        self._tasks = set()
+
+    async def submit(self, log):
+        """Queue ``log`` (a LogCreate) and return the committed Log."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        if not self._batch:
+            # The first log of a batch schedules its commit
+            self._full = asyncio.Event()
+            task = loop.create_task(self._flush(self._batch, self._full))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        self._batch.append((log, future))
+        if len(self._batch) >= self.max_batch:
+            # Detach the full batch now so the next submit opens a new one
+            self._batch = []
+            self._full.set()
+        # A caller that goes away must not cancel the write for everyone else
+        return await asyncio.shield(future)
+
+    async def _flush(self, batch: list, full: asyncio.Event):
+        try:
+            await asyncio.wait_for(full.wait(), self.window)
+        except asyncio.TimeoutError:
+            pass
+        if self._batch is batch:
+            self._batch = []
+        async with self._commit_lock:
+            await self._commit(batch)
+
+    async def _commit(self, batch):
+        try:
+            async with self.sessions() as db:
+                logs = await async_crud.log_events(db, [log for log, _ in batch])
+        except Exception:
+            logger.exception("Batch of %d writes failed; retrying one by one", len(batch))
+            for log, future in batch:
+                try:
+                    async with self.sessions() as db:
+                        _resolve(future, result=await async_crud.log_event(db, log))
+                except Exception as e:
+                    _resolve(future, error=e)
+            return
+        for (_, future), result in zip(batch, logs):
+            _resolve(future, result=result)
+
+def _resolve(future, result=None, error=None):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+    else:
+        future.set_result(result)
+
+def from_settings(settings: dict, sessions=None):
+    """The queue described by a ``write_queue`` settings dict, or None when it is disabled."""
+    if not settings.get("enabled"):
+        return None
+    return WriteQueue(sessions or database.AsyncSessionLocal, window=float(settings["window_ms"]) / 1000,
+                      max_batch=int(settings["max_batch"]))
+
+queue = from_settings(database.load_settings()["write_queue"])
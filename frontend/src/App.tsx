@@ -32,7 +32,9 @@ function App() {
         fetchData,
         logEvent,
         updateLog,
+        startSession,
         stopSession,
+        switchSession,
         deleteLog
     } = useDashboardData();
 
@@ -78,9 +80,10 @@ function App() {
                             ongoingFeed={ongoing_feed}
                             ongoingSleep={ongoing_sleep}
                             lastCompletedFeed={last_completed_feed}
-                            onStartFeed={(o) => logEvent('Feeding', { orientation: o, details: 'ongoing' })}
+                            onStartFeed={(o) => startSession('Feeding', { orientation: o })}
                             onStopFeed={() => stopSession('Feeding')}
-                            onStartSleep={() => logEvent('Sleep', { details: 'ongoing' })}
+                            onSwitchFeed={() => switchSession('Feeding')}
+                            onStartSleep={() => startSession('Sleep')}
                             onStopSleep={() => stopSession('Sleep')}
                         />
 
@@ -1,10 +1,18 @@
 import apiClient from './apiClient';
-import { DashboardData, Log, BabyConfig } from '../types';
+import { AnalyticsQuery, AnalyticsSeries, DashboardData, Log, LogChanges, BabyConfig, LogQuery, SessionStart, SessionTransition } from '../types';
 
 export const logService = {
     getDashboard: () => apiClient.get<DashboardData>('/dashboard'),
-    getLogs: (limit = 100) => apiClient.get<Log[]>(`/logs?limit=${limit}`),
+    getLogs: (limit = 100, query: LogQuery = {}) =>
+        apiClient.get<Log[]>('/logs', { params: { limit, ...query, fields: query.fields?.join(',') } }),
+    // Repeated `event` params are summed; long ranges come back in a coarser bucket
+    getAnalytics: (events: string[], query: AnalyticsQuery = {}) =>
+        apiClient.get<AnalyticsSeries>('/analytics', { params: { ...query, event: events }, paramsSerializer: { indexes: null } }),
+    // Inserts, updates and deletes after `since` (the X-Log-Revision of a /logs response)
+    getChanges: (since: number) =>
+        apiClient.get<LogChanges>('/logs/changes', { params: { since } }),
     getConfig: () => apiClient.get<BabyConfig>('/config'),
+    eventsUrl: `${apiClient.defaults.baseURL}/events`,
 
     logEvent: (event: string, extra: any = {}) =>
         apiClient.post('/logs', { event, ...extra }),
@@ -15,6 +23,16 @@ export const logService = {
     deleteLog: (id: number) =>
         apiClient.delete(`/logs/${id}`),
 
+    // Session taps: each stops whatever is ongoing and starts the next in one transaction
+    getSessions: () =>
+        apiClient.get<Record<string, Log | null>>('/sessions'),
+
+    startSession: (type: string, start: SessionStart = {}) =>
+        apiClient.post<SessionTransition>(`/sessions/${type}/start`, start),
+
     stopSession: (type: string) =>
-        apiClient.post(`/logs/${type}/stop`),
+        apiClient.post<SessionTransition>(`/sessions/${type}/stop`),
+
+    switchSession: (type: string, orientation?: string) =>
+        apiClient.post<SessionTransition>(`/sessions/${type}/switch`, null, { params: { orientation } }),
 };
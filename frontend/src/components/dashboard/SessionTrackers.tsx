@@ -9,6 +9,7 @@ interface SessionTrackersProps {
     lastCompletedFeed: Log | null;
     onStartFeed: (orientation: string) => void;
     onStopFeed: () => void;
+    onSwitchFeed: () => void;
     onStartSleep: () => void;
     onStopSleep: () => void;
 }
@@ -19,6 +20,7 @@ export const SessionTrackers: React.FC<SessionTrackersProps> = ({
     lastCompletedFeed,
     onStartFeed,
     onStopFeed,
+    onSwitchFeed,
     onStartSleep,
     onStopSleep
 }) => {
@@ -38,12 +40,22 @@ export const SessionTrackers: React.FC<SessionTrackersProps> = ({
                                 Started at {format(new Date(ongoingFeed.timestamp), 'HH:mm')}
                             </p>
                         </div>
-                        <button
-                            onClick={onStopFeed}
-                            className="bg-white text-primary-600 font-bold px-6 py-3 rounded-xl shadow-lg hover:bg-primary-50 transition-all active:scale-95"
-                        >
-                            STOP FEED
-                        </button>
+                        <div className="flex gap-2">
+                            {(ongoingFeed.orientation === 'Left' || ongoingFeed.orientation === 'Right') && (
+                                <button
+                                    onClick={onSwitchFeed}
+                                    className="bg-primary-500 text-white font-bold px-4 py-3 rounded-xl hover:bg-primary-400 transition-all active:scale-95"
+                                >
+                                    SWITCH
+                                </button>
+                            )}
+                            <button
+                                onClick={onStopFeed}
+                                className="bg-white text-primary-600 font-bold px-6 py-3 rounded-xl shadow-lg hover:bg-primary-50 transition-all active:scale-95"
+                            >
+                                STOP FEED
+                            </button>
+                        </div>
                     </div>
                     <ChefHat className="absolute -right-8 -bottom-8 w-48 h-48 text-primary-500/30 rotate-12" />
                 </div>
@@ -1,23 +1,75 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { logService } from '../api/logService';
-import { DashboardData, Log, BabyConfig } from '../types';
+import { DashboardData, Log, BabyConfig, SessionStart } from '../types';
+
+const LOG_WINDOW = 100;
+
+const newestFirst = (a: Log, b: Log) =>
+    Date.parse(b.timestamp) - Date.parse(a.timestamp) || b.id - a.id;
 
 export const useDashboardData = () => {
     const [data, setData] = useState<DashboardData | null>(null);
     const [logs, setLogs] = useState<Log[]>([]);
     const [config, setConfig] = useState<BabyConfig | null>(null);
     const [loading, setLoading] = useState(true);
+    // The API sends strong ETags and the browser revalidates with If-None-Match,
+    // so an unchanged ETag means the payload is identical and state can be left alone.
+    const etags = useRef<Record<string, string | undefined>>({});
+    // Revision the log list is synced to; after the first full load only changes are fetched
+    const logRev = useRef<number | undefined>(undefined);
+    const logsRef = useRef<Log[]>([]);
+
+    const changed = (key: string, etag?: string) => {
+        if (etag && etags.current[key] === etag) return false;
+        etags.current[key] = etag;
+        return true;
+    };
+
+    const showLogs = (next: Log[]) => {
+        logsRef.current = next;
+        setLogs(next);
+    };
+
+    const loadAllLogs = async () => {
+        const resp = await logService.getLogs(LOG_WINDOW);
+        const rev = Number(resp.headers['x-log-revision']);
+        logRev.current = Number.isNaN(rev) ? undefined : rev;
+        showLogs(resp.data);
+    };
+
+    const syncLogs = async () => {
+        const since = logRev.current;
+        if (since === undefined) return loadAllLogs();
+        let rev = since;
+        const updated = new Map<number, Log>();
+        const deleted = new Set<number>();
+        for (;;) {
+            const { data: page } = await logService.getChanges(rev);
+            // A lower revision means a different database: start over
+            if (page.rev < rev) return loadAllLogs();
+            page.logs.forEach(l => { updated.set(l.id, l); deleted.delete(l.id); });
+            page.deleted.forEach(id => { deleted.add(id); updated.delete(id); });
+            rev = page.rev;
+            if (!page.has_more) break;
+        }
+        logRev.current = rev;
+        if (!updated.size && !deleted.size) return;
+        const current = logsRef.current;
+        // Removing a visible row leaves a gap only a full page can fill
+        if (current.some(l => deleted.has(l.id))) return loadAllLogs();
+        const merged = current.filter(l => !updated.has(l.id)).concat([...updated.values()]);
+        showLogs(merged.sort(newestFirst).slice(0, LOG_WINDOW));
+    };
 
     const fetchData = useCallback(async () => {
         try {
-            const [dashResp, logsResp, configResp] = await Promise.all([
+            const [dashResp, configResp] = await Promise.all([
                 logService.getDashboard(),
-                logService.getLogs(),
-                logService.getConfig()
+                logService.getConfig(),
+                syncLogs()
             ]);
-            setData(dashResp.data);
-            setLogs(logsResp.data);
-            setConfig(configResp.data);
+            if (changed('dashboard', dashResp.headers.etag)) setData(dashResp.data);
+            if (changed('config', configResp.headers.etag)) setConfig(configResp.data);
         } catch (error) {
             console.error('Error fetching data:', error);
         } finally {
@@ -27,8 +79,21 @@ export const useDashboardData = () => {
 
     useEffect(() => {
         fetchData();
-        const interval = setInterval(fetchData, 30000);
-        return () => clearInterval(interval);
+        // Changes are pushed over SSE; the slow poll only keeps the "time since" figures ticking
+        // and covers browsers or proxies where the event stream is unavailable.
+        const interval = setInterval(fetchData, 60000);
+        let pending: ReturnType<typeof setTimeout> | undefined;
+        const source = typeof EventSource !== 'undefined' ? new EventSource(logService.eventsUrl) : null;
+        source?.addEventListener('change', () => {
+            // Coalesce bursts (e.g. stop + start of a feed) into a single refetch
+            clearTimeout(pending);
+            pending = setTimeout(fetchData, 250);
+        });
+        return () => {
+            clearInterval(interval);
+            clearTimeout(pending);
+            source?.close();
+        };
     }, [fetchData]);
 
     const logEvent = async (event: string, extra: any = {}) => {
@@ -41,11 +106,21 @@ export const useDashboardData = () => {
         fetchData();
     };
 
+    const startSession = async (type: string, start: SessionStart = {}) => {
+        await logService.startSession(type, start);
+        fetchData();
+    };
+
     const stopSession = async (type: string) => {
         await logService.stopSession(type);
         fetchData();
     };
 
+    const switchSession = async (type: string) => {
+        await logService.switchSession(type);
+        fetchData();
+    };
+
     const deleteLog = async (id: number) => {
         if (!confirm('Are you sure you want to delete this log?')) return;
         await logService.deleteLog(id);
@@ -60,7 +135,9 @@ export const useDashboardData = () => {
         fetchData,
         logEvent,
         updateLog,
+        startSession,
         stopSession,
+        switchSession,
         deleteLog
     };
 };
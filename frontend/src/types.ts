@@ -2,6 +2,8 @@ export interface Log {
     id: number;
     event: string;
     details: string;
+    status?: 'ongoing' | 'completed' | null;
+    duration_seconds?: number | null;
     timestamp: string;
     comments?: string;
     end_timestamp?: string;
@@ -10,6 +12,35 @@ export interface Log {
     duration_minutes?: number;
     weight?: number;
     height?: number;
+    /** Change-journal revision of the row's last insert or update */
+    rev?: number;
+}
+
+export interface LogChanges {
+    rev: number;
+    logs: Log[];
+    deleted: number[];
+    has_more: boolean;
+}
+
+export interface SessionStart {
+    orientation?: string;
+    timestamp?: string;
+    comments?: string;
+}
+
+export interface SessionTransition {
+    stopped: Log[];
+    started: Log | null;
+}
+
+export interface LogQuery {
+    event?: string;
+    /** Opaque keyset cursor from the previous page's X-Next-Cursor header */
+    cursor?: string;
+    from?: string;
+    to?: string;
+    fields?: (keyof Log)[];
 }
 
 export interface DailyStats {
@@ -48,6 +79,38 @@ export interface HistoryData {
     growth: { date: string, weight?: number, height?: number }[];
 }
 
+export type AnalyticsBucket = 'hour' | 'day' | 'week' | 'month';
+
+export interface AnalyticsQuery {
+    bucket?: AnalyticsBucket;
+    from?: string;
+    to?: string;
+    max_points?: number;
+}
+
+export interface AnalyticsPoint {
+    start: string;
+    count: number;
+    done_count: number;
+    minutes: number;
+    avg_minutes: number | null;
+    hours: number;
+    left_count: number;
+    right_count: number;
+    expressed_count: number;
+    weight: number | null;
+    height: number | null;
+}
+
+export interface AnalyticsSeries {
+    events: string[];
+    requested_bucket: AnalyticsBucket;
+    bucket: AnalyticsBucket;
+    start: string;
+    end: string;
+    points: AnalyticsPoint[];
+}
+
 export interface DashboardData {
     feeding: FeedStats;
     diapers: DiaperStats;
@@ -1,45 +1,90 @@
-import subprocess
+import argparse
+import logging
 import os
+import subprocess
 import sys
-import signal
-import time
 
-def run_command(command, cwd=None, background=True):
-    if background:
-        return subprocess.Popen(command, shell=True, cwd=cwd)
-    else:
-        return subprocess.run(command, shell=True, cwd=cwd)
+from backend.supervisor import Service, Supervisor
+
+FRONTEND_DIR = "frontend"
+DIST_DIR = os.path.join(FRONTEND_DIR, "dist")
+# Anything that changes the build output
+FRONTEND_SOURCES = ["src", "index.html", "package.json", "package-lock.json", "vite.config.ts",
+                    "tailwind.config.js", "postcss.config.js", "tsconfig.json"]
+BOT_TOKEN_FILE = "token.txt"
+
+def _newest_mtime(paths):
+    newest = 0
+    for path in paths:
+        if os.path.isdir(path):
+            for root, _, names in os.walk(path):
+                newest = max([newest] + [os.path.getmtime(os.path.join(root, n)) for n in names])
+        elif os.path.exists(path):
+            newest = max(newest, os.path.getmtime(path))
+    return newest
+
+def build_frontend(force=False):
+    """Build frontend/dist if it is missing or older than its sources, then precompress it."""
+    index = os.path.join(DIST_DIR, "index.html")
+    sources = [os.path.join(FRONTEND_DIR, p) for p in FRONTEND_SOURCES]
+    if force or not os.path.exists(index) or os.path.getmtime(index) < _newest_mtime(sources):
+        print("🏗️  Building Frontend...")
+        if not os.path.isdir(os.path.join(FRONTEND_DIR, "node_modules")):
+            subprocess.run(["npm", "ci"], cwd=FRONTEND_DIR, check=True)
+        subprocess.run(["npm", "run", "build"], cwd=FRONTEND_DIR, check=True)
+    from backend import static
+    written = static.precompress(DIST_DIR)
+    if written:
+        print(f"🗜️  Precompressed {written} files")
 
 def main():
-    print("🚀 Starting Baby Tracker Unified Suite...")
+    parser = argparse.ArgumentParser(description="Run the Baby Tracker suite under a process supervisor")
+    parser.add_argument("--prod", action="store_true",
+                        help="Serve a production build of the frontend from the backend instead of running Vite")
+    parser.add_argument("--rebuild", action="store_true", help="With --prod, rebuild the frontend even if it is up to date")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="API worker processes; defaults to one per core with --prod, else 1")
+    parser.add_argument("--no-bot", dest="bot", action="store_false", help="Do not run the Telegram bot")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(levelname)s %(message)s")
 
-    # Start Backend
-    print("📦 Starting Backend (FastAPI)...")
-    backend_proc = run_command("uvicorn backend.main:app --host 0.0.0.0 --port 8000")
+    print("🚀 Starting Baby Tracker Unified Suite...")
+    # Once, before any worker starts, so workers never race to upgrade the schema
+    subprocess.run([sys.executable, "-m", "backend.manage", "migrate"], check=True)
 
-    # Start Frontend (Dev mode)
-    print("🎨 Starting Frontend (Vite)...")
-    # In a real build, we'd serve the static files, but for dev ease we'll use vite dev
-    frontend_proc = run_command("npm run dev", cwd="frontend")
+    if args.prod:
+        build_frontend(force=args.rebuild)
+        workers = args.workers or os.cpu_count() or 1
+        # Each worker serves the built app at / and the API under /api
+        supervisor = Supervisor(args.host, args.port, workers, app="backend.main:create_site", factory=True,
+                                ready_path="/api/ready", access_log=False)
+    else:
+        workers = args.workers or 1
+        supervisor = Supervisor(args.host, args.port, workers, app="backend.main:app")
+        print("🎨 Starting Frontend (Vite)...")
+        supervisor.add(Service("frontend", ["npm", "run", "dev"], cwd=FRONTEND_DIR))
 
-    # Start Telegram Bot
-    print("🤖 Starting Telegram Bot...")
-    # bot_proc = run_command("python telegram_bot.py")
+    if args.bot and os.path.exists(BOT_TOKEN_FILE):
+        print("🤖 Starting Telegram Bot...")
+        supervisor.add(Service("bot", [sys.executable, "telegram_bot.py"]))
+    elif args.bot:
+        print(f"🤖 No {BOT_TOKEN_FILE}; not starting the Telegram Bot")
 
+    print(f"📦 Starting Backend (FastAPI, {workers} worker{'s' if workers > 1 else ''})...")
     print("\n✅ All services are running!")
-    print("👉 Backend API: http://localhost:8000")
-    print("👉 Frontend Dashboard: http://localhost:5173 (or as shown by Vite)")
+    if args.prod:
+        print(f"👉 Dashboard: http://localhost:{args.port}")
+        print(f"👉 Backend API: http://localhost:{args.port}/api")
+    else:
+        print(f"👉 Backend API: http://localhost:{args.port}")
+        print("👉 Frontend Dashboard: http://localhost:5173 (or as shown by Vite)")
+    print(f"Crashed services restart on their own; `kill -HUP {os.getpid()}` restarts workers one at a time.")
     print("Press Ctrl+C to stop all services.\n")
 
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        print("\n🛑 Stopping Baby Tracker Suite...")
-        backend_proc.terminate()
-        frontend_proc.terminate()
-        # bot_proc.terminate()
-        print("Done.")
+    supervisor.run()
+    print("\n🛑 Stopped Baby Tracker Suite.")
 
 if __name__ == "__main__":
     main()
@@ -7,11 +7,9 @@ from telegram.ext import (
     CallbackQueryHandler,
     ConversationHandler,
 )
-from backend import crud, database, schemas
-from backend.database import engine, Session
-from datetime import datetime
-import pytz
-import yaml
+from backend import async_crud, crud, metrics, schemas, migrations
+from backend.database import engine, AsyncSessionLocal, AsyncReadSessionLocal
+from backend.config import get_config
 
 with open("token.txt", "r") as f:
     TOKEN = f.read().strip()
@@ -54,6 +52,7 @@ def build_main_keyboard():
             InlineKeyboardButton("Start Feed Expressed", callback_data="Feed-Expressed"),
         ],
         [
+            InlineKeyboardButton("Switch Side", callback_data="Feed-Switch"),
             InlineKeyboardButton("Stop Feed", callback_data="Feed-Stop"),
         ],
         [
@@ -87,16 +86,20 @@ async def button(update: Update, context: CallbackContext) -> int:
     await query.answer()
     data = query.data
 
-    with Session(engine) as db:
+    if data in ("Return-Feed", "Return-Diaper"):
+        # Single indexed lookups; the full dashboard is not needed for either button
+        async with AsyncReadSessionLocal() as db:
+            if data == "Return-Feed":
+                last_feed = await async_crud.get_latest(db, ["Feeding"], status=crud.SESSION_COMPLETED)
+            else:
+                last_diaper = await async_crud.get_time_since(db, crud.DIAPER_TYPES)
         if data == "Return-Feed":
-            stats = crud.get_stats(db)
-            last_feed = stats["last_completed_feed"]
             if not last_feed:
                 message = "No previous feed found."
             else:
                 now = crud.get_current_time()
                 ts = last_feed.timestamp
-                if ts.tzinfo is None: ts = crud.tz.localize(ts)
+                if ts.tzinfo is None: ts = crud.get_timezone().localize(ts)
                 time_since = now - ts
                 
                 hours, remainder = divmod(int(time_since.total_seconds()), 3600)
@@ -113,34 +116,48 @@ async def button(update: Update, context: CallbackContext) -> int:
             await query.edit_message_text(text=message, reply_markup=build_main_keyboard())
             return MENU
 
-        elif data == "Return-Diaper":
-            stats = crud.get_stats(db)["diapers"]
-            message = f"🦥 Last Diaper:\nType: {stats['last_type']}\nTime since: {stats['last_time_str']}"
+        else:
+            message = f"🦥 Last Diaper:\nType: {last_diaper['event']}\nTime since: {last_diaper['text']}"
             await query.edit_message_text(text=message, reply_markup=build_main_keyboard())
             return MENU
 
+    async with AsyncSessionLocal() as db:
         if "Dad" in data or "Mum" in data:
             event, orientation = data.split("-")
-            crud.log_event(db, schemas.LogCreate(event=event, orientation=orientation))
+            await async_crud.submit_log_event(db, schemas.LogCreate(event=event, orientation=orientation))
+        # Session taps are one transaction each, so concurrent taps cannot double-start
         elif data == "Feed-Stop":
-            crud.stop_ongoing_session(db, "Feeding")
+            await async_crud.stop_session(db, "Feeding")
+        elif data == "Feed-Switch":
+            try:
+                await async_crud.switch_session(db, "Feeding")
+            except ValueError as e:
+                await query.edit_message_text(text=f"⚠️ {e}", reply_markup=build_main_keyboard())
+                return MENU
         elif data == "Sleep-Start":
-            crud.log_event(db, schemas.LogCreate(event="Sleep", details="ongoing"))
+            await async_crud.start_session(db, "Sleep")
         elif data == "Sleep-Stop":
-            crud.stop_ongoing_session(db, "Sleep")
+            await async_crud.stop_session(db, "Sleep")
         elif data.startswith("Feed"):
             event, orientation = data.split("-")
-            # Stop any ongoing feed if it exists before starting new one (simplified logic)
-            crud.stop_ongoing_session(db, "Feeding")
-            latest_id = crud.get_latest_feed_id(db)
-            crud.log_event(db, schemas.LogCreate(event="Feeding", details="ongoing", orientation=orientation, feed_id=latest_id + 1))
+            await async_crud.start_session(db, "Feeding", orientation=orientation)
 
     full_text = f"📜 *Select an option below:*\n✅ You selected *{data.replace('-', ' ')}*."
     await query.edit_message_text(text=full_text, reply_markup=build_main_keyboard(), parse_mode="Markdown")
     return MENU
 
+def start_metrics_server():
+    # Crud calls are timed by async_crud; expose them when a port is configured
+    port = (get_config().data.get("metrics") or {}).get("bot_port")
+    if port:
+        metrics.start_http_server(int(port))
+        logger.info(f"Serving bot metrics on port {port}")
+
 def main():
     load_allowed_user_ids()
+    migrations.upgrade(engine)
+    crud.rebuild_on_timezone_change(engine)
+    start_metrics_server()
     application = ApplicationBuilder().token(TOKEN).build()
     conv_handler = ConversationHandler(
         entry_points=[CommandHandler("start", start)],